@@ -0,0 +1,4 @@
+"""
+DATASTORE
+Storage, ingestion and cleaning for the kline / funding history.
+"""
@@ -0,0 +1,189 @@
+"""
+MEMORY-MAPPED BAR CACHE
+The combined perp + funding bars imported from the combined CSV (store
+market CSV_MARKET) as one flat file of NumPy columns.
+
+File layout:
+    8 bytes   magic  b'BARCACH1'
+    8 bytes   header length (little-endian uint64)
+    N bytes   JSON header: rows, symbol, source digest, [name, dtype, offset] per column
+    ...       column blocks, each 64-byte aligned
+
+open_cache() maps the file read-only and hands out views into it, so any
+number of processes reading the same cache share one physical copy in the
+page cache and nothing is parsed or copied at startup.
+funding_fresh is precomputed so the scripts no longer rebuild it.
+"""
+import json
+import os
+import struct
+import hashlib
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from datastore.store import STORE_ROOT, DEFAULT_SYMBOL, COMBINED_CSV, CSV_MARKET, list_partitions, read_meta, read_columns, \
+    ensure_combined
+from datastore.bargrid import BarGrid
+
+MAGIC = b'BARCACH1'
+ALIGN = 64
+
+
+def cache_path(symbol=DEFAULT_SYMBOL, root=None) -> Path:
+    return Path(root or STORE_ROOT) / '_cache' / f"{symbol}_combined.bars"
+
+
+def store_digest(market=CSV_MARKET, symbol=DEFAULT_SYMBOL, root=None) -> str:
+    """Fingerprint of the store partitions the cache was built from."""
+    h = hashlib.sha1()
+    for m in list_partitions(market, symbol, root):
+        h.update(read_meta(market, symbol, m, root)['digest'].encode())
+    return h.hexdigest()
+
+
+# ============ BUILD ============
+def write_cache(path, columns: dict, extra=None):
+    """Write a dict of equal-length 1-D arrays as a cache file (atomic)."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    arrays = {k: np.ascontiguousarray(v) for k, v in columns.items()}
+    rows = {len(v) for v in arrays.values()}
+    if len(rows) != 1:
+        raise ValueError(f"columns have different lengths: {rows}")
+
+    meta = {'rows': rows.pop() if rows else 0, **(extra or {})}
+
+    # offsets depend on the header size and vice versa: grow until it fits
+    start = 0
+    while True:
+        layout, offset = [], start
+        for name, arr in arrays.items():
+            layout.append([name, arr.dtype.str, offset])
+            offset = _align(offset + arr.nbytes)
+        header = json.dumps({**meta, 'columns': layout}).encode()
+        if _align(16 + len(header)) <= start:
+            break
+        start = _align(16 + len(header))
+
+    tmp = path.with_name(f".{path.name}.tmp-{os.getpid()}")
+    with open(tmp, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(header)))
+        f.write(header)
+        for (name, _, offset), arr in zip(layout, arrays.values()):
+            f.write(b'\0' * (offset - f.tell()))
+            f.write(arr.tobytes())
+    os.replace(tmp, path)
+    return path
+
+
+def _align(n):
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+def build_cache(symbol=DEFAULT_SYMBOL, root=None, path=None, csv_path=COMBINED_CSV):
+    """Build the cache from the store's CSV_MARKET partitions (importing csv_path if needed)."""
+    ensure_combined(csv_path, symbol, root)
+    cols = read_columns(CSV_MARKET, symbol, root=root)
+    fr = cols['funding_rate']
+    fresh = np.ones(len(fr), dtype=bool)
+    fresh[1:] = fr[1:] != fr[:-1]
+    cols['funding_fresh'] = fresh
+    return write_cache(path or cache_path(symbol, root), cols,
+                       {'symbol': symbol, 'time_col': 'bar_time', 'source': store_digest(CSV_MARKET, symbol, root)})
+
+
+# ============ OPEN (zero-copy) ============
+class BarCache:
+    """Read-only column views over a memory-mapped cache file."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, 'rb') as f:
+            if f.read(8) != MAGIC:
+                raise ValueError(f"{self.path} is not a bar cache")
+            (hlen,) = struct.unpack('<Q', f.read(8))
+            self.header = json.loads(f.read(hlen))
+        self.rows = self.header['rows']
+        self._mm = np.memmap(self.path, dtype=np.uint8, mode='r')
+        self._cols = {}
+        self._grid = None
+        for name, dtype, offset in self.header['columns']:
+            dt = np.dtype(dtype)
+            self._cols[name] = np.ndarray((self.rows,), dtype=dt, buffer=self._mm, offset=offset)
+
+    @property
+    def columns(self):
+        return list(self._cols)
+
+    def __getitem__(self, name) -> np.ndarray:
+        return self._cols[name]
+
+    def __contains__(self, name):
+        return name in self._cols
+
+    def __len__(self):
+        return self.rows
+
+    @property
+    def grid(self) -> BarGrid:
+        """Time -> row index over the cached bars (built on first use)."""
+        if self._grid is None:
+            self._grid = BarGrid(self._cols[self.header.get('time_col', 'bar_time')])
+        return self._grid
+
+    def frame(self, columns=None) -> pd.DataFrame:
+        """
+        DataFrame indexed by bar_time (UTC) whose columns are the mapped,
+        read-only views (no copy). New columns can be added; writing into a
+        cached column in place raises, assign a new Series instead.
+        """
+        time_col = self.header.get('time_col', 'bar_time')
+        names = [c for c in (columns or self.columns) if c != time_col]
+        df = pd.DataFrame({c: self._cols[c] for c in names}, copy=False)
+        df.index = pd.DatetimeIndex(pd.to_datetime(self._cols[time_col], unit='ms', utc=True), name=time_col)
+        return df
+
+
+def open_cache(symbol=DEFAULT_SYMBOL, root=None, path=None, rebuild_stale=True, csv_path=COMBINED_CSV) -> BarCache:
+    """
+    Open (building or refreshing first if needed) the cache for symbol; a
+    build imports csv_path if needed (None: the store's CSV_MARKET as is).
+    """
+    path = Path(path or cache_path(symbol, root))
+    if not path.exists():
+        build_cache(symbol, root, path, csv_path)
+    cache = BarCache(path)
+    if rebuild_stale and cache.header.get('source') != store_digest(CSV_MARKET, symbol, root):
+        build_cache(symbol, root, path, csv_path)
+        cache = BarCache(path)
+    return cache
+
+
+def load_bars(csv_path=COMBINED_CSV, columns=None, symbol=DEFAULT_SYMBOL, root=None) -> pd.DataFrame:
+    """
+    Drop-in for the scripts' read_csv/set_index/funding_fresh block:
+    DataFrame indexed by bar_time with funding_fresh already computed, its
+    columns zero-copy views of the shared cache (see BarCache.frame).
+    csv_path is parsed only when the store does not hold it yet; every call
+    still stats it (size + mtime, see ensure_combined), and a changed file is
+    hashed and re-imported (the cache rebuilds if its bars changed).
+    """
+    ensure_combined(csv_path, symbol, root)
+    cache = open_cache(symbol, root, csv_path=None)
+    if columns is not None:
+        columns = list(columns) + ['funding_fresh']
+    return cache.frame(columns)
+
+
+if __name__ == '__main__':
+    import time
+
+    t0 = time.perf_counter()
+    path = build_cache()
+    print(f"✅ Cache written to {path} ({time.perf_counter() - t0:.3f}s)")
+    t0 = time.perf_counter()
+    cache = open_cache()
+    print(f"  Opened {len(cache)} bars x {len(cache.columns)} columns in {(time.perf_counter() - t0)*1000:.2f} ms")
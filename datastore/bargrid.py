@@ -0,0 +1,141 @@
+"""
+BAR GRID INDEX
+Dense time -> row index for a regular bar series (e.g. the combined 4h bars).
+
+    slot = (t - t0) // step          arithmetic, no search
+    row  = slot_row[slot]            -1 where the bar is missing
+
+- Replaces `t in df.index` / `df.loc[t, col]` / `df.index.get_loc(t)` per
+  trade with one vectorized array lookup for all trades
+- A packed bitmap (1 bit per slot) marks missing bars, so gaps are explicit
+- dense() lays a column out on the full grid, NaN or forward-filled, with
+  the filled slots reported alongside
+
+Usage:
+    grid = BarGrid.from_index(df.index)
+    rows = grid.rows(trades['entry_time'])                # -1 if no bar
+    trades['volume_ratio'] = grid.lookup(df['volume_ratio'].to_numpy(), trades['entry_time'])
+"""
+import numpy as np
+import pandas as pd
+
+from datastore.store import DEFAULT_SYMBOL, read_columns, time_col_of
+
+
+def times_to_ms(values) -> np.ndarray:
+    """int ms, datetime-likes or ISO strings -> int64 epoch ms (NaT -> INT64 min)."""
+    arr = np.asarray(values)
+    if arr.dtype.kind in 'iu':
+        return arr.astype(np.int64)
+    s = pd.to_datetime(pd.Series(values), utc=True, errors='coerce', format='ISO8601')
+    return s.dt.tz_localize(None).to_numpy().astype('datetime64[ms]').astype(np.int64)
+
+
+class BarGrid:
+    """Regular grid t0 + k*step over sorted bar times, with a missing-bar bitmap."""
+
+    def __init__(self, times, step=None):
+        t = times_to_ms(times)
+        if len(t) == 0:
+            raise ValueError("empty bar series")
+        d = np.diff(t)
+        if (d <= 0).any():
+            raise ValueError("bar times must be strictly increasing")
+        if step is None:
+            # most common spacing = the bar interval
+            vals, counts = np.unique(d, return_counts=True)
+            step = int(vals[np.argmax(counts)]) if len(d) else 1
+        off = (t - t[0]) % step
+        if off.any():
+            raise ValueError(f"{int((off != 0).sum())} bars are off the {step} ms grid")
+
+        self.t0 = int(t[0])
+        self.step = int(step)
+        self.n_rows = len(t)
+        self.n_slots = int((t[-1] - t[0]) // step + 1)
+        self.slot_row = np.full(self.n_slots, -1, dtype=np.int64)
+        self.slot_row[(t - t[0]) // step] = np.arange(len(t))
+        self.row_slot = (t - t[0]) // step
+        self.missing_bits = np.packbits(self.slot_row < 0, bitorder='little')
+
+    @classmethod
+    def from_index(cls, index, step=None):
+        """From a DatetimeIndex (e.g. the bar_time index of load_bars())."""
+        return cls(index, step)
+
+    # ============ LOOKUPS ============
+    def slot(self, t) -> int:
+        """Grid slot of one time (may be outside [0, n_slots) or off-grid -> -1)."""
+        k, r = divmod(int(times_to_ms([t])[0]) - self.t0, self.step)
+        return k if r == 0 and 0 <= k < self.n_slots else -1
+
+    def row(self, t) -> int:
+        """O(1) time -> row; -1 if there is no bar at t."""
+        k = self.slot(t)
+        return int(self.slot_row[k]) if k >= 0 else -1
+
+    def rows(self, ts) -> np.ndarray:
+        """Vectorized time -> row for many times; -1 where there is no bar."""
+        t = times_to_ms(ts)
+        k, r = np.divmod(t - self.t0, self.step)
+        ok = (r == 0) & (k >= 0) & (k < self.n_slots)
+        out = np.full(len(t), -1, dtype=np.int64)
+        out[ok] = self.slot_row[k[ok]]
+        return out
+
+    def lookup(self, values: np.ndarray, ts, fill=np.nan) -> np.ndarray:
+        """values[row of each t], `fill` where there is no bar (dtype widened only if needed)."""
+        values = np.asarray(values)
+        rows = self.rows(ts)
+        hit = rows >= 0
+        if hit.all():
+            return values[rows]
+        dtype = values.dtype if values.dtype.kind in 'fc' else (
+            np.float64 if values.dtype.kind in 'iu' else object)
+        out = np.full(len(rows), fill, dtype=dtype)
+        out[hit] = values[rows[hit]]
+        return out
+
+    # ============ GAPS ============
+    def is_missing(self, k) -> np.ndarray:
+        """Bitmap test for slot(s) k."""
+        k = np.asarray(k)
+        return ((self.missing_bits[k >> 3] >> (k & 7)) & 1).astype(bool)
+
+    @property
+    def n_missing(self) -> int:
+        return self.n_slots - self.n_rows
+
+    def gaps(self):
+        """[(first missing time, last missing time, bars missing)] in time order."""
+        jump = np.diff(self.row_slot)
+        at = np.flatnonzero(jump > 1)
+        return [(self.t0 + int(self.row_slot[i] + 1) * self.step,
+                 self.t0 + int(self.row_slot[i + 1] - 1) * self.step,
+                 int(jump[i] - 1)) for i in at]
+
+    def slot_times(self) -> np.ndarray:
+        return self.t0 + np.arange(self.n_slots, dtype=np.int64) * self.step
+
+    def dense(self, values: np.ndarray, fill='nan'):
+        """
+        values laid out on every grid slot. fill='nan' leaves holes as NaN,
+        fill='ffill' carries the previous bar. Returns (dense, filled_mask).
+        """
+        values = np.asarray(values, dtype=np.float64)
+        present = self.slot_row >= 0
+        if fill == 'ffill':
+            src = np.maximum.accumulate(np.where(present, np.arange(self.n_slots), 0))
+            out = values[self.slot_row[src]]
+        elif fill == 'nan':
+            out = np.full(self.n_slots, np.nan)
+            out[present] = values[self.slot_row[present]]
+        else:
+            raise ValueError(f"unknown fill {fill!r}")
+        return out, ~present
+
+
+def grid_for(market='combined', symbol=DEFAULT_SYMBOL, root=None, step=None) -> BarGrid:
+    """Grid over the time column of a store market."""
+    time_col = time_col_of(market)
+    return BarGrid(read_columns(market, symbol, [time_col], root=root)[time_col], step)
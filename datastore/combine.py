@@ -0,0 +1,216 @@
+"""
+COMBINE PERP OHLC + FUNDING RATE (store-backed)
+Same result as fundingOI/combining_v2.py, in two modes:
+
+- memory: load both markets fully, sort, dedup, one merge_asof (the reference)
+- stream: walk perp partitions in time-ordered chunks, pull funding partitions
+          only as far as the chunk needs, and carry the last funding value
+          across chunk boundaries. Memory is bounded by one chunk plus one
+          month of output, so 1m bars over years / many symbols fit.
+
+Both modes write the 'combined' market:
+    bar_time, perp_open, perp_high, perp_low, perp_close, perp_volume, funding_rate,
+    funding_interval_hours
+funding_interval_hours is carried from the same print as funding_rate, so
+settlement schedules (engine.funding) follow interval changes per symbol.
+The combined CSV the scripts load is imported under its own market
+(datastore.store.CSV_MARKET), so rebuilding 'combined' never touches it.
+
+A resampled timeframe (datastore.resample) combines the same way:
+    python -m datastore.combine --perp-market perp_8h --out-market combined_8h
+
+Usage:
+    python -m datastore.combine --mode stream --chunk-rows 50000
+"""
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from datastore.store import (STORE_ROOT, DEFAULT_SYMBOL, list_partitions, partition_dir,
+                             read_columns, write_columns, write_partition, month_of)
+
+# ============ CONFIGURATION ============
+HOUR_MS = 3_600_000
+TOLERANCE_MS = 12 * HOUR_MS          # max gap between a bar and its funding print
+PERP_RENAME = {
+    'open': 'perp_open',
+    'high': 'perp_high',
+    'low': 'perp_low',
+    'close': 'perp_close',
+    'volume': 'perp_volume',
+}
+OUT_COLS = ['bar_time', 'perp_open', 'perp_high', 'perp_low', 'perp_close', 'perp_volume', 'funding_rate',
+            'funding_interval_hours']
+FUNDING_COLS = ['last_funding_rate', 'funding_interval_hours']
+
+
+def bar_time_of(close_time_ms: np.ndarray) -> np.ndarray:
+    """close_time (e.g. 03:59:59.999) floored to the hour -> bar_time (03:00)."""
+    return close_time_ms // HOUR_MS * HOUR_MS
+
+
+# ============ IN-MEMORY (reference) ============
+def combine_memory(perp: dict, funding: dict) -> dict:
+    """combining_v2.py on store columns: sort, dedup, backward merge_asof with 12h tolerance."""
+    p = pd.DataFrame({'bar_time': bar_time_of(perp['close_time']),
+                      **{new: perp[old] for old, new in PERP_RENAME.items()}})
+    p = p.sort_values('bar_time', kind='stable').drop_duplicates('bar_time')
+
+    f = pd.DataFrame({'bar_time': funding['calc_time'], 'funding_rate': funding['last_funding_rate'],
+                      'funding_interval_hours': funding['funding_interval_hours']})
+    f = f.sort_values('bar_time', kind='stable').drop_duplicates('bar_time')
+
+    combined = pd.merge_asof(p, f, on='bar_time', direction='backward', tolerance=TOLERANCE_MS)
+    combined = combined.dropna(subset=['funding_rate'])
+    combined['funding_interval_hours'] = combined['funding_interval_hours'].astype(np.int32)
+    return {c: combined[c].to_numpy() for c in OUT_COLS}
+
+
+# ============ STREAMING ============
+def _perp_chunks(symbol, root, chunk_rows, perp_market='perp'):
+    """Yield perp column chunks in time order, at most chunk_rows each."""
+    for m in list_partitions(perp_market, symbol, root):
+        cols = read_columns(perp_market, symbol, ['close_time'] + list(PERP_RENAME), m, _next_month(m), root)
+        n = len(cols['close_time'])
+        for i in range(0, n, chunk_rows):
+            yield {k: v[i:i + chunk_rows] for k, v in cols.items()}
+
+
+def _next_month(label):
+    return str(np.datetime64(label, 'M') + 1)
+
+
+class _FundingCursor:
+    """Funding prints pulled partition by partition; keeps one print of history."""
+
+    def __init__(self, symbol, root):
+        self.months = iter(list_partitions('funding', symbol, root))
+        self.symbol, self.root = symbol, root
+        self.t = np.empty(0, dtype=np.int64)
+        self.rate = np.empty(0, dtype=np.float64)
+        self.interval = np.empty(0, dtype=np.int32)
+        self.carry = None                # (t, rate, interval) of the last print before self.t
+        self.done = False
+
+    def _pull(self):
+        m = next(self.months, None)
+        if m is None:
+            self.done = True
+            return
+        cols = read_columns('funding', self.symbol, FUNDING_COLS, m, _next_month(m), self.root)
+        t, r = cols['calc_time'], cols['last_funding_rate']
+        keep = np.ones(len(t), dtype=bool)
+        keep[1:] = t[1:] != t[:-1]       # drop_duplicates keep='first'
+        if len(t) and len(self.t) and t[keep][0] <= self.t[-1]:
+            raise ValueError(f"funding partition {m} overlaps the previous one")
+        self.t = np.concatenate([self.t, t[keep]])
+        self.rate = np.concatenate([self.rate, r[keep]])
+        self.interval = np.concatenate([self.interval, cols['funding_interval_hours'][keep]])
+
+    def lookup(self, bar_t: np.ndarray):
+        """Backward as-of lookup for sorted bar times; returns (print time, rate, interval hours)."""
+        while not self.done and (len(self.t) == 0 or self.t[-1] <= bar_t[-1]):
+            self._pull()
+        idx = np.searchsorted(self.t, bar_t, side='right') - 1
+        ft = bar_t.copy()                # placeholder where there is no print (rate stays NaN)
+        fr = np.full(len(bar_t), np.nan)
+        fi = np.zeros(len(bar_t), dtype=np.int32)
+        ok = idx >= 0
+        ft[ok], fr[ok], fi[ok] = self.t[idx[ok]], self.rate[idx[ok]], self.interval[idx[ok]]
+        if self.carry is not None:
+            ft[~ok], fr[~ok], fi[~ok] = self.carry
+        # everything up to the last used print is history now; keep just that one
+        last = idx[-1]
+        if last >= 0:
+            self.carry = (self.t[last], self.rate[last], self.interval[last])
+            self.t, self.rate, self.interval = self.t[last + 1:], self.rate[last + 1:], self.interval[last + 1:]
+        return ft, fr, fi
+
+
+def combine_stream(symbol=DEFAULT_SYMBOL, root=None, chunk_rows=50_000, out_market='combined',
+                   perp_market='perp'):
+    """Chunked combine written straight to the store. Returns rows written."""
+    funding = _FundingCursor(symbol, root)
+    last_bar = None
+    buf, buf_month, written, months_out = [], None, 0, set()
+
+    def flush():
+        nonlocal buf, written
+        if buf:
+            part = {c: np.concatenate([b[c] for b in buf]) for c in OUT_COLS}
+            write_partition(out_market, symbol, buf_month, part, 'bar_time', root)
+            months_out.add(buf_month)
+            written += len(part['bar_time'])
+        buf = []
+
+    for chunk in _perp_chunks(symbol, root, chunk_rows, perp_market):
+        bt = bar_time_of(chunk['close_time'])
+        order = np.argsort(bt, kind='stable')
+        bt = bt[order]
+        keep = np.ones(len(bt), dtype=bool)
+        keep[1:] = bt[1:] != bt[:-1]
+        if last_bar is not None:
+            if bt[0] < last_bar:
+                raise ValueError("perp partitions are not in bar_time order")
+            keep &= bt != last_bar       # duplicate across the chunk boundary
+        sel = order[keep]
+        bt = bt[keep]
+        if len(bt) == 0:
+            continue
+        last_bar = bt[-1]
+
+        ft, fr, fi = funding.lookup(bt)
+        ok = ~np.isnan(fr) & (bt - ft <= TOLERANCE_MS)
+        out = {'bar_time': bt[ok], 'funding_rate': fr[ok], 'funding_interval_hours': fi[ok]}
+        for old, new in PERP_RENAME.items():
+            out[new] = chunk[old][sel][ok]
+
+        # group output by month; a finished month is flushed and forgotten
+        months = month_of(out['bar_time'])
+        for m in np.unique(months):
+            if m != buf_month:
+                flush()
+                buf_month = str(m)
+            sel_m = months == m
+            buf.append({c: out[c][sel_m] for c in OUT_COLS})
+    flush()
+
+    # months that no longer have any bars
+    for m in set(list_partitions(out_market, symbol, root)) - months_out:
+        shutil.rmtree(partition_dir(out_market, symbol, m, root))
+    return written
+
+
+def combine(mode='stream', symbol=DEFAULT_SYMBOL, root=None, chunk_rows=50_000, out_market='combined',
+            perp_market='perp'):
+    if mode == 'stream':
+        return combine_stream(symbol, root, chunk_rows, out_market, perp_market)
+    perp = read_columns(perp_market, symbol, ['close_time'] + list(PERP_RENAME), root=root)
+    funding = read_columns('funding', symbol, FUNDING_COLS, root=root)
+    out = combine_memory(perp, funding)
+    for m in list_partitions(out_market, symbol, root):
+        shutil.rmtree(partition_dir(out_market, symbol, m, root))
+    write_columns(out_market, out, 'bar_time', symbol, root)
+    return len(out['bar_time'])
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    ap = argparse.ArgumentParser(description="Combine perp OHLC with funding into the 'combined' market")
+    ap.add_argument('--mode', choices=['stream', 'memory'], default='stream')
+    ap.add_argument('--symbol', default=DEFAULT_SYMBOL)
+    ap.add_argument('--chunk-rows', type=int, default=50_000)
+    ap.add_argument('--perp-market', default='perp', help="e.g. perp_8h from datastore.resample")
+    ap.add_argument('--out-market', default='combined')
+    ap.add_argument('--root', default=str(STORE_ROOT))
+    args = ap.parse_args()
+
+    print("="*80)
+    print(f"COMBINING PERP OHLC + FUNDING RATE ({args.mode})")
+    print("="*80)
+    t0 = time.perf_counter()
+    n = combine(args.mode, args.symbol, args.root, args.chunk_rows, args.out_market, args.perp_market)
+    print(f"\n✅ {n} bars written to {args.root}/{args.out_market}/{args.symbol} in {time.perf_counter() - t0:.2f}s")
@@ -0,0 +1,196 @@
+"""
+INCREMENTAL INGESTION
+Replaces "glob everything, re-clean everything, rewrite the combined file".
+
+A manifest per symbol (barstore/_manifest/<symbol>.json) records every raw
+source file with size, mtime and content hash. One file per symbol lets
+several symbols ingest concurrently without clobbering each other. Each run:
+1. size + mtime unchanged            -> skip (no read at all)
+2. changed stat but same hash        -> refresh stat, skip
+3. new or changed content            -> clean that file only and upsert its
+                                        rows into the month partitions it touches
+
+Adding one new month therefore costs one file read + one partition write.
+Every partition of an ingested market is then validated (datastore.quality);
+reports are cached by partition digest, so only rewritten months are re-checked.
+Note: upserts never delete rows, so a source that shrinks leaves old rows behind
+(use --force after deleting the partition if that ever matters).
+
+Usage:
+    python -m datastore.ingest                      # all markets
+    python -m datastore.ingest --market funding
+"""
+import json
+import os
+import time
+import hashlib
+from pathlib import Path
+
+import pandas as pd
+
+from datastore.store import (STORE_ROOT, REPO_ROOT, DEFAULT_SYMBOL, merge_columns, frame_to_columns,
+                             month_of, time_col_of)
+from datastore.clean import clean_many
+from datastore.quality import validate_market, summarize_reports
+
+# ============ CONFIGURATION ============
+MANIFEST_DIR = '_manifest'
+LEGACY_MANIFEST_FILE = '_manifest.json'          # single shared manifest of older stores
+
+# market -> (raw folder, glob)
+SOURCES = {
+    'spot': (REPO_ROOT / '4hrs/spot', '{symbol}-4h-20*-*.csv'),
+    'perp': (REPO_ROOT / '4hrs/future', '{symbol}-4h-20*-*.csv'),
+    'funding': (REPO_ROOT / '4hrs/funding', '{symbol}-fundingRate-*.csv'),
+    # 1m base klines for datastore.resample (same Binance monthly dump layout)
+    'spot_1m': (REPO_ROOT / '1m/spot', '{symbol}-1m-20*-*.csv'),
+    'perp_1m': (REPO_ROOT / '1m/future', '{symbol}-1m-20*-*.csv'),
+}
+
+
+# ============ MANIFEST ============
+def manifest_path(symbol=DEFAULT_SYMBOL, root=None) -> Path:
+    return Path(root or STORE_ROOT) / MANIFEST_DIR / f"{symbol}.json"
+
+
+def load_manifest(root=None, symbol=DEFAULT_SYMBOL) -> dict:
+    path = manifest_path(symbol, root)
+    if path.exists():
+        with open(path) as f:
+            return json.load(f)
+    legacy = Path(root or STORE_ROOT) / LEGACY_MANIFEST_FILE
+    if legacy.exists():
+        with open(legacy) as f:
+            return {k: v for k, v in json.load(f).items() if v['symbol'] == symbol}
+    return {}
+
+
+def save_manifest(manifest: dict, root=None, symbol=DEFAULT_SYMBOL):
+    path = manifest_path(symbol, root)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.tmp-{os.getpid()}")
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def file_hash(path, block=1 << 20) -> str:
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(block), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def source_files(market, symbol=DEFAULT_SYMBOL, src=None):
+    folder, pattern = SOURCES[market]
+    return sorted(Path(src or folder).glob(pattern.format(symbol=symbol)))
+
+
+def plan(files, manifest) -> list:
+    """
+    Split files into work items. Returns [(path, key, stat, sha1_or_None, action)],
+    action in {'skip', 'touch', 'ingest'}.
+    """
+    items = []
+    for fp in files:
+        key = str(Path(fp).resolve())
+        st = os.stat(fp)
+        stat = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+        rec = manifest.get(key)
+        if rec and rec['size'] == stat['size'] and rec['mtime_ns'] == stat['mtime_ns']:
+            items.append((fp, key, stat, rec['sha1'], 'skip'))
+            continue
+        digest = file_hash(fp)
+        if rec and rec['sha1'] == digest:
+            items.append((fp, key, stat, digest, 'touch'))
+        else:
+            items.append((fp, key, stat, digest, 'ingest'))
+    return items
+
+
+# ============ INGEST ============
+def ingest(markets=('spot', 'perp', 'funding'), symbol=DEFAULT_SYMBOL, root=None, force=False,
+           workers=None, verbose=True):
+    """Clean and upsert new/changed raw files. Returns {market: [months touched]}."""
+    manifest = load_manifest(root, symbol)
+    if force:
+        manifest = {k: v for k, v in manifest.items() if v['market'] not in markets}
+    touched = {}
+
+    for market in markets:
+        items = plan(source_files(market, symbol), manifest)
+        n_new = sum(1 for it in items if it[4] == 'ingest')
+        if verbose:
+            print(f"\n{market}: {len(items)} files, {n_new} new/changed")
+
+        for fp, key, stat, digest, action in items:
+            if action == 'touch':
+                manifest[key].update(stat)
+
+        todo = [it for it in items if it[4] == 'ingest']
+        if not todo:
+            touched[market] = []
+            _validate(market, symbol, root, verbose)
+            continue
+
+        # clean changed files in parallel, then upsert once per touched month
+        frames, timings = clean_many([it[0] for it in todo], market, workers)
+        time_col = time_col_of(market)
+        combined = pd.concat(frames, ignore_index=True)
+        cols = frame_to_columns(combined, {time_col, 'close_time'} & set(combined.columns))
+        metas = merge_columns(market, cols, time_col, symbol, root)
+        months = {m['month'] for m in metas}
+
+        for (fp, key, stat, digest, _), df, secs in zip(todo, frames, timings['seconds']):
+            file_months = sorted(set(month_of(df[time_col].to_numpy())))
+            manifest[key] = {
+                'market': market,
+                'symbol': symbol,
+                **stat,
+                'sha1': digest,
+                'rows': int(len(df)),
+                'months': file_months,
+                'ingested_at': int(time.time()),
+            }
+            if verbose:
+                print(f"  + {Path(fp).name:40s} {len(df):7d} rows -> {','.join(file_months)} ({secs:.3f}s)")
+        save_manifest(manifest, root, symbol)
+
+        touched[market] = sorted(months)
+        _validate(market, symbol, root, verbose)
+
+    save_manifest(manifest, root, symbol)
+    return touched
+
+
+def _validate(market, symbol, root, verbose):
+    reports = validate_market(market, symbol, root)
+    if verbose:
+        fresh = sum(not r['cached'] for r in reports)
+        bad = summarize_reports(reports)
+        print(f"  quality: {fresh} partitions validated, {len(reports) - fresh} unchanged")
+        if bad:
+            print(bad)
+    return reports
+
+
+if __name__ == '__main__':
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Incrementally ingest raw kline/funding CSVs into the bar store")
+    ap.add_argument('--market', nargs='*', default=['spot', 'perp', 'funding'], choices=list(SOURCES))
+    ap.add_argument('--symbol', default=DEFAULT_SYMBOL)
+    ap.add_argument('--root', default=str(STORE_ROOT))
+    ap.add_argument('--force', action='store_true', help="ignore the manifest and re-ingest everything")
+    ap.add_argument('--workers', type=int, default=None, help="cleaning processes (default: all cores)")
+    args = ap.parse_args()
+
+    print("="*70)
+    print("INCREMENTAL INGEST")
+    print("="*70)
+    t0 = time.perf_counter()
+    touched = ingest(args.market, args.symbol, args.root, args.force, args.workers)
+    print(f"\n✅ Done in {time.perf_counter() - t0:.2f}s")
+    for market, months in touched.items():
+        print(f"  {market:8s}: {len(months)} partitions updated")
@@ -0,0 +1,85 @@
+"""
+TYPED RAW READERS
+Kline / funding CSV readers with an explicit dtype schema.
+
+The notebooks did pd.to_numeric on every value and then two masked
+pd.to_datetime calls (ms vs us) per time column. Here the C parser reads
+int64 epochs directly and one vectorized integer pass folds the us rows
+down to ms (ms rows untouched). Time stays int64 epoch-ms; no datetime objects are built.
+"""
+import numpy as np
+import pandas as pd
+
+from datastore.store import KLINE_COLS
+
+# ============ SCHEMA ============
+RAW_KLINE_COLS = KLINE_COLS + ['ignore']
+KLINE_SCHEMA = {
+    'open_time': np.int64,
+    'open': np.float64,
+    'high': np.float64,
+    'low': np.float64,
+    'close': np.float64,
+    'volume': np.float64,
+    'close_time': np.int64,
+    'quote_volume': np.float64,
+    'count': np.int32,
+    'taker_buy_volume': np.float64,
+    'taker_buy_quote_volume': np.float64,
+}
+
+FUNDING_COLS = ['calc_time', 'funding_interval_hours', 'last_funding_rate']
+FUNDING_SCHEMA = {
+    'calc_time': np.int64,
+    'funding_interval_hours': np.int32,
+    'last_funding_rate': np.float64,
+}
+
+# microseconds have 16 digits (>= 1e15); milliseconds ~ 13 digits (< 1e15)
+US_THRESHOLD = 1_000_000_000_000_000
+
+
+def has_header(path) -> bool:
+    """Binance dumps come both with and without a header row."""
+    with open(path, 'rb') as f:
+        first = f.read(1)
+    return not first.isdigit()
+
+
+def normalize_epoch_ms(t: np.ndarray) -> np.ndarray:
+    """Mixed ms / us int64 epochs -> ms, in one vectorized integer pass."""
+    return np.where(t >= US_THRESHOLD, t // 1000, t)
+
+
+# ============ READERS ============
+def read_klines(path) -> pd.DataFrame:
+    """Raw spot/futures kline CSV -> typed frame, times in epoch ms."""
+    df = pd.read_csv(
+        path,
+        header=0 if has_header(path) else None,
+        names=RAW_KLINE_COLS,
+        usecols=KLINE_COLS,
+        dtype=KLINE_SCHEMA,
+        engine='c',
+    )
+    for c in ('open_time', 'close_time'):
+        df[c] = normalize_epoch_ms(df[c].to_numpy())
+    return df[KLINE_COLS]
+
+
+def read_funding(path) -> pd.DataFrame:
+    """Raw fundingRate CSV -> typed frame, calc_time in epoch ms."""
+    header = pd.read_csv(path, nrows=0).columns.str.strip()
+    usecols = [c for c in FUNDING_COLS if c in header]
+    df = pd.read_csv(
+        path,
+        header=0,
+        names=list(header),
+        usecols=usecols,
+        dtype={c: FUNDING_SCHEMA[c] for c in usecols},
+        engine='c',
+    )
+    if 'funding_interval_hours' not in df.columns:
+        df['funding_interval_hours'] = np.int32(8)
+    df['calc_time'] = normalize_epoch_ms(df['calc_time'].to_numpy())
+    return df[FUNDING_COLS]
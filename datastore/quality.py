@@ -0,0 +1,270 @@
+"""
+DATA-QUALITY VALIDATION
+Vectorized checks per store partition, written as one JSON report each:
+    barstore/_quality/<market>/<symbol>/<YYYY-MM>.json
+
+Checks (combining_v2.py's printed checks, plus what the cleaning notebooks never did):
+- duplicates / unsorted     repeated or decreasing time stamps          (error)
+- nan                       missing prices / rates                       (error)
+- ohlc                      high >= open, close, low; low <= open, close (error)
+- close_time                close_time == open_time + interval - 1       (error)
+- gaps                      bars missing from the regular grid, inside   (warn)
+                            the partition and at its edges: up to the
+                            neighbouring partitions' bars or the month
+                            bounds, so whole missing months count too
+- misaligned                bar times off the partition's usual phase     (warn)
+                            of the interval grid
+- cadence                   funding prints not funding_interval_hours
+                            apart (ms jitter tolerated)                   (warn)
+- price_outliers            |robust z| of log returns above OUTLIER_Z     (warn)
+- volume_outliers           robust z of log volume above OUTLIER_Z        (warn)
+- rate_outliers             |funding rate| above FUNDING_RATE_MAX         (warn)
+
+A report carries the partition digest and the edges it was checked
+against; partitions whose data and neighbours are unchanged are not
+re-validated. datastore.ingest validates every market it touches.
+
+Usage:
+    python -m datastore.quality --market perp funding combined
+    python -m datastore.quality --market perp --force
+"""
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+from datastore.store import (STORE_ROOT, DEFAULT_SYMBOL, list_partitions, read_meta, read_partition,
+                             base_market, month_bounds)
+
+# ============ CONFIGURATION ============
+QUALITY_DIR = '_quality'
+QUALITY_VERSION = 2                  # bump when checks change: every report is recomputed
+HOUR_MS = 3_600_000
+CADENCE_TOLERANCE_MS = 60_000        # Binance calc_time jitters by a few ms
+OUTLIER_Z = 8.0                      # robust z-score (median / MAD) threshold
+FUNDING_RATE_MAX = 0.003             # |rate| per print; funding sits on 0.0001 most of the time, so no MAD
+MAX_EXAMPLES = 10                    # offending time stamps kept per check
+ERROR_CHECKS = {'duplicates', 'unsorted', 'nan', 'ohlc', 'close_time'}
+
+# interval suffixes written by datastore.resample; unsuffixed markets use the median spacing
+INTERVAL_MS = {'1m': 60_000, '1h': HOUR_MS, '4h': 4 * HOUR_MS, '8h': 8 * HOUR_MS, '1d': 24 * HOUR_MS}
+OHLC_COLS = {
+    'spot': ('open', 'high', 'low', 'close', 'volume'),
+    'perp': ('open', 'high', 'low', 'close', 'volume'),
+    'combined': ('perp_open', 'perp_high', 'perp_low', 'perp_close', 'perp_volume'),
+}
+
+
+def report_path(market, symbol, month, root=None) -> Path:
+    return Path(root or STORE_ROOT) / QUALITY_DIR / market / symbol / f"{month}.json"
+
+
+def interval_of(market, t: np.ndarray):
+    """Bar interval in ms: from the market suffix, else the median spacing."""
+    suffix = market.split('_', 1)[1] if '_' in market else None
+    if suffix in INTERVAL_MS:
+        return INTERVAL_MS[suffix]
+    d = np.diff(t)
+    d = d[d > 0]
+    return int(np.median(d)) if len(d) else None
+
+
+# ============ CHECKS ============
+def _hit(t, mask) -> dict:
+    idx = np.flatnonzero(mask)
+    return {'count': int(len(idx)), 'examples': [int(x) for x in t[idx[:MAX_EXAMPLES]]]}
+
+
+def _robust_z(x: np.ndarray) -> np.ndarray:
+    med = np.nanmedian(x)
+    mad = np.nanmedian(np.abs(x - med)) * 1.4826
+    if not np.isfinite(mad) or mad == 0:
+        return np.zeros_like(x)
+    return (x - med) / mad
+
+
+def check_time(t: np.ndarray, step, after=None, until=None) -> dict:
+    """
+    Duplicates, ordering, grid gaps and alignment for a sorted time column.
+    after / until (exclusive, None: no check) bound the grid the partition
+    answers for beyond its own bars, so bars missing before t[0] or after
+    t[-1] are gaps too (see partition_edges).
+    """
+    d = np.diff(t)
+    out = {
+        'duplicates': _hit(t[1:], d == 0),
+        'unsorted': _hit(t[1:], d < 0),
+    }
+    if step and len(t):
+        missing = np.where(d > step, d // step - 1, 0)
+        head = max((t[0] - after - 1) // step, 0) if after is not None else 0
+        tail = max((until - t[-1] - 1) // step, 0) if until is not None else 0
+        # a gap is reported at the bar before it; an edge gap at the first / last bar
+        gaps = _hit(np.r_[t[0], t[:-1], t[-1]], np.r_[head > 0, missing > 0, tail > 0])
+        gaps['missing_bars'] = int(missing.sum() + head + tail)
+        gaps['missing_head'] = int(head)
+        gaps['missing_tail'] = int(tail)
+        gaps['expected_bars'] = int((t[-1] - t[0]) // step + 1 + head + tail)
+        out['gaps'] = gaps
+        # combined bar_time sits at close-hour (03:00 for a 00:00 4h bar): compare to the usual phase
+        phase, n = np.unique(t % step, return_counts=True)
+        out['misaligned'] = _hit(t, t % step != phase[np.argmax(n)])
+    return out
+
+
+def check_ohlc(cols: dict, names, step=None, time_col='open_time') -> dict:
+    o, h, l, c, v = (cols[n] for n in names)
+    t = cols[time_col]
+    nan = np.isnan(o) | np.isnan(h) | np.isnan(l) | np.isnan(c)
+    bad = ~nan & ((h < np.maximum(o, c)) | (l > np.minimum(o, c)) | (h < l) | (l <= 0))
+    out = {'nan': _hit(t, nan), 'ohlc': _hit(t, bad)}
+    if 'close_time' in cols and step:
+        out['close_time'] = _hit(t, cols['close_time'] != t + step - 1)
+
+    r = np.full(len(c), np.nan)
+    r[1:] = np.log(c[1:] / c[:-1])
+    out['price_outliers'] = _hit(t, np.abs(_robust_z(r)) > OUTLIER_Z)
+    out['volume_outliers'] = _hit(t, _robust_z(np.log1p(np.clip(v, 0, None))) > OUTLIER_Z)
+    return out
+
+
+def check_funding(cols: dict) -> dict:
+    t = cols['calc_time']
+    rate = cols['last_funding_rate']
+    expected = cols['funding_interval_hours'].astype(np.int64) * HOUR_MS
+    d = np.diff(t)
+    off = np.abs(d - expected[1:]) > CADENCE_TOLERANCE_MS
+    return {
+        'nan': _hit(t, np.isnan(rate)),
+        'cadence': _hit(t[1:], off),
+        'misaligned': _hit(t, np.abs((t + HOUR_MS // 2) % HOUR_MS - HOUR_MS // 2) > CADENCE_TOLERANCE_MS),
+        'rate_outliers': _hit(t, np.abs(rate) > FUNDING_RATE_MAX),
+    }
+
+
+def check_partition(market, cols: dict, time_col: str, after=None, until=None):
+    """
+    All checks that apply to market (after / until: grid edges, see check_time).
+    Returns (checks {name: {'count', 'examples', ...}}, stats {name: value}).
+    """
+    t = np.asarray(cols[time_col], dtype=np.int64)
+    base = base_market(market)
+    days = (t[-1] - t[0]) / (24 * HOUR_MS) if len(t) > 1 else 0
+    if base == 'funding':
+        checks = check_time(t, None)
+        checks.update(check_funding(cols))
+        return checks, {'prints_per_day': round(float((len(t) - 1) / days), 3) if days else None}
+
+    step = interval_of(market, t)
+    checks = check_time(t, step, after, until)
+    checks.update(check_ohlc(cols, OHLC_COLS[base], step, time_col))
+    stats = {'interval_ms': step}
+    if base == 'combined':
+        fr = cols['funding_rate']
+        prices = np.column_stack([cols[n] for n in OHLC_COLS[base][:4]] + [fr])
+        checks['nan'] = _hit(t, np.isnan(prices).any(axis=1))
+        stats['funding_updates_per_day'] = round(float((fr[1:] != fr[:-1]).sum() / days), 3) if days else None
+    return checks, stats
+
+
+def status_of(checks: dict) -> str:
+    if any(checks[k]['count'] for k in ERROR_CHECKS & set(checks)):
+        return 'error'
+    if any(v['count'] for v in checks.values()):
+        return 'warn'
+    return 'ok'
+
+
+# ============ REPORTS ============
+def partition_edges(month, months):
+    """
+    (after, until) grid edges of a partition among the market's `months`:
+    the bars from the previous partition's month end (so whole missing months
+    land here) to this month's end. The first partition has no lower edge and
+    the last no upper one: the data starts and stops where it does.
+    """
+    k = months.index(month)
+    after = month_bounds(months[k - 1])[1] - 1 if k > 0 else None
+    until = month_bounds(month)[1] if k < len(months) - 1 else None
+    return after, until
+
+
+def validate_partition(market, symbol, month, root=None, force=False, months=None) -> dict:
+    """Report for one partition, recomputed only if the partition or its edges changed."""
+    meta = read_meta(market, symbol, month, root)
+    edges = list(partition_edges(month, list_partitions(market, symbol, root) if months is None else months))
+    path = report_path(market, symbol, month, root)
+    if not force and path.exists():
+        with open(path) as f:
+            report = json.load(f)
+        if (report.get('digest') == meta['digest'] and report.get('version') == QUALITY_VERSION
+                and report.get('edges') == edges):
+            report['cached'] = True
+            return report
+
+    cols = read_partition(market, symbol, month, root)
+    checks, stats = check_partition(market, cols, meta['time_col'], *edges)
+    report = {
+        'market': market,
+        'symbol': symbol,
+        'month': month,
+        'rows': meta['rows'],
+        'digest': meta['digest'],
+        'edges': edges,
+        'version': QUALITY_VERSION,
+        'status': status_of(checks),
+        'stats': stats,
+        'checks': checks,
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.tmp-{os.getpid()}")
+    with open(tmp, 'w') as f:
+        json.dump(report, f, indent=1)
+    os.replace(tmp, path)
+    report['cached'] = False
+    return report
+
+
+def validate_market(market, symbol=DEFAULT_SYMBOL, root=None, months=None, force=False) -> list:
+    """Reports for every partition of market/symbol (or just `months`)."""
+    every = list_partitions(market, symbol, root)
+    return [validate_partition(market, symbol, m, root, force, every) for m in (every if months is None else months)]
+
+
+def summarize_reports(reports) -> str:
+    """One line per non-ok partition, e.g. for ingest logs."""
+    lines = []
+    for r in reports:
+        if r['status'] == 'ok':
+            continue
+        hits = ', '.join(f"{k}={v['count']}" for k, v in r['checks'].items() if v['count'])
+        lines.append(f"  {r['status'].upper():5s} {r['market']}/{r['symbol']}/{r['month']}: {hits}")
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Validate bar store partitions and write quality reports")
+    ap.add_argument('--market', nargs='*', default=['spot', 'perp', 'funding', 'combined'])
+    ap.add_argument('--symbol', default=DEFAULT_SYMBOL)
+    ap.add_argument('--root', default=str(STORE_ROOT))
+    ap.add_argument('--force', action='store_true', help="re-validate unchanged partitions too")
+    args = ap.parse_args()
+
+    print("="*70)
+    print(f"DATA QUALITY: {args.symbol}")
+    print("="*70)
+    for market in args.market:
+        reports = validate_market(market, args.symbol, args.root, force=args.force)
+        if not reports:
+            continue
+        counts = {s: sum(r['status'] == s for r in reports) for s in ('ok', 'warn', 'error')}
+        fresh = sum(not r['cached'] for r in reports)
+        print(f"\n{market}: {len(reports)} partitions ({fresh} validated, {len(reports) - fresh} cached) | "
+              f"ok {counts['ok']}  warn {counts['warn']}  error {counts['error']}")
+        detail = summarize_reports(reports)
+        if detail:
+            print(detail)
+    print(f"\n✅ Reports in {Path(args.root) / QUALITY_DIR}")
@@ -0,0 +1,136 @@
+"""
+MULTI-TIMEFRAME RESAMPLING
+Derive 1h / 4h / 8h / 1d klines from 1m base klines already in the store.
+
+- One read of the base market feeds every timeframe: each timeframe is a
+  set of bucket boundaries and one np.<op>.reduceat per column
+- open = first, high = max, low = min, close = last,
+  volume / quote_volume / count / taker_buy_* = sum,
+  close_time = open_time + interval - 1 (Binance convention), n_base = 1m bars in the bucket
+- Buckets are aligned to UTC epoch multiples (1d = 00:00 UTC), same as the exchange files
+- Each timeframe is cached as its own market ('perp_1m' -> 'perp_4h', ...)
+- Updates only the tail: base bars are read from the start of the oldest
+  "last bucket" across the requested timeframes, and only buckets at or
+  after each timeframe's own last bucket are upserted. The last bucket
+  may be partial (n_base < interval / 1m); it is rebuilt on the next run.
+
+Usage:
+    python -m datastore.resample --market perp_1m --tf 1h 4h 8h 1d
+    python -m datastore.resample --market perp_1m --tf 8h --full
+"""
+import shutil
+
+import numpy as np
+
+from datastore.store import (STORE_ROOT, DEFAULT_SYMBOL, KLINE_COLS, list_partitions, partition_dir,
+                             read_meta, read_columns, write_columns, merge_columns, base_market)
+
+# ============ CONFIGURATION ============
+MINUTE_MS = 60_000
+TIMEFRAMES = {
+    '1h': 60 * MINUTE_MS,
+    '4h': 240 * MINUTE_MS,
+    '8h': 480 * MINUTE_MS,
+    '1d': 1440 * MINUTE_MS,
+}
+FIRST_COLS = ['open']
+MAX_COLS = ['high']
+MIN_COLS = ['low']
+LAST_COLS = ['close']
+SUM_COLS = ['volume', 'quote_volume', 'count', 'taker_buy_volume', 'taker_buy_quote_volume']
+OUT_COLS = KLINE_COLS + ['n_base']
+
+
+def derived_market(base: str, tf: str) -> str:
+    """'perp_1m' + '4h' -> 'perp_4h'."""
+    return f"{base_market(base)}_{tf}"
+
+
+# ============ CORE ============
+def resample_columns(cols: dict, tf_ms: int) -> dict:
+    """
+    Base kline columns (sorted by open_time) -> bars of tf_ms.
+    Every output column is one reduceat over the same bucket starts.
+    """
+    t = np.asarray(cols['open_time'], dtype=np.int64)
+    bucket = t // tf_ms * tf_ms
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    ends = np.r_[starts[1:], len(t)]
+
+    out = {'open_time': bucket[starts]}
+    for c in FIRST_COLS:
+        out[c] = cols[c][starts]
+    for c in MAX_COLS:
+        out[c] = np.maximum.reduceat(cols[c], starts)
+    for c in MIN_COLS:
+        out[c] = np.minimum.reduceat(cols[c], starts)
+    for c in LAST_COLS:
+        out[c] = cols[c][ends - 1]
+    out['close_time'] = out['open_time'] + (tf_ms - 1)
+    for c in SUM_COLS:
+        v = cols[c]
+        out[c] = np.add.reduceat(v.astype(np.int64) if v.dtype.kind in 'iu' else v, starts)
+    out['n_base'] = (ends - starts).astype(np.int64)
+    return {c: out[c] for c in OUT_COLS}
+
+
+def _last_bucket(market, symbol, root):
+    """open_time of the newest cached bar of a derived market, or None."""
+    months = list_partitions(market, symbol, root)
+    if not months:
+        return None
+    return read_meta(market, symbol, months[-1], root)['t_max']
+
+
+def resample(base='perp_1m', timeframes=('1h', '4h', '8h', '1d'), symbol=DEFAULT_SYMBOL,
+             root=None, full=False):
+    """
+    Build or extend each derived timeframe from `base`.
+    Returns {derived market: bars upserted}.
+    """
+    tfs = {tf: TIMEFRAMES[tf] for tf in timeframes}
+    last = {tf: None if full else _last_bucket(derived_market(base, tf), symbol, root) for tf in tfs}
+
+    # one read covers the oldest bucket any timeframe has to rebuild
+    start = None if any(v is None for v in last.values()) else min(last.values())
+    cols = read_columns(base, symbol, [c for c in KLINE_COLS if c != 'open_time'], start, None, root)
+    written = {derived_market(base, tf): 0 for tf in tfs}
+    if len(cols['open_time']) == 0:
+        return written
+
+    for tf, tf_ms in tfs.items():
+        market = derived_market(base, tf)
+        bars = resample_columns(cols, tf_ms)
+        if last[tf] is None:
+            for m in list_partitions(market, symbol, root):
+                shutil.rmtree(partition_dir(market, symbol, m, root))
+            write_columns(market, bars, 'open_time', symbol, root)
+        else:
+            keep = bars['open_time'] >= last[tf]   # earlier buckets were only partly read
+            bars = {c: v[keep] for c, v in bars.items()}
+            if len(bars['open_time']):
+                merge_columns(market, bars, 'open_time', symbol, root)
+        written[market] = len(bars['open_time'])
+    return written
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    ap = argparse.ArgumentParser(description="Resample 1m base klines into higher timeframes")
+    ap.add_argument('--market', default='perp_1m', help="base market in the store (e.g. perp_1m, spot_1m)")
+    ap.add_argument('--tf', nargs='*', default=list(TIMEFRAMES), choices=list(TIMEFRAMES))
+    ap.add_argument('--symbol', default=DEFAULT_SYMBOL)
+    ap.add_argument('--root', default=str(STORE_ROOT))
+    ap.add_argument('--full', action='store_true', help="rebuild every timeframe from scratch")
+    args = ap.parse_args()
+
+    print("="*70)
+    print(f"RESAMPLING {args.market} {args.symbol} -> {', '.join(args.tf)}")
+    print("="*70)
+    t0 = time.perf_counter()
+    written = resample(args.market, args.tf, args.symbol, args.root, args.full)
+    for market, n in written.items():
+        print(f"  {market:12s} {n:8d} bars upserted")
+    print(f"\n✅ Done in {time.perf_counter() - t0:.2f}s")
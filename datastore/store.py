@@ -0,0 +1,408 @@
+"""
+BAR STORE
+Columnar, typed, month-partitioned storage for cleaned klines and funding.
+
+Layout (one directory per partition, one .npy file per column):
+    barstore/<market>/<symbol>/<YYYY-MM>/<column>.npy
+    barstore/<market>/<symbol>/<YYYY-MM>/_meta.json
+
+- Time is kept as int64 epoch milliseconds (UTC), sorted within a partition
+- Reads only open the requested columns (projection)
+- start/end prune whole months first, then slice inside a month (pushdown)
+
+Usage (build the store from the raw files and the combined CSV):
+    python -m datastore.store
+"""
+import json
+import os
+import shutil
+import hashlib
+from pathlib import Path, PureWindowsPath
+
+import numpy as np
+import pandas as pd
+
+# ============ CONFIGURATION ============
+REPO_ROOT = Path(__file__).resolve().parents[1]
+STORE_ROOT = REPO_ROOT / 'barstore'
+DEFAULT_SYMBOL = 'BTCUSDT'
+COMBINED_CSV = REPO_ROOT / 'BTC_perp_funding_combined_OHLC.csv'
+# the combined CSV is imported under its own market; 'combined' itself is what
+# datastore.combine rebuilds from the raw perp + funding partitions
+CSV_MARKET = 'combined_csv'
+
+META_FILE = '_meta.json'
+
+# Time column used to partition each market; an interval suffix
+# ('perp_1m', 'perp_8h', 'combined_8h') keeps the base market's time column
+TIME_COLS = {
+    'spot': 'open_time',
+    'perp': 'open_time',
+    'funding': 'calc_time',
+    'combined': 'bar_time',
+}
+
+# Canonical kline column names (futures naming); spot CSVs use the long names
+KLINE_COLS = [
+    'open_time', 'open', 'high', 'low', 'close', 'volume',
+    'close_time', 'quote_volume', 'count',
+    'taker_buy_volume', 'taker_buy_quote_volume',
+]
+SPOT_RENAME = {
+    'quote_asset_volume': 'quote_volume',
+    'number_of_trades': 'count',
+    'taker_buy_base_asset_volume': 'taker_buy_volume',
+    'taker_buy_quote_asset_volume': 'taker_buy_quote_volume',
+}
+
+
+def base_market(market: str) -> str:
+    """'perp_1m' -> 'perp'."""
+    return market.split('_', 1)[0]
+
+
+def time_col_of(market: str) -> str:
+    return TIME_COLS[base_market(market)]
+
+
+# ============ TIME HELPERS ============
+def to_epoch_ms(values) -> np.ndarray:
+    """Datetime-like (Series, strings, Timestamps) -> int64 epoch ms (UTC)."""
+    s = pd.to_datetime(pd.Series(values), utc=True, errors='coerce', format='ISO8601')
+    if s.isna().any():
+        raise ValueError(f"{int(s.isna().sum())} unparseable timestamps")
+    return s.dt.tz_convert('UTC').dt.tz_localize(None).to_numpy().astype('datetime64[ms]').astype(np.int64)
+
+
+def _as_ms(t):
+    """Query bound -> epoch ms (accepts int ms, str, Timestamp, datetime)."""
+    if t is None:
+        return None
+    if isinstance(t, (int, np.integer)):
+        return int(t)
+    ts = pd.Timestamp(t)
+    if ts.tzinfo is None:
+        ts = ts.tz_localize('UTC')
+    return int(ts.value // 1_000_000)
+
+
+def month_of(ms: np.ndarray) -> np.ndarray:
+    """Epoch ms -> 'YYYY-MM' labels."""
+    return np.asarray(ms, dtype='int64').astype('datetime64[ms]').astype('datetime64[M]').astype(str)
+
+
+def month_bounds(label: str):
+    """'YYYY-MM' -> [first ms, first ms of next month)."""
+    m = np.datetime64(label, 'M')
+    lo = m.astype('datetime64[ms]').astype(np.int64)
+    hi = (m + 1).astype('datetime64[ms]').astype(np.int64)
+    return int(lo), int(hi)
+
+
+# ============ PARTITION I/O ============
+def partition_dir(market, symbol=DEFAULT_SYMBOL, month=None, root=None) -> Path:
+    base = Path(root or STORE_ROOT) / market / symbol
+    return base / month if month else base
+
+
+def list_partitions(market, symbol=DEFAULT_SYMBOL, root=None):
+    """Sorted month labels that exist for market/symbol."""
+    base = partition_dir(market, symbol, root=root)
+    if not base.exists():
+        return []
+    return sorted(p.name for p in base.iterdir() if (p / META_FILE).exists())
+
+
+def read_meta(market, symbol, month, root=None) -> dict:
+    with open(partition_dir(market, symbol, month, root) / META_FILE) as f:
+        return json.load(f)
+
+
+def write_partition(market, symbol, month, columns: dict, time_col: str, root=None, source=None) -> dict:
+    """
+    Write one month partition atomically (temp dir, then swap).
+    `columns` maps name -> 1-D array; rows are sorted by time_col here.
+    `source` (optional) is recorded in the meta as where the rows came from.
+    """
+    t = np.asarray(columns[time_col], dtype=np.int64)
+    order = np.argsort(t, kind='stable')
+    cols = {k: np.ascontiguousarray(np.asarray(v)[order]) for k, v in columns.items()}
+    cols[time_col] = t[order]
+
+    final = partition_dir(market, symbol, month, root)
+    final.parent.mkdir(parents=True, exist_ok=True)
+    tmp = final.parent / f".{month}.tmp-{os.getpid()}"
+    if tmp.exists():
+        shutil.rmtree(tmp)
+    tmp.mkdir()
+
+    digest = hashlib.sha1()
+    for name, arr in cols.items():
+        np.save(tmp / f"{name}.npy", arr, allow_pickle=False)
+        digest.update(name.encode())
+        digest.update(arr.tobytes())
+
+    meta = {
+        'market': market,
+        'symbol': symbol,
+        'month': month,
+        'time_col': time_col,
+        'rows': int(len(t)),
+        't_min': int(cols[time_col][0]) if len(t) else None,
+        't_max': int(cols[time_col][-1]) if len(t) else None,
+        'columns': {k: str(v.dtype) for k, v in cols.items()},
+        'digest': digest.hexdigest(),
+    }
+    if source is not None:
+        meta['source'] = source
+    with open(tmp / META_FILE, 'w') as f:
+        json.dump(meta, f, indent=1)
+
+    old = final.parent / f".{month}.old-{os.getpid()}"
+    if final.exists():
+        os.replace(final, old)
+    os.replace(tmp, final)
+    if old.exists():
+        shutil.rmtree(old)
+    return meta
+
+
+def write_columns(market, columns: dict, time_col=None, symbol=DEFAULT_SYMBOL, root=None, source=None):
+    """Split columns by month of time_col and (over)write each month partition."""
+    time_col = time_col or time_col_of(market)
+    t = np.asarray(columns[time_col], dtype=np.int64)
+    months = month_of(t)
+    metas = []
+    for m in np.unique(months):
+        sel = months == m
+        part = {k: np.asarray(v)[sel] for k, v in columns.items()}
+        metas.append(write_partition(market, symbol, str(m), part, time_col, root, source))
+    return metas
+
+
+def drop_market(market, symbol=DEFAULT_SYMBOL, root=None):
+    """Remove every month partition of market/symbol."""
+    for m in list_partitions(market, symbol, root):
+        shutil.rmtree(partition_dir(market, symbol, m, root))
+
+
+def read_partition(market, symbol, month, root=None) -> dict:
+    """All columns of one partition (fully loaded, not memory-mapped)."""
+    pdir = partition_dir(market, symbol, month, root)
+    meta = read_meta(market, symbol, month, root)
+    return {c: np.load(pdir / f"{c}.npy") for c in meta['columns']}
+
+
+def merge_columns(market, columns: dict, time_col=None, symbol=DEFAULT_SYMBOL, root=None):
+    """
+    Upsert rows into the month partitions they fall in.
+    Only touched months are read and rewritten; on duplicate time the new row wins.
+    """
+    time_col = time_col or time_col_of(market)
+    t = np.asarray(columns[time_col], dtype=np.int64)
+    months = month_of(t)
+    existing = set(list_partitions(market, symbol, root))
+    metas = []
+    for m in np.unique(months):
+        m = str(m)
+        sel = months == m
+        both = {k: np.asarray(v)[sel] for k, v in columns.items()}
+        if m in existing:
+            old = read_partition(market, symbol, m, root)
+            if set(old) != set(both):
+                raise ValueError(f"{market}/{symbol}/{m}: columns differ {sorted(old)} vs {sorted(both)}")
+            both = {k: np.concatenate([old[k], both[k].astype(old[k].dtype)]) for k in old}
+        tt = np.asarray(both[time_col], dtype=np.int64)
+        order = np.argsort(tt, kind='stable')
+        ts = tt[order]
+        keep = np.ones(len(ts), dtype=bool)
+        keep[:-1] = ts[1:] != ts[:-1]            # keep last of each run = newest row
+        new = {k: np.asarray(v)[order][keep] for k, v in both.items()}
+        metas.append(write_partition(market, symbol, m, new, time_col, root))
+    return metas
+
+
+def frame_to_columns(df: pd.DataFrame, time_cols) -> dict:
+    """DataFrame -> column dict, converting datetime columns to epoch ms."""
+    out = {}
+    for c in df.columns:
+        if c in time_cols:
+            v = df[c]
+            out[c] = v.to_numpy(np.int64) if pd.api.types.is_integer_dtype(v) else to_epoch_ms(v)
+        elif pd.api.types.is_bool_dtype(df[c]) or pd.api.types.is_numeric_dtype(df[c]):
+            out[c] = df[c].to_numpy()
+        else:
+            raise TypeError(f"column {c!r} is not numeric; drop it before storing")
+    return out
+
+
+def write_frame(market, df: pd.DataFrame, time_col=None, symbol=DEFAULT_SYMBOL, root=None, source=None):
+    """Store a cleaned DataFrame (datetime or epoch-ms time columns)."""
+    time_col = time_col or time_col_of(market)
+    time_cols = {time_col, 'close_time'} & set(df.columns)
+    return write_columns(market, frame_to_columns(df, time_cols), time_col, symbol, root, source)
+
+
+# ============ READ (projection + pushdown) ============
+def read_columns(market, symbol=DEFAULT_SYMBOL, columns=None, start=None, end=None, root=None) -> dict:
+    """
+    Read [start, end) for market/symbol as a dict of numpy arrays.
+    Only the requested columns are opened; the time column is always included.
+    """
+    lo, hi = _as_ms(start), _as_ms(end)
+    months = list_partitions(market, symbol, root)
+    if not months:
+        raise FileNotFoundError(f"no partitions for {market}/{symbol} under {root or STORE_ROOT}")
+
+    meta = read_meta(market, symbol, months[0], root)
+    time_col = meta['time_col']
+    wanted = [time_col] + [c for c in (columns or meta['columns']) if c != time_col]
+
+    pieces = {c: [] for c in wanted}
+    for m in months:
+        m_lo, m_hi = month_bounds(m)
+        if (lo is not None and m_hi <= lo) or (hi is not None and m_lo >= hi):
+            continue
+        pdir = partition_dir(market, symbol, m, root)
+        t = np.load(pdir / f"{time_col}.npy", mmap_mode='r')
+        i0 = 0 if lo is None else int(np.searchsorted(t, lo, side='left'))
+        i1 = len(t) if hi is None else int(np.searchsorted(t, hi, side='left'))
+        if i1 <= i0:
+            continue
+        for c in wanted:
+            arr = t if c == time_col else np.load(pdir / f"{c}.npy", mmap_mode='r')
+            pieces[c].append(arr[i0:i1])
+
+    out = {}
+    for c in wanted:
+        if pieces[c]:
+            out[c] = np.concatenate(pieces[c])
+        else:
+            out[c] = np.empty(0, dtype=meta['columns'].get(c, 'float64'))
+    return out
+
+
+def read_frame(market, symbol=DEFAULT_SYMBOL, columns=None, start=None, end=None,
+               root=None, index=True) -> pd.DataFrame:
+    """read_columns() as a DataFrame; time columns become UTC datetimes."""
+    cols = read_columns(market, symbol, columns, start, end, root)
+    time_col = next(iter(cols))
+    df = pd.DataFrame(cols)
+    for c in (time_col, 'close_time'):
+        if c in df.columns:
+            df[c] = pd.to_datetime(df[c], unit='ms', utc=True)
+    return df.set_index(time_col) if index else df
+
+
+# ============ CSV IMPORT ============
+def file_digest(path) -> str:
+    """sha1 of a file's bytes."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _file_name(path) -> str:
+    """Last component of a POSIX or Windows path (scripts carry both)."""
+    return PureWindowsPath(path).name
+
+
+def _file_stat(path) -> dict:
+    """Name, size and mtime of a file: the cheap half of its source."""
+    st = os.stat(path)
+    return {'file': _file_name(path), 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+
+def csv_source(path) -> dict:
+    """The `source` an imported CSV stamps on its partitions."""
+    return {**_file_stat(path), 'sha1': file_digest(path)}
+
+
+def import_csv(path, market, time_col=None, symbol=DEFAULT_SYMBOL, root=None):
+    """
+    Parse a cleaned CSV once and write it into the store, each partition's
+    meta recording the file's name, size, mtime and sha1 as its source.
+    """
+    time_col = time_col or time_col_of(market)
+    df = pd.read_csv(path)
+    df = df.drop(columns=[c for c in df.columns if c.startswith('Unnamed')])
+    if base_market(market) in ('spot', 'perp'):
+        df = df.rename(columns=SPOT_RENAME)
+    df = df.dropna(subset=[time_col])
+    df = df.drop_duplicates(subset=[time_col])
+    return write_frame(market, df, time_col, symbol, root, csv_source(path))
+
+
+def stored_sources(market, symbol=DEFAULT_SYMBOL, root=None) -> list:
+    """The source of every partition of market/symbol (None: not imported from a CSV)."""
+    return [read_meta(market, symbol, m, root).get('source') for m in list_partitions(market, symbol, root)]
+
+
+def ensure_combined(csv_path=COMBINED_CSV, symbol=DEFAULT_SYMBOL, root=None):
+    """
+    Make the CSV_MARKET partitions hold exactly csv_path.
+
+    Kept when every partition was stamped by a file of csv_path's name, size
+    and mtime (a stat, no read); otherwise the partitions are dropped and
+    csv_path re-imported (unchanged bytes under a new mtime give the same
+    partition digests, so the bar cache is not rebuilt). A csv_path that is
+    not on disk can only be matched by file name, and csv_path=None takes
+    whatever the store has.
+    """
+    sources = stored_sources(CSV_MARKET, symbol, root)
+    if csv_path is None:
+        if not sources:
+            raise FileNotFoundError(f"no {CSV_MARKET} partitions for {symbol}")
+        return
+    name = _file_name(csv_path)
+    if not Path(csv_path).exists():
+        if sources and all(s is not None and s['file'] == name for s in sources):
+            return
+        raise FileNotFoundError(f"no CSV at {csv_path} and the {CSV_MARKET} store for {symbol} "
+                                f"was not imported from a file named {name}")
+    stat = _file_stat(csv_path)
+    if sources and all(s is not None and {k: s.get(k) for k in stat} == stat for s in sources):
+        return
+    drop_market(CSV_MARKET, symbol, root)
+    import_csv(csv_path, CSV_MARKET, 'bar_time', symbol, root)
+
+
+def load_combined(csv_path=COMBINED_CSV, columns=None, start=None, end=None,
+                  symbol=DEFAULT_SYMBOL, root=None) -> pd.DataFrame:
+    """
+    Combined perp + funding bars indexed by bar_time (UTC), same shape the
+    backtests build with read_csv/to_datetime/set_index.
+    The first call imports csv_path into the store (CSV_MARKET); later calls
+    only stat the CSV and re-import it if it changed (see ensure_combined).
+    """
+    ensure_combined(csv_path, symbol, root)
+    return read_frame(CSV_MARKET, symbol, columns, start, end, root, index=True)
+
+
+# ============ BUILD FROM REPO CSVs ============
+def build_from_repo(root=None, symbol=DEFAULT_SYMBOL):
+    """Ingest the raw monthly tree under 4hrs/ and import the combined file."""
+    from datastore.ingest import ingest
+
+    ingest(symbol=symbol, root=root)
+    if COMBINED_CSV.exists():
+        drop_market(CSV_MARKET, symbol, root)
+        metas = import_csv(COMBINED_CSV, CSV_MARKET, 'bar_time', symbol, root)
+        print(f"\n{CSV_MARKET}: {COMBINED_CSV.name} -> {len(metas)} partitions, {sum(m['rows'] for m in metas)} rows")
+
+
+if __name__ == '__main__':
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Build the bar store from the cleaned CSVs")
+    ap.add_argument('--root', default=str(STORE_ROOT))
+    ap.add_argument('--symbol', default=DEFAULT_SYMBOL)
+    args = ap.parse_args()
+
+    print("="*70)
+    print("BUILDING BAR STORE")
+    print("="*70)
+    build_from_repo(args.root, args.symbol)
+    print(f"\n✅ Store ready at: {args.root}")
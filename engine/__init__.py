@@ -0,0 +1,4 @@
+"""
+ENGINE
+Backtest kernels and analytics over the bar store.
+"""
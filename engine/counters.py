@@ -0,0 +1,67 @@
+"""
+EVENT COUNTERS
+O(1) "how many / is there any" questions about a boolean bar mask
+(settlement bars, funding-pinned bars, fresh funding lows ...).
+
+    PrefixCount      count of True in bars [a, b]     cum[b + 1] - cum[a]
+    NextOccurrence   first True at or after bar a     next_at[a]
+                     any True in bars [a, b]          next_at[a] <= b
+
+Both are built once in O(n), so a multi-position loop that asks per open
+trade per bar stays linear in the data length instead of re-summing a slice
+since entry. Lookups take scalars or arrays.
+
+Usage:
+    settles = PrefixCount(df['is_settle'])
+    settles.between(entry_i, i)                  # settlements since entry, inclusive
+    fresh = NextOccurrence(fresh_low)
+    fresh.any_between(i - 2, i)                  # a fresh low in the last 3 bars
+"""
+import numpy as np
+
+
+def _mask(values) -> np.ndarray:
+    """Boolean array from a bool / 0-1 Series or array (NaN counts as False)."""
+    v = np.asarray(values)
+    if v.dtype.kind == 'f':
+        v = np.nan_to_num(v, nan=0.0)
+    return v.astype(bool)
+
+
+class PrefixCount:
+    """Cumulative count of True bars."""
+
+    def __init__(self, mask):
+        m = _mask(mask)
+        self.n = len(m)
+        self.cum = np.zeros(self.n + 1, dtype=np.int64)
+        np.cumsum(m, out=self.cum[1:])
+
+    def between(self, a, b):
+        """True bars in [a, b] (inclusive, clipped to the data); 0 for an empty range."""
+        a = np.clip(a, 0, self.n)
+        b = np.clip(np.asarray(b) + 1, 0, self.n)
+        return np.maximum(self.cum[b] - self.cum[a], 0)
+
+    def upto(self, b):
+        """True bars in [0, b]."""
+        return self.between(0, b)
+
+
+class NextOccurrence:
+    """Index of the next True bar at or after each bar (n if none)."""
+
+    def __init__(self, mask):
+        m = _mask(mask)
+        self.n = len(m)
+        pos = np.where(m, np.arange(self.n), self.n)
+        # suffix minimum: nearest True at or to the right of each bar
+        self.next_at = np.append(np.minimum.accumulate(pos[::-1])[::-1], self.n)
+
+    def next(self, a):
+        """First True bar >= a (n if none)."""
+        return self.next_at[np.clip(a, 0, self.n)]
+
+    def any_between(self, a, b):
+        """Whether any bar in [a, b] (inclusive) is True."""
+        return self.next(a) <= np.minimum(b, self.n - 1)
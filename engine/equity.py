@@ -0,0 +1,139 @@
+"""
+MARK-TO-MARKET EQUITY
+Per-bar equity and exposure of a trade log with every open position marked
+at the bar's close, instead of pnl_pct.cumsum() over closed trades (which
+only moves on exit bars and hides the drawdown of several same-side
+positions sliding together).
+
+Per bar k:
+    realized    pnl of the trades that exited at or before k (the log's own pnl)
+    unrealized  sum over open trades of  side * notional * (close[k] / entry_price - 1)
+                minus their round-trip fee (what closing them at k would book)
+    funding     settlements from entry bar through exit bar, exchange sign (a positive
+                rate costs longs), as engine.funding.FundingAccrual.pnl books them
+    equity      realized + unrealized + funding
+
+A trade is open on bars [entry_bar, exit_bar): at its exit bar it is
+realized at its own exit price. Every per-position sum is a difference
+array (+ at the entry bar, - at the exit bar) and one cumsum, and the
+unrealized sum factors as close[k] * sum(side * notional / entry_price) -
+sum((side + fee) * notional), so the whole curve is O(bars + trades) with
+no loop over bars.
+
+Units follow `notional`: the default 100 gives % of one position's size,
+the units of pnl_pct (the closed-trade curve of the scripts); a USD
+notional with a USD pnl column gives dollars.
+
+Usage:
+    curve = mark_to_market(df['perp_close'], records, fee=0.0008,
+                           accrual=FundingAccrual(df['funding_rate'], settlement_count(df.index)))
+    equity_stats(curve)          # true max drawdown, time in market, exposure
+    curve = mark_to_market(df['perp_close'], trades_df)                 # entry/exit times -> bars
+"""
+import numpy as np
+import pandas as pd
+
+from engine.funding import side_sign
+
+# ============ CONFIGURATION ============
+DEFAULT_NOTIONAL = 100.0             # % of one position, as pnl_pct
+CURVE_COLS = ['equity', 'realized', 'unrealized', 'funding', 'positions', 'gross_exposure', 'net_exposure']
+
+
+# ============ INPUT ============
+def _trade_bars(cols: dict, index, key):
+    """Bar numbers of entries / exits: the *_bar column, or the *_time column looked up in index."""
+    if f'{key}_bar' in cols:
+        return np.asarray(cols[f'{key}_bar'], dtype=np.int64)
+    if index is None or f'{key}_time' not in cols:
+        raise KeyError(f"trades need {key}_bar, or {key}_time and the bar index")
+    bars = index.get_indexer(pd.DatetimeIndex(cols[f'{key}_time']))
+    if (bars < 0).any():
+        raise ValueError(f"{int((bars < 0).sum())} {key} times are not bars of the index")
+    return bars.astype(np.int64)
+
+
+def _window_sum(weights, lo, hi, n) -> np.ndarray:
+    """Per bar k, the sum of weights over trades with lo <= k < hi."""
+    delta = np.bincount(lo, weights, minlength=n + 1) - np.bincount(hi, weights, minlength=n + 1)
+    return np.cumsum(delta)[:n]
+
+
+# ============ CURVE ============
+def mark_to_market(close, trades, fee=0.0, accrual=None, notional=DEFAULT_NOTIONAL, pnl='pnl_pct',
+                   index=None) -> pd.DataFrame:
+    """
+    One row per bar (CURVE_COLS). trades: a TRADE_DTYPE record array, a
+    trades DataFrame or a dict of columns with entry/exit bars (or times),
+    entry_price, pnl and side (all long if absent). fee is the round-trip
+    fee rate the pnl column was charged; accrual a FundingAccrual of the same
+    bars (None: no funding).
+    """
+    index = close.index if index is None and isinstance(close, pd.Series) else index
+    close = np.asarray(close, dtype=np.float64)
+    n = len(close)
+    if isinstance(trades, np.ndarray) and trades.dtype.names:
+        cols = {k: trades[k] for k in trades.dtype.names}
+    elif isinstance(trades, pd.DataFrame):
+        cols = {k: trades[k].to_numpy() for k in trades.columns}
+    else:
+        cols = dict(trades)
+
+    e, x = _trade_bars(cols, index, 'entry'), _trade_bars(cols, index, 'exit')
+    side = side_sign(cols['side']) if 'side' in cols else np.ones(len(e))
+    size = np.broadcast_to(np.asarray(notional, dtype=np.float64), e.shape)
+    ep = np.asarray(cols['entry_price'], dtype=np.float64)
+
+    realized = np.cumsum(np.bincount(x, np.asarray(cols[pnl], dtype=np.float64), minlength=n)[:n])
+    positions = np.cumsum(np.bincount(e, minlength=n + 1) - np.bincount(x, minlength=n + 1))[:n]
+    flat = positions == 0                # no open trade: drop the cumsum's rounding residue
+    units = np.where(flat, 0.0, _window_sum(side * size / ep, e, x, n))
+    cost = np.where(flat, 0.0, _window_sum((side + fee) * size, e, x, n))
+    gross = np.where(flat, 0.0, close * _window_sum(size / ep, e, x, n))
+
+    if accrual is None:
+        funding = np.zeros(n)
+    else:
+        paid = np.diff(accrual.cum)[:n]
+        funding = -np.cumsum(_window_sum(side * size, e, x + 1, n) * paid)
+
+    unrealized = close * units - cost
+    return pd.DataFrame({
+        'equity': realized + unrealized + funding,
+        'realized': realized,
+        'unrealized': unrealized,
+        'funding': funding,
+        'positions': positions,
+        'gross_exposure': gross,
+        'net_exposure': close * units,
+    }, index=index if index is not None else pd.RangeIndex(n))
+
+
+# ============ STATS ============
+def _max_drawdown(eq: np.ndarray) -> float:
+    """Largest fall from a running peak, starting flat at 0."""
+    eq = np.r_[0.0, eq]
+    return float((np.maximum.accumulate(eq) - eq).max())
+
+
+def equity_stats(curve: pd.DataFrame) -> dict:
+    """
+    Headline numbers of a mark_to_market curve: drawdowns (marked and
+    closed-trade only) and exposure in its units, time in market in % of
+    bars, average gross exposure over the bars in the market.
+    """
+    if len(curve) == 0:
+        return {'final_equity': 0.0, 'max_drawdown': 0.0, 'closed_max_drawdown': 0.0, 'time_in_market': np.nan,
+                'max_positions': 0, 'avg_gross_exposure': 0.0, 'max_gross_exposure': 0.0}
+    eq = curve['equity'].to_numpy()
+    in_market = curve['positions'].to_numpy() > 0
+    gross = curve['gross_exposure'].to_numpy()
+    return {
+        'final_equity': float(eq[-1]),
+        'max_drawdown': _max_drawdown(eq),
+        'closed_max_drawdown': _max_drawdown(curve['realized'].to_numpy()),
+        'time_in_market': float(in_market.mean() * 100),
+        'max_positions': int(curve['positions'].max()),
+        'avg_gross_exposure': float(gross[in_market].mean()) if in_market.any() else 0.0,
+        'max_gross_exposure': float(gross.max()),
+    }
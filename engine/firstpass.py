@@ -0,0 +1,143 @@
+"""
+FIRST-PASSAGE INDEX
+"When does this position first hit its stop / target?" for any entry bar,
+price level, side and horizon, without walking the bars.
+
+    first bar j in [entry, entry + horizon] with low[j] <= level     (min table)
+    first bar j in [entry, entry + horizon] with close[j] >= level   (max table)
+
+- Range-min/max sparse tables (engine.rangeidx) over perp_low / perp_high /
+  perp_close, built lazily once per column
+- A query jumps over power-of-two blocks that stay clear of the level, largest
+  first: O(log n) per query, vectorized over any batch of entries x levels
+- Percent stops / targets use the scripts' own expressions
+  ((low - ep) / ep <= -stop, (close - ep) / ep >= target, mirrored for shorts):
+  the level is moved to the exact float where that test flips, so hits match
+  the bar loops bit for bit
+
+Usage:
+    fp = FirstPassage.from_frame(df)
+    stop_bars = fp.hits(entries, [[0.02], [0.03]], horizon=42, kind='stop')   # (2, n_entries), -1 = none
+    exit_bar, exit_price, reason = fp.exits(entries, stop=0.03, target=0.04, limit=42)
+"""
+import numpy as np
+
+from engine.kernel import LONG, STOP, TARGET, TIME, EOD
+from engine.rangeidx import SparseTable, RangeIndex
+
+# ============ CONFIGURATION ============
+FRAME_COLS = {'high': 'perp_high', 'low': 'perp_low', 'close': 'perp_close'}
+MAX_ULP_STEPS = 64                   # level correction never needs more than a few
+
+
+# ============ SEARCH ============
+def first_crossing(table: SparseTable, starts, ends, levels) -> np.ndarray:
+    """
+    First j in [start, end] where values[j] <= level (min table) or >= level
+    (max table); -1 if none. starts / ends / levels broadcast together.
+    """
+    below = table.op == 'min'
+    starts, ends, levels = np.broadcast_arrays(np.asarray(starts, dtype=np.int64),
+                                               np.asarray(ends, dtype=np.int64),
+                                               np.asarray(levels, dtype=np.float64))
+    ends = np.minimum(ends, table.n - 1)
+    pos = starts.copy()
+    if table.n == 0:
+        return np.full(pos.shape, -1, dtype=np.int64)
+    # skip the longest prefix of blocks that never touch the level (NaN counts as clear)
+    for k in range(table.n_levels - 1, -1, -1):
+        w = 1 << k
+        blk = table.block(k, np.clip(pos, 0, table.n - 1))
+        clear = ~(blk <= levels) if below else ~(blk >= levels)
+        pos = np.where((pos + w - 1 <= ends) & clear, pos + w, pos)
+    return np.where(pos <= ends, pos, -1)
+
+
+def exact_level(ep, pct, side=LONG, kind='stop'):
+    """
+    (level, below): the price where the scripts' percent test flips, so that
+        hit  <=>  price <= level (below)  or  price >= level
+    for stop: move / ep <= -pct, target: move / ep >= pct, move = price - ep
+    (LONG) or ep - price (SHORT).
+    """
+    if kind not in ('stop', 'target'):
+        raise ValueError(f"unknown kind {kind!r} (stop / target)")
+    ep, pct = np.broadcast_arrays(np.asarray(ep, dtype=np.float64), np.asarray(pct, dtype=np.float64))
+    below = (side == LONG) == (kind == 'stop')
+
+    def hit(x):
+        r = ((x - ep) if side == LONG else (ep - x)) / ep
+        return r <= -pct if kind == 'stop' else r >= pct
+
+    inward, outward = (-np.inf, np.inf) if below else (np.inf, -np.inf)
+    level = ep * (1 - pct) if below else ep * (1 + pct)
+    finite = np.isfinite(level)
+    for _ in range(MAX_ULP_STEPS):                   # step in until the level itself hits
+        miss = finite & ~hit(level)
+        if not miss.any():
+            break
+        level = np.where(miss, np.nextafter(level, inward), level)
+    for _ in range(MAX_ULP_STEPS):                   # step out while the next float still hits
+        nxt = np.nextafter(level, outward)
+        more = finite & hit(nxt)
+        if not more.any():
+            break
+        level = np.where(more, nxt, level)
+    return level, below
+
+
+# ============ INDEX ============
+class FirstPassage:
+    """Lazy range tables over one symbol's high / low / close."""
+
+    def __init__(self, high=None, low=None, close=None):
+        self.cols = {k: np.asarray(v, dtype=np.float64)
+                     for k, v in (('high', high), ('low', low), ('close', close)) if v is not None}
+        self.n = len(next(iter(self.cols.values()))) if self.cols else 0
+        self.ranges = RangeIndex(self.cols)
+
+    @classmethod
+    def from_frame(cls, df, cols=FRAME_COLS):
+        return cls(**{k: df[c].to_numpy() for k, c in cols.items() if c in df.columns})
+
+    def table(self, col, op) -> SparseTable:
+        if col not in self.cols:
+            raise KeyError(f"first-passage index has no {col!r} column")
+        return self.ranges.table(col, op)
+
+    def first(self, col, entries, levels, horizon, below, end=None) -> np.ndarray:
+        """First bar in [entry, entry + horizon] (and < end) where col crosses levels; -1 if none."""
+        entries = np.asarray(entries, dtype=np.int64)
+        last = self.n if end is None else min(end, self.n)
+        ends = np.minimum(entries + horizon, last - 1)
+        return first_crossing(self.table(col, 'min' if below else 'max'), entries, ends, levels)
+
+    def hits(self, entries, pct, horizon, side=LONG, kind='stop', end=None) -> np.ndarray:
+        """
+        First stop (low / high) or target (close) bar of positions entered at the
+        close of `entries`; pct broadcasts against entries, e.g. a column of
+        levels gives one row per level. -1 where it is not hit within horizon.
+        """
+        entries = np.asarray(entries, dtype=np.int64)
+        level, below = exact_level(self.cols['close'][entries], pct, side, kind)
+        col = 'close' if kind == 'target' else ('low' if side == LONG else 'high')
+        return self.first(col, entries, level, horizon, below, end)
+
+    def exits(self, entries, stop, target, limit, side=LONG, end=None):
+        """
+        engine.kernel.first_exit for a batch of entries:
+        (exit_bar, exit_price, reason) with stop before target before time, EOD at end - 1.
+        """
+        entries = np.asarray(entries, dtype=np.int64)
+        last = (self.n if end is None else min(end, self.n)) - 1
+        close = self.cols['close']
+        s = self.hits(entries, stop, limit, side, 'stop', end)
+        t = self.hits(entries, target, limit, side, 'target', end)
+        is_stop = (s >= 0) & ((t < 0) | (s <= t))
+        is_target = ~is_stop & (t >= 0)
+        is_time = ~is_stop & ~is_target & (entries + limit <= last)
+        x = np.select([is_stop, is_target, is_time], [s, t, entries + limit], last)
+        reason = np.select([is_stop, is_target, is_time], [STOP, TARGET, TIME], EOD).astype(np.int8)
+        ep = close[entries]
+        price = np.where(is_stop, ep * (1 - side * stop), close[x])
+        return x, price, reason
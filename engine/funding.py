@@ -0,0 +1,134 @@
+"""
+FUNDING CASH FLOWS
+Funding PnL of any number of trades from one cumulative sum, instead of
+adding the rate to every open trade at every settlement bar.
+
+    paid[k]      = rate[k] * (settlements inside bar k)
+    cum[k]       = paid[0] + ... + paid[k-1]
+    funding_usd  = -side * notional * (cum[exit + 1] - cum[entry])
+
+i.e. a position settles every settlement bar from its entry bar through
+its exit bar (inclusive), which is what backtest_funding_multi's loop did
+(accrue at the previous bar's settlement, plus the exit bar's own).
+side is +1 LONG / -1 SHORT and the sign is the exchange's: a positive rate
+means longs pay shorts. (testing_v2's loop booked the opposite sign; it
+negates pnl() to keep its results.)
+
+A bar settles once per settlement instant that falls inside it, from its
+open to its close: a 4h bar holds at most one 8h settlement, a 1d bar
+three (each booked at the bar's rate, the only one the bar carries).
+Settlements are the UTC hours that are multiples of
+funding_interval_hours (the column the combined market carries per bar, so
+interval changes and per-symbol schedules follow the data), or an explicit
+tuple of UTC hours. Combined bars are stamped with their close_time floored
+to the hour (datastore.combine), so a 4h bar stamped 03:00 spans
+[00:00, 04:00) and holds the 00:00 settlement.
+
+Usage:
+    settle = settlement_count(df.index, df['funding_interval_hours'])
+    accrual = FundingAccrual(df['funding_rate'], settle)
+    df['is_settle'] = settlement_mask(df.index, df['funding_interval_hours'])   # bars holding any
+    log['funding_usd'] = accrual.pnl(entry_bars, exit_bars, sides, notional_usd)
+"""
+import numpy as np
+
+from datastore.bargrid import times_to_ms
+
+# ============ CONFIGURATION ============
+HOUR_MS = 3_600_000
+DAY_MS = 24 * HOUR_MS
+DEFAULT_INTERVAL_HOURS = 8           # Binance: 00 / 08 / 16 UTC unless the symbol says otherwise
+BAR_END_OFFSET_MS = HOUR_MS          # bar end - bar stamp (combined bars: close_time floored to the hour)
+
+
+# ============ SCHEDULE ============
+def bar_step_ms(t) -> int:
+    """Bar length of sorted epoch-ms stamps: the most common spacing (an hour for a single bar)."""
+    d = np.diff(t)
+    if len(d) == 0:
+        return HOUR_MS
+    vals, counts = np.unique(d, return_counts=True)
+    return int(vals[np.argmax(counts)])
+
+
+def _occurrences(first, end, period) -> np.ndarray:
+    """Instants first, first + period, ... before end (exclusive)."""
+    return np.where(first < end, (end - 1 - first) // period + 1, 0)
+
+
+def settlement_count(times, interval_hours=DEFAULT_INTERVAL_HOURS, settlement_hours=None, bar_ms=None,
+                     end_offset_ms=BAR_END_OFFSET_MS) -> np.ndarray:
+    """
+    Funding settlements per bar: bar k spans
+    [t + end_offset_ms - bar_ms, t + end_offset_ms) and counts the
+    settlement instants in that span. interval_hours is a scalar or a
+    per-bar array (e.g. the funding_interval_hours column);
+    settlement_hours, if given, is an explicit tuple of UTC hours and
+    overrides it. bar_ms defaults to the most common spacing of the times.
+    """
+    t = times_to_ms(times)
+    step = bar_step_ms(t) if bar_ms is None else int(bar_ms)
+    start = t + end_offset_ms - step
+    end = t + end_offset_ms
+    if settlement_hours is not None:
+        day = start // DAY_MS * DAY_MS
+        count = np.zeros(len(t), dtype=np.int64)
+        for h in settlement_hours:
+            s = day + int(h) * HOUR_MS
+            count += _occurrences(np.where(s < start, s + DAY_MS, s), end, DAY_MS)
+        return count
+    # settlements are multiples of the interval from midnight UTC (intervals divide 24h)
+    period = np.maximum(np.asarray(interval_hours, dtype=np.int64), 1) * HOUR_MS
+    return _occurrences(-(-start // period) * period, end, period)
+
+
+def settlement_mask(times, interval_hours=DEFAULT_INTERVAL_HOURS, settlement_hours=None, bar_ms=None,
+                    end_offset_ms=BAR_END_OFFSET_MS) -> np.ndarray:
+    """Bars that hold at least one funding settlement (settlement_count > 0)."""
+    return settlement_count(times, interval_hours, settlement_hours, bar_ms, end_offset_ms) > 0
+
+
+def interval_hours_of(df) -> np.ndarray:
+    """Per-bar funding interval of a combined frame (DEFAULT_INTERVAL_HOURS if it has none)."""
+    if 'funding_interval_hours' in df.columns:
+        return df['funding_interval_hours'].to_numpy()
+    return np.full(len(df), DEFAULT_INTERVAL_HOURS)
+
+
+def side_sign(side) -> np.ndarray:
+    """'LONG' / 'SHORT' strings or engine.kernel LONG / SHORT ints -> +1 / -1."""
+    side = np.asarray(side)
+    if side.dtype.kind in 'iuf':
+        return np.sign(side).astype(np.float64)
+    return np.where(side == 'LONG', 1.0, -1.0)
+
+
+# ============ ACCRUAL ============
+class FundingAccrual:
+    """
+    Cumulative settlement rates of one symbol's bars. settle is the
+    settlement_count per bar (a bool settlement_mask books one settlement
+    per True bar, which under-books bars longer than the interval).
+    """
+
+    def __init__(self, rates, settle):
+        rates = np.asarray(rates, dtype=np.float64)
+        settle = np.asarray(settle).astype(np.int64)
+        finite = rates[np.isfinite(rates)]
+        if not settle.any() and len(finite) and (finite != finite[0]).any():
+            raise ValueError("the funding rate changes but no bar is a settlement: "
+                             "check the settlement count against the bar stamps")
+        paid = np.nan_to_num(rates) * settle
+        self.n = len(paid)
+        self.cum = np.zeros(self.n + 1)
+        np.cumsum(paid, out=self.cum[1:])
+
+    def rate_between(self, entry, exit):
+        """Sum of settlement rates on bars [entry, exit], inclusive."""
+        entry = np.clip(entry, 0, self.n)
+        exit = np.clip(np.asarray(exit) + 1, 0, self.n)
+        return self.cum[exit] - self.cum[entry]
+
+    def pnl(self, entry, exit, side, notional=1.0):
+        """Funding received (+) / paid (-) per trade, in notional units (positive rate: longs pay)."""
+        return -self.rate_between(entry, exit) * notional * side_sign(side)
@@ -0,0 +1,239 @@
+"""
+PARALLEL GRID SEARCH
+Parameter grids of the long-only sweep (engine.sweep) or the two-sided
+funding-extreme kernel (engine.strategy), over several symbols, spread over
+a process pool.
+
+- Bars are published once per symbol in shared memory: workers attach by
+  name instead of receiving pickled frames with every task, and build each
+  symbol's frame and signal / first-passage tables once per process, reused
+  by every chunk
+- The grid is cut into units along the entry keys (funding threshold,
+  price buffer, volume filter, throttle ...); a unit keeps all of its exit
+  combinations (stop x target x time limit) in one batched pass
+- Units go out in chunks with a bounded in-flight window (as in
+  engine.universe) and partial tables stream back through on_chunk
+- Rows are merged by (symbol, unit) number, so the table is the same row
+  for row whatever the worker count or completion order: per symbol it is
+  exactly sweep_long(df, grid) (long) or the grid in product order (extreme)
+
+Usage:
+    table = grid_search(['BTCUSDT', 'ETHUSDT'], {'stop_pct': [0.02, 0.03], 'target_pct': [0.04, 0.06]}, workers=8)
+    table = grid_search({'BTCUSDT': df}, {'extreme_high_funding': [0.0001, 0.00012]}, strategy='extreme')
+    python -m engine.gridsearch --symbols BTCUSDT ETHUSDT --grid grid.json --workers 8 --out sweep.csv
+"""
+import itertools
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import pandas as pd
+
+from datastore.bargrid import times_to_ms
+from datastore.store import read_frame
+from engine.kernel import run_kernel, trades_frame
+from engine.strategy import DEFAULT_PARAMS, signals, summarize
+from engine.sweep import LONG_PARAMS, SIGNAL_KEYS, LongSignals, sweep_long
+
+# ============ CONFIGURATION ============
+PUBLISH_COLS = ['perp_high', 'perp_low', 'perp_close', 'perp_volume', 'funding_rate']
+STRATEGIES = {
+    # name: (defaults, keys a unit fixes to one value, in row order)
+    'long': (LONG_PARAMS, SIGNAL_KEYS + ['min_bars_between_entries']),
+    'extreme': (DEFAULT_PARAMS, ['extreme_high_funding', 'extreme_low_funding', 'price_buffer_pct',
+                                 'lookback', 'min_bars_between_entries']),
+}
+CHUNKS_PER_WORKER = 4                # chunks handed out per worker (load balance vs overhead)
+
+
+# ============ SHARED BARS ============
+class SharedBars:
+    """One shared-memory block per symbol: bar_time (int64 ms) then the float64 columns."""
+
+    def __init__(self, frames: dict):
+        self.blocks, self.specs = [], {}
+        try:
+            for sym, df in frames.items():
+                cols = [c for c in PUBLISH_COLS if c in df.columns]
+                n = len(df)
+                shm = SharedMemory(create=True, size=max(8 * n * (len(cols) + 1), 1))
+                self.blocks.append(shm)
+                arr = np.ndarray((len(cols) + 1, n), dtype=np.float64, buffer=shm.buf)
+                arr[0].view(np.int64)[:] = times_to_ms(df.index)
+                for k, c in enumerate(cols):
+                    arr[k + 1] = df[c].to_numpy(np.float64)
+                self.specs[sym] = {'name': shm.name, 'n': n, 'cols': cols}
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        for spec in self.specs.values():            # this process's own attachments (workers=1)
+            if spec['name'] in _ATTACHED:
+                _ATTACHED.pop(spec['name'])[0].close()
+        for shm in self.blocks:
+            shm.close()
+            shm.unlink()
+        self.blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# per-process cache: shared block name -> (handle, frame, {strategy: signal tables})
+_ATTACHED = {}
+
+
+def attach(spec):
+    """(handle, frame, cache dict) of a published symbol, attached once per process."""
+    if spec['name'] not in _ATTACHED:
+        shm = SharedMemory(name=spec['name'])
+        arr = np.ndarray((len(spec['cols']) + 1, spec['n']), dtype=np.float64, buffer=shm.buf)
+        index = pd.DatetimeIndex(pd.to_datetime(arr[0].view(np.int64), unit='ms', utc=True), name='bar_time')
+        df = pd.DataFrame({c: arr[k + 1] for k, c in enumerate(spec['cols'])}, index=index)
+        _ATTACHED[spec['name']] = (shm, df, {})
+    return _ATTACHED[spec['name']]
+
+
+# ============ UNITS ============
+def full_grid(grid, strategy='long') -> dict:
+    """Every key of the strategy's params as a list (missing keys: the default)."""
+    defaults, _ = STRATEGIES[strategy]
+    grid = {k: list(v) if isinstance(v, (list, tuple, np.ndarray)) else [v] for k, v in (grid or {}).items()}
+    unknown = set(grid) - set(defaults)
+    if unknown:
+        raise KeyError(f"unknown {strategy} params: {sorted(unknown)}")
+    return {k: grid.get(k, [defaults[k]]) for k in defaults}
+
+
+def grid_units(grid, strategy='long') -> list:
+    """Sub-grids with the entry keys fixed, in row order."""
+    g = full_grid(grid, strategy)
+    _, entry_keys = STRATEGIES[strategy]
+    return [{**g, **{k: [v] for k, v in zip(entry_keys, combo)}}
+            for combo in itertools.product(*(g[k] for k in entry_keys))]
+
+
+def _extreme_unit(df, tables, unit) -> pd.DataFrame:
+    """Every point of one unit of the two-sided kernel (signals shared by the unit)."""
+    keys = list(unit)
+    rows = []
+    for combo in itertools.product(*(unit[k] for k in keys)):
+        p = dict(zip(keys, combo))
+        skey = tuple(p[k] for k in STRATEGIES['extreme'][1][:4])
+        if skey not in tables:
+            tables.clear()                       # units arrive grouped by entry keys
+            tables[skey] = signals(df, p)
+        short_signal, long_signal = tables[skey]
+        rec = run_kernel(df['perp_high'].to_numpy(), df['perp_low'].to_numpy(), df['perp_close'].to_numpy(),
+                         df['funding_rate'].to_numpy(), short_signal, long_signal, p, start=p['lookback'])
+        rows.append({**p, **summarize(trades_frame(rec, df.index))})
+    return pd.DataFrame(rows)
+
+
+def _run_chunk(strategy, spec, sym_no, units):
+    """Worker: [(symbol no, unit no, table), ...] for one chunk of units."""
+    _, df, cache = attach(spec)
+    out = []
+    for unit_no, unit in units:
+        if strategy == 'long':
+            if 'long' not in cache:
+                cache['long'] = LongSignals(df)
+            table = sweep_long(df, unit, signals=cache['long'])
+        else:
+            table = _extreme_unit(df, cache.setdefault('extreme', {}), unit)
+        out.append((sym_no, unit_no, table))
+    return out
+
+
+# ============ SEARCH ============
+def load_frames(symbols, root=None) -> dict:
+    """Combined bars of every symbol from the bar store."""
+    return {s: read_frame('combined', s, PUBLISH_COLS, root=root) for s in symbols}
+
+
+def grid_search(data, grid=None, strategy='long', workers=None, chunk_units=None, on_chunk=None,
+                root=None, max_pending=None) -> pd.DataFrame:
+    """
+    One row per (symbol, grid point): 'symbol', the params, the metrics.
+    data is {symbol: DataFrame} or a list of symbols read from the bar store.
+    on_chunk(partial_table, units_done, units_total) is called as chunks finish.
+    """
+    if strategy not in STRATEGIES:
+        raise KeyError(f"unknown strategy {strategy!r} ({', '.join(STRATEGIES)})")
+    frames = data if isinstance(data, dict) else load_frames(data, root)
+    symbols = list(frames)
+    units = grid_units(grid, strategy)
+    workers = max(1, workers or os.cpu_count() or 1)
+    chunk_units = chunk_units or max(1, math.ceil(len(units) * len(symbols) / (workers * CHUNKS_PER_WORKER)))
+    max_pending = max_pending or 2 * workers
+    total = len(units) * len(symbols)
+    parts = {}
+
+    def collect(result):
+        for sym_no, unit_no, table in result:
+            parts[sym_no, unit_no] = table
+        if on_chunk is not None:
+            part = pd.concat([t.assign(symbol=symbols[s]) for s, _, t in result], ignore_index=True)
+            on_chunk(part, len(parts), total)
+
+    with SharedBars(frames) as bars:
+        tasks = ((strategy, bars.specs[sym], s, list(enumerate(units))[a:a + chunk_units])
+                 for s, sym in enumerate(symbols) for a in range(0, len(units), chunk_units))
+        if workers == 1:
+            for task in tasks:
+                collect(_run_chunk(*task))
+        else:
+            pending = set()
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                for task in itertools.islice(tasks, max_pending):
+                    pending.add(pool.submit(_run_chunk, *task))
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for fut in done:
+                        collect(fut.result())
+                    for task in itertools.islice(tasks, len(done)):
+                        pending.add(pool.submit(_run_chunk, *task))
+
+    tables = [parts[key].assign(symbol=symbols[key[0]]) for key in sorted(parts)]
+    table = pd.concat(tables, ignore_index=True) if tables else pd.DataFrame()
+    return table[['symbol'] + [c for c in table.columns if c != 'symbol']]
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+
+    ap = argparse.ArgumentParser(description="Grid search over symbols on a process pool")
+    ap.add_argument('--symbols', nargs='+', default=['BTCUSDT'])
+    ap.add_argument('--grid', required=True, help="JSON file or inline JSON dict of param lists")
+    ap.add_argument('--strategy', default='long', choices=list(STRATEGIES))
+    ap.add_argument('--workers', type=int, default=None, help="process count (default: all cores)")
+    ap.add_argument('--root', default=None)
+    ap.add_argument('--out', default=None, help="CSV for the results table")
+    args = ap.parse_args()
+
+    grid = json.loads(open(args.grid).read() if os.path.exists(args.grid) else args.grid)
+    n_points = math.prod(len(v) for v in full_grid(grid, args.strategy).values())
+
+    print("="*70)
+    print(f"GRID SEARCH: {args.strategy} | {len(args.symbols)} symbols x {n_points} points")
+    print("="*70)
+    t0 = time.perf_counter()
+
+    def progress(part, done, total):
+        print(f"  {done}/{total} units | best PF so far in chunk: {part['profit_factor'].max():.2f}")
+
+    table = grid_search(args.symbols, grid, args.strategy, args.workers, on_chunk=progress, root=args.root)
+    wall = time.perf_counter() - t0
+    with pd.option_context('display.width', 160, 'display.max_columns', 20):
+        print(table.sort_values('profit_factor', ascending=False).head(20).to_string(index=False))
+    if args.out:
+        table.to_csv(args.out, index=False)
+    print(f"\n✅ {len(table)} rows in {wall:.2f}s ({len(table) / wall:.0f} points/s)")
@@ -0,0 +1,153 @@
+"""
+INCREMENTAL BACKTEST
+Checkpoint the funding-extreme backtest (engine.strategy) at the end of a
+run and resume it over only the bars appended since, with the same final
+trade log as a full rerun.
+
+What a run leaves behind (the checkpoint, a small JSON-able dict):
+- the last max(lookback, time_limit_bars) bars: the rolling high / low and
+  funding-fresh state of the next bars, and every position still open
+  (a position never lives longer than time_limit_bars)
+- the open positions (side, entry bar) and the last entry bar per side
+- bar count, last bar_time and the params it was run with
+
+Why resuming is exact: a trade that closed before the end of the data never
+changes when bars are appended, and the kernel (engine.kernel.run_kernel)
+only needs the open book, the throttle and the blocking state to carry on.
+Positions the previous run closed at end_of_data are exactly the open ones;
+they are rescanned from the first new bar and replaced in the log.
+
+That only holds while the bars already run stay as they were: a resumed run
+checks every bar df shares with the checkpoint's tail and raises if one was
+rewritten (a rerun in full is the fix). Bars older than the tail are not in
+the checkpoint; engine.universe also stores a digest of the store partitions
+it consumed and runs in full when they change.
+
+Usage:
+    trades, ckpt = backtest_incremental(df)                 # first run
+    save_checkpoint(ckpt, 'BTCUSDT_checkpoint.json')
+    ...
+    new, ckpt = backtest_incremental(df_new, load_checkpoint('BTCUSDT_checkpoint.json'))
+    trades = merge_trades(trades, new)                      # == backtest_funding_extreme(all bars)
+"""
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from datastore.bargrid import times_to_ms
+from engine.kernel import SHORT, LONG, EOD, run_kernel, trades_frame
+from engine.strategy import BAR_COLS, resolve_params, signals
+
+# ============ CONFIGURATION ============
+CHECKPOINT_VERSION = 1
+
+
+def tail_length(params) -> int:
+    """Bars a checkpoint keeps: the rolling window and the longest a position can stay open."""
+    return max(params['lookback'], params['time_limit_bars'])
+
+
+# ============ RUN / RESUME ============
+def check_tail(df: pd.DataFrame, tail: dict):
+    """Raise ValueError if df's bars in the checkpoint tail's span differ from the tail."""
+    t = np.asarray(tail['bar_time'], dtype=np.int64)
+    ms = times_to_ms(df.index)
+    if not len(ms) or not len(t):
+        return
+    covered = t[(t >= ms[0]) & (t <= ms[-1])]
+    shared, i, j = np.intersect1d(ms, t, assume_unique=True, return_indices=True)
+    changed = len(shared) != len(covered)
+    for c in BAR_COLS:
+        if changed:
+            break
+        changed = not np.array_equal(df[c].to_numpy(np.float64)[i], np.asarray(tail[c], dtype=np.float64)[j],
+                                     equal_nan=True)
+    if changed:
+        raise ValueError("bars the checkpoint already ran were rewritten; rerun without the checkpoint")
+
+
+def backtest_incremental(df: pd.DataFrame, checkpoint=None, params=None):
+    """
+    (trades, checkpoint). Without a checkpoint: the full backtest of df. With
+    one: only the bars of df after the checkpoint's last bar_time are run
+    (df may be just the new bars or the whole grown history), and trades are
+    those to append with merge_trades.
+    """
+    if checkpoint is None:
+        p = resolve_params(params)
+        bars = df[BAR_COLS]
+        offset, start, state = 0, p['lookback'], None
+    else:
+        if checkpoint.get('version') != CHECKPOINT_VERSION:
+            raise ValueError(f"checkpoint version {checkpoint.get('version')} (expected {CHECKPOINT_VERSION})")
+        p = checkpoint['params']
+        if params is not None and resolve_params(params) != p:
+            raise ValueError("checkpoint was saved with different strategy params")
+        tail = checkpoint['tail']
+        check_tail(df, tail)
+        new = df.loc[times_to_ms(df.index) > checkpoint['last_time'], BAR_COLS]
+        old = pd.DataFrame({c: tail[c] for c in BAR_COLS},
+                           index=pd.to_datetime(tail['bar_time'], unit='ms', utc=True).rename(new.index.name))
+        bars = pd.concat([old, new])
+        offset = checkpoint['n_bars'] - len(old)              # global bar number of bars[0]
+        start = max(len(old), p['lookback'] - offset)
+        state = {'open': [(side, e - offset) for side, e in checkpoint['open']],
+                 'last_entry': {int(s): e - offset for s, e in checkpoint['last_entry'].items()}}
+
+    # funding_fresh is recomputed from the rate (as the bar cache builds it) so the
+    # first new bar compares against the checkpoint's last rate
+    short_signal, long_signal = signals(bars[BAR_COLS], p)
+    rec = run_kernel(bars['perp_high'].to_numpy(), bars['perp_low'].to_numpy(), bars['perp_close'].to_numpy(),
+                     bars['funding_rate'].to_numpy(), short_signal, long_signal, p, start=start, state=state)
+    return trades_frame(rec, bars.index), make_checkpoint(bars, rec, p, offset, state)
+
+
+def make_checkpoint(bars: pd.DataFrame, rec: np.ndarray, params, offset=0, state=None) -> dict:
+    """Checkpoint at the last bar of `bars` (bar numbers global: bars[0] is bar `offset`)."""
+    gap = params['min_bars_between_entries']
+    last_entry = {SHORT: -gap, LONG: -gap} if state is None else dict(state['last_entry'])
+    for side in (SHORT, LONG):
+        entries = rec['entry_bar'][rec['side'] == side]
+        if len(entries):
+            last_entry[side] = max(last_entry[side], int(entries.max()))
+    still_open = rec[rec['reason'] == EOD]
+    still_open = still_open[np.argsort(still_open['entry_bar'], kind='stable')]
+    tail = bars.iloc[-tail_length(params):]
+    return {
+        'version': CHECKPOINT_VERSION,
+        'params': params,
+        'n_bars': offset + len(bars),
+        'last_time': int(times_to_ms(bars.index[-1:])[0]) if len(bars) else None,
+        'open': [(int(s), int(e) + offset) for s, e in zip(still_open['side'], still_open['entry_bar'])],
+        'last_entry': {int(s): int(e) + offset for s, e in last_entry.items()},
+        'tail': {'bar_time': times_to_ms(tail.index).tolist(), **{c: tail[c].tolist() for c in BAR_COLS}},
+    }
+
+
+def merge_trades(previous: pd.DataFrame, new: pd.DataFrame) -> pd.DataFrame:
+    """Previous log without its end_of_data closes (the positions resumed) + the resumed run's trades."""
+    kept = previous[previous['exit_reason'] != 'end_of_data']
+    return pd.concat([kept, new], ignore_index=True)
+
+
+# ============ FILES ============
+def save_checkpoint(checkpoint: dict, path):
+    """JSON, written atomically (temp file + rename)."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.tmp-{os.getpid()}")
+    with open(tmp, 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp, path)
+
+
+def load_checkpoint(path) -> dict:
+    """Checkpoint from save_checkpoint (JSON turns int keys into strings; they are restored)."""
+    with open(path) as f:
+        d = json.load(f)
+    d['last_entry'] = {int(s): e for s, e in d['last_entry'].items()}
+    d['open'] = [tuple(p) for p in d['open']]
+    return d
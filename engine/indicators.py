@@ -0,0 +1,415 @@
+"""
+STREAMING INDICATORS
+Push one bar, get the indicator value for that bar, with the same numbers
+the pandas batch call gives over the whole history:
+
+    RollingMax / RollingMin   series.rolling(w).max() / .min()     monotonic deque, O(1) amortized
+    RollingMean               series.rolling(w).mean()             running Kahan sum, O(1)
+    RollingVar / RollingStd   series.rolling(w).var() / .std()     running Welford sums, O(1)
+    RollingQuantile           series.rolling(w).quantile(q)        sorted list, O(w) memmove per bar
+    EWMMean                   series.ewm(span=..., adjust=...).mean()
+
+The running sums replay pandas' own add/remove order and compensation
+terms (its rolling kernels carry state from bar to bar the same way), and
+min_periods / NaN handling follow pandas (NaN bars are skipped and do not
+count towards min_periods):
+- max / min / mean / quantile are bit-identical to the batch call
+- EWMMean is bit-identical on gap-free series (closes, EMAs of MA_analysis)
+- var / std are bit-identical too: pandas 3's roll_var (no same-value or
+  single-observation shortcuts; the window is recomputed when a removal
+  cancels the sum) is replayed step for step
+
+Every indicator can be saved with state() (plain JSON-able dict) and
+rebuilt with from_state(), so a live process can resume after a restart
+without replaying history.
+
+Usage:
+    hi = RollingMax(24)
+    for close in new_closes:
+        roll_high_24 = hi.push(close)
+    run(RollingMean(20), df['perp_volume'])      # == df['perp_volume'].rolling(20).mean()
+"""
+import math
+from bisect import bisect_left, insort
+from collections import deque
+
+import numpy as np
+
+NAN = float('nan')
+INV_COND_TOL = np.finfo(np.float64).eps * 1e3   # pandas roll_var: below this share of the sum, recompute
+
+
+def _isnan(x) -> bool:
+    return x != x
+
+
+# ============ BASE ============
+class _Rolling:
+    """Fixed window of the last `window` raw values (NaNs included, as pandas counts them)."""
+
+    kind = None
+
+    def __init__(self, window, min_periods=None):
+        if window < 1:
+            raise ValueError("window must be >= 1")
+        self.window = int(window)
+        self.min_periods = self.window if min_periods is None else max(int(min_periods), 1)
+        self.values = deque()
+        self.nobs = 0                    # non-NaN values in the window
+
+    def push(self, x) -> float:
+        x = float(x)
+        if len(self.values) == self.window:
+            old = self.values.popleft()
+            if not _isnan(old):
+                self.nobs -= 1
+            self._remove(old)
+        self.values.append(x)
+        if not _isnan(x):
+            self.nobs += 1
+        self._add(x)
+        return self.value() if self.nobs >= self.min_periods else NAN
+
+    def _add(self, x):
+        pass
+
+    def _remove(self, x):
+        pass
+
+    def value(self) -> float:
+        raise NotImplementedError
+
+    def state(self) -> dict:
+        return {'kind': self.kind, 'window': self.window, 'min_periods': self.min_periods,
+                'values': list(self.values), **self._state()}
+
+    def _state(self) -> dict:
+        return {}
+
+    @classmethod
+    def _from_state(cls, d):
+        obj = cls(d['window'], d['min_periods'], **cls._init_args(d))
+        for x in d['values']:
+            obj.values.append(float(x))
+            obj.nobs += not _isnan(float(x))
+        return obj
+
+    @classmethod
+    def _init_args(cls, d) -> dict:
+        return {}
+
+
+# ============ MAX / MIN ============
+class RollingMax(_Rolling):
+    """Monotonic deque of (bar number, value): the front is the window's extremum."""
+
+    kind = 'max'
+
+    def __init__(self, window, min_periods=None):
+        super().__init__(window, min_periods)
+        self.n_pushed = 0
+        self.mono = deque()
+
+    def _better(self, a, b) -> bool:
+        return a >= b
+
+    def _add(self, x):
+        i = self.n_pushed
+        self.n_pushed += 1
+        while self.mono and self.mono[0][0] <= i - self.window:
+            self.mono.popleft()
+        if _isnan(x):
+            return
+        while self.mono and self._better(x, self.mono[-1][1]):
+            self.mono.pop()
+        self.mono.append((i, x))
+
+    def value(self) -> float:
+        return self.mono[0][1]
+
+    def _state(self):
+        return {'n_pushed': self.n_pushed, 'mono': [list(p) for p in self.mono]}
+
+    @classmethod
+    def _from_state(cls, d):
+        obj = super()._from_state(d)
+        obj.n_pushed = d['n_pushed']
+        obj.mono = deque((int(i), float(v)) for i, v in d['mono'])
+        return obj
+
+
+class RollingMin(RollingMax):
+    kind = 'min'
+
+    def _better(self, a, b) -> bool:
+        return a <= b
+
+
+# ============ MEAN / VARIANCE ============
+class RollingMean(_Rolling):
+    """pandas roll_mean: Kahan sums with separate add / remove compensation."""
+
+    kind = 'mean'
+
+    def __init__(self, window, min_periods=None):
+        super().__init__(window, min_periods)
+        self.sum_x = self.comp_add = self.comp_remove = 0.0
+        self.neg_ct = 0
+        self.same_ct = 0                 # run length of identical values (pandas GH#42064)
+        self.prev = None
+
+    def _add(self, x):
+        if self.prev is None:
+            self.prev = x
+        if _isnan(x):
+            return
+        y = x - self.comp_add
+        t = self.sum_x + y
+        self.comp_add = t - self.sum_x - y
+        self.sum_x = t
+        if math.copysign(1.0, x) < 0:
+            self.neg_ct += 1
+        self.same_ct = self.same_ct + 1 if x == self.prev else 1
+        self.prev = x
+
+    def _remove(self, x):
+        if _isnan(x):
+            return
+        y = -x - self.comp_remove
+        t = self.sum_x + y
+        self.comp_remove = t - self.sum_x - y
+        self.sum_x = t
+        if math.copysign(1.0, x) < 0:
+            self.neg_ct -= 1
+
+    def value(self) -> float:
+        result = self.sum_x / self.nobs
+        if self.same_ct >= self.nobs:
+            return self.prev
+        if self.neg_ct == 0 and result < 0:
+            return 0.0
+        if self.neg_ct == self.nobs and result > 0:
+            return 0.0
+        return result
+
+    def _state(self):
+        return {'sum_x': self.sum_x, 'comp_add': self.comp_add, 'comp_remove': self.comp_remove,
+                'neg_ct': self.neg_ct, 'same_ct': self.same_ct, 'prev': self.prev}
+
+    @classmethod
+    def _from_state(cls, d):
+        obj = super()._from_state(d)
+        for k in ('sum_x', 'comp_add', 'comp_remove', 'neg_ct', 'same_ct', 'prev'):
+            setattr(obj, k, d[k])
+        return obj
+
+
+class RollingVar(_Rolling):
+    """
+    pandas roll_var: Welford mean / sum of squared deviations with Kahan
+    compensation, recomputed over the window when an update cancels all but
+    ~3 significant digits of the sum (and every bar for window 1, as pandas).
+    """
+
+    kind = 'var'
+
+    def __init__(self, window, min_periods=None, ddof=1):
+        super().__init__(window, min_periods)
+        self.ddof = ddof
+        self.count = 0.0                 # pandas keeps nobs as a float here
+        self.mean_x = self.ssqdm_x = self.comp_add = self.comp_remove = 0.0
+        self.unstable = False
+
+    def _add(self, x):
+        if _isnan(x):
+            return
+        prev_m2 = self.ssqdm_x
+        self.count += 1
+        prev_mean = self.mean_x - self.comp_add
+        y = x - self.comp_add
+        t = y - self.mean_x
+        self.comp_add = t + self.mean_x - y
+        self.mean_x = self.mean_x + t / self.count
+        self.ssqdm_x = self.ssqdm_x + (x - prev_mean) * (x - self.mean_x)
+        if prev_m2 * INV_COND_TOL > self.ssqdm_x:
+            self.unstable = True
+
+    def _remove(self, x):
+        if _isnan(x):
+            return
+        prev_m2 = self.ssqdm_x
+        self.count -= 1
+        if self.count:
+            prev_mean = self.mean_x - self.comp_remove
+            y = x - self.comp_remove
+            t = y - self.mean_x
+            self.comp_remove = t + self.mean_x - y
+            self.mean_x = self.mean_x - t / self.count
+            self.ssqdm_x = self.ssqdm_x - (x - prev_mean) * (x - self.mean_x)
+            if prev_m2 * INV_COND_TOL > self.ssqdm_x:
+                self.unstable = True
+        else:
+            self.mean_x = self.ssqdm_x = 0.0
+            self.unstable = False
+
+    def _recompute(self):
+        self.count = self.mean_x = self.ssqdm_x = self.comp_add = self.comp_remove = 0.0
+        for v in self.values:
+            self._add(v)
+        self.unstable = False
+
+    def push(self, x) -> float:
+        v = super().push(x)
+        if self.unstable or self.window == 1:
+            self._recompute()
+            v = self.value() if self.nobs >= self.min_periods else NAN
+        return v
+
+    def value(self) -> float:
+        return self.ssqdm_x / (self.count - self.ddof) if self.count > self.ddof else NAN
+
+    def _state(self):
+        return {'ddof': self.ddof, 'count': self.count, 'mean_x': self.mean_x, 'ssqdm_x': self.ssqdm_x,
+                'comp_add': self.comp_add, 'comp_remove': self.comp_remove, 'unstable': self.unstable}
+
+    @classmethod
+    def _init_args(cls, d):
+        return {'ddof': d['ddof']}
+
+    @classmethod
+    def _from_state(cls, d):
+        obj = super()._from_state(d)
+        for k in ('count', 'mean_x', 'ssqdm_x', 'comp_add', 'comp_remove', 'unstable'):
+            setattr(obj, k, d[k])
+        return obj
+
+
+class RollingStd(RollingVar):
+    kind = 'std'
+
+    def value(self) -> float:
+        v = super().value()
+        if _isnan(v):
+            return NAN
+        return math.sqrt(v) if v > 0 else 0.0
+
+
+# ============ QUANTILE ============
+class RollingQuantile(_Rolling):
+    """
+    Sorted copy of the window's non-NaN values; linear interpolation like pandas.
+
+    Each push is a bisect plus one list insert and one delete: O(log w)
+    comparisons but an O(w) memmove. That is deliberate. pandas' indexable
+    skiplist is O(log w) in C, but written in Python it costs ~10-18 us a
+    bar against ~1-8 us for the list at w = 20..20,000, and only wins past
+    w ~ 100,000, far beyond the windows used here.
+    """
+
+    kind = 'quantile'
+
+    def __init__(self, window, min_periods=None, q=0.5):
+        super().__init__(window, min_periods)
+        if not 0 <= q <= 1:
+            raise ValueError("q must be in [0, 1]")
+        self.q = q
+        self.sorted = []
+
+    def _add(self, x):
+        if not _isnan(x):
+            insort(self.sorted, x)
+
+    def _remove(self, x):
+        if not _isnan(x):
+            del self.sorted[bisect_left(self.sorted, x)]
+
+    def value(self) -> float:
+        n = len(self.sorted)
+        if n == 1:
+            return self.sorted[0]
+        pos = self.q * (n - 1)
+        i = int(pos)
+        if i == pos:
+            return self.sorted[i]
+        lo, hi = self.sorted[i], self.sorted[i + 1]
+        return lo + (hi - lo) * (pos - i)
+
+    def _state(self):
+        return {'q': self.q}
+
+    @classmethod
+    def _init_args(cls, d):
+        return {'q': d['q']}
+
+    @classmethod
+    def _from_state(cls, d):
+        obj = super()._from_state(d)
+        obj.sorted = sorted(x for x in obj.values if not _isnan(x))
+        return obj
+
+
+# ============ EWM ============
+class EWMMean:
+    """pandas ewm().mean(): adjusted or recursive weights, NaNs kept in the decay unless ignore_na."""
+
+    kind = 'ewm'
+
+    def __init__(self, span=None, com=None, alpha=None, adjust=True, min_periods=0, ignore_na=False):
+        if sum(p is not None for p in (span, com, alpha)) != 1:
+            raise ValueError("give exactly one of span, com, alpha")
+        if span is not None:
+            com = (span - 1) / 2.0
+        elif alpha is not None:
+            com = (1.0 - alpha) / alpha
+        self.com = float(com)
+        self.adjust = adjust
+        self.ignore_na = ignore_na
+        self.min_periods = max(int(min_periods), 1)
+        self.weighted = None             # None until the first bar
+        self.old_wt = 1.0
+        self.nobs = 0
+
+    def push(self, x) -> float:
+        cur = float(x)
+        alpha = 1.0 / (1.0 + self.com)
+        new_wt = 1.0 if self.adjust else alpha
+        obs = not _isnan(cur)
+        if self.weighted is None:
+            self.weighted = cur
+        elif not _isnan(self.weighted):
+            if obs or not self.ignore_na:
+                self.old_wt *= 1.0 - alpha
+            if obs:
+                if self.weighted != cur:     # constant runs stay exact
+                    self.weighted = (self.old_wt * self.weighted + new_wt * cur) / (self.old_wt + new_wt)
+                self.old_wt = self.old_wt + new_wt if self.adjust else 1.0
+        elif obs:
+            self.weighted = cur
+        self.nobs += obs
+        return self.weighted if self.nobs >= self.min_periods else NAN
+
+    def state(self) -> dict:
+        return {'kind': self.kind, 'com': self.com, 'adjust': self.adjust, 'ignore_na': self.ignore_na,
+                'min_periods': self.min_periods, 'weighted': self.weighted, 'old_wt': self.old_wt,
+                'nobs': self.nobs}
+
+    @classmethod
+    def _from_state(cls, d):
+        obj = cls(com=d['com'], adjust=d['adjust'], min_periods=d['min_periods'], ignore_na=d['ignore_na'])
+        obj.weighted, obj.old_wt, obj.nobs = d['weighted'], d['old_wt'], d['nobs']
+        return obj
+
+
+# ============ API ============
+INDICATORS = {c.kind: c for c in (RollingMax, RollingMin, RollingMean, RollingVar, RollingStd,
+                                  RollingQuantile, EWMMean)}
+
+
+def from_state(d: dict):
+    """Rebuild any indicator from its state() dict."""
+    return INDICATORS[d['kind']]._from_state(d)
+
+
+def run(indicator, values) -> np.ndarray:
+    """Push every value through `indicator`; the batch-equivalent output array."""
+    return np.array([indicator.push(x) for x in np.asarray(values, dtype=np.float64)])
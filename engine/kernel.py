@@ -0,0 +1,167 @@
+"""
+ARRAY BACKTEST KERNEL
+The testing_v3 SHORT/LONG rules on plain NumPy arrays, trade-for-trade
+identical to the bar loop (engine.strategy.backtest_reference).
+
+Why it can skip the bar loop:
+- a position's exit depends only on its own entry price and the bars after
+  it, so each entry's exit is one vectorized scan of its forward window
+  (stop / target / time limit, same expressions, same priority)
+- the loop only ever asks two questions about open positions:
+    short entry at bar i is blocked  <=>  some long has entry < i <= exit
+    long entry at bar i is blocked   <=>  some short has entry <= i < exit
+  (within a bar: short entry, short exits, long entry, long exits), which
+  the running max exit bar per side answers in O(1)
+So the kernel walks signal bars only. Positions live in preallocated arrays
+and closed trades come back as a structured record array (TRADE_DTYPE) in
+the loop's append order.
+"""
+import numpy as np
+import pandas as pd
+
+# ============ RECORDS ============
+SHORT, LONG = -1, 1
+REASONS = ['stop_loss', 'profit_target', 'time_limit', 'end_of_data']
+STOP, TARGET, TIME, EOD = range(4)
+
+TRADE_DTYPE = np.dtype([
+    ('entry_bar', np.int64),
+    ('exit_bar', np.int64),
+    ('side', np.int8),             # SHORT / LONG
+    ('entry_price', np.float64),
+    ('exit_price', np.float64),
+    ('entry_funding', np.float64),
+    ('bars_held', np.int64),
+    ('pnl_pct', np.float64),       # after fees, in %
+    ('reason', np.int8),           # index into REASONS
+])
+
+# params the kernel reads (engine.strategy.DEFAULT_PARAMS carries the defaults)
+KERNEL_PARAMS = ['stop_loss_short', 'profit_target_short', 'stop_loss_long', 'profit_target_long',
+                 'time_limit_bars', 'min_bars_between_entries', 'trading_fee_round_trip']
+
+
+# ============ EXIT SCAN ============
+def first_exit(side, e, high, low, close, stop, target, limit, scan_from=None):
+    """
+    Exit of one position entered at bar e: (exit_bar, exit_price, reason).
+    Bars e..e+limit are checked in order, stop before target before time;
+    scan_from skips bars already known not to exit (a resumed position).
+    """
+    n = len(close)
+    ep = close[e]
+    b = e if scan_from is None else max(e, scan_from)
+    end = min(e + limit, n - 1) + 1
+    c = close[b:end]
+    if side == LONG:
+        hit_stop = (low[b:end] - ep) / ep <= -stop
+        hit_target = (c - ep) / ep >= target
+    else:
+        hit_stop = (ep - high[b:end]) / ep <= -stop
+        hit_target = (ep - c) / ep >= target
+    hit = hit_stop | hit_target
+    k = int(hit.argmax()) if len(hit) else 0
+    if len(hit) and hit[k]:
+        if hit_stop[k]:
+            return b + k, ep * (1 - side * stop), STOP
+        return b + k, c[k], TARGET
+    if e + limit <= n - 1:
+        return e + limit, close[e + limit], TIME
+    return n - 1, close[n - 1], EOD
+
+
+# ============ KERNEL ============
+def run_kernel(high, low, close, funding, short_signal, long_signal, params, start=0, state=None) -> np.ndarray:
+    """
+    Backtest on arrays. Signals are boolean arrays; bars before `start` are
+    never entered (testing_v3 starts at the 24-bar lookback).
+    state resumes an earlier run whose bars end at `start` (engine.incremental):
+    {'open': [(side, entry_bar), ...] in entry order, 'last_entry': {SHORT: bar, LONG: bar}},
+    bar numbers in these arrays; open positions are only checked from `start` on.
+    Returns closed trades as a TRADE_DTYPE array in the loop's order.
+    """
+    high = np.ascontiguousarray(high, dtype=np.float64)
+    low = np.ascontiguousarray(low, dtype=np.float64)
+    close = np.ascontiguousarray(close, dtype=np.float64)
+    funding = np.ascontiguousarray(funding, dtype=np.float64)
+    short_signal = np.asarray(short_signal, dtype=bool).copy()
+    long_signal = np.asarray(long_signal, dtype=bool).copy()
+    short_signal[:start] = False
+    long_signal[:start] = False
+
+    n = len(close)
+    gap = params['min_bars_between_entries']
+    limit = params['time_limit_bars']
+    fee = params['trading_fee_round_trip'] * 100
+    rules = {SHORT: (params['stop_loss_short'], params['profit_target_short']),
+             LONG: (params['stop_loss_long'], params['profit_target_long'])}
+
+    cand = np.flatnonzero(short_signal | long_signal)
+    resumed = [] if state is None else state['open']
+    # preallocated position book: at most one entry per side per candidate bar
+    cap = 2 * len(cand) + len(resumed)
+    pos_entry = np.empty(cap, dtype=np.int64)
+    pos_exit = np.empty(cap, dtype=np.int64)
+    pos_side = np.empty(cap, dtype=np.int8)
+    pos_price = np.empty(cap, dtype=np.float64)
+    pos_reason = np.empty(cap, dtype=np.int8)
+    m = 0
+
+    last_entry = {SHORT: -gap, LONG: -gap} if state is None else dict(state['last_entry'])
+    last_exit = {SHORT: -1, LONG: -1}        # max exit bar of each side's positions (n for EOD)
+
+    def enter(side, i, scan_from=None):
+        nonlocal m
+        x, px, reason = first_exit(side, i, high, low, close, *rules[side], limit, scan_from)
+        pos_entry[m], pos_exit[m], pos_side[m], pos_price[m], pos_reason[m] = i, x, side, px, reason
+        m += 1
+        last_entry[side] = max(last_entry[side], i)
+        last_exit[side] = max(last_exit[side], n if reason == EOD else x)
+
+    # positions still open at the checkpoint: exits from the first new bar on
+    for side, e in resumed:
+        enter(side, e, start)
+
+    for i in cand:
+        # SHORT entry: throttle passed and no LONG with entry < i <= exit
+        if short_signal[i] and i - last_entry[SHORT] >= gap and last_exit[LONG] < i:
+            enter(SHORT, i)
+        # LONG entry: throttle passed and no SHORT with entry <= i < exit
+        if long_signal[i] and i - last_entry[LONG] >= gap and last_exit[SHORT] <= i:
+            enter(LONG, i)
+
+    e, x, side, reason = pos_entry[:m], pos_exit[:m], pos_side[:m], pos_reason[:m]
+    ep = close[e]
+    out = np.empty(m, dtype=TRADE_DTYPE)
+    out['entry_bar'] = e
+    out['exit_bar'] = x
+    out['side'] = side
+    out['entry_price'] = ep
+    out['exit_price'] = pos_price[:m]
+    out['entry_funding'] = funding[e]
+    out['bars_held'] = x - e
+    move = np.where(side == SHORT, ep - out['exit_price'], out['exit_price'] - ep)
+    out['pnl_pct'] = move / ep * 100 - fee
+    out['reason'] = reason
+
+    # loop order: per exit bar shorts then longs, newest entry first; then EOD shorts, EOD longs
+    eod = reason == EOD
+    order = np.lexsort((-e, side, x, eod))
+    closed, still_open = order[~eod[order]], order[eod[order]]
+    still_open = still_open[np.lexsort((e[still_open], side[still_open]))]
+    return out[np.concatenate([closed, still_open])]
+
+
+def trades_frame(trades: np.ndarray, index) -> pd.DataFrame:
+    """Record array -> the testing_v3 trades DataFrame (times from the bar index)."""
+    return pd.DataFrame({
+        'entry_time': index[trades['entry_bar']],
+        'exit_time': index[trades['exit_bar']],
+        'side': np.where(trades['side'] == SHORT, 'SHORT', 'LONG'),
+        'entry_price': trades['entry_price'],
+        'exit_price': trades['exit_price'],
+        'entry_funding': trades['entry_funding'],
+        'bars_held': trades['bars_held'],
+        'pnl_pct': trades['pnl_pct'],
+        'exit_reason': np.array(REASONS)[trades['reason']],
+    })
@@ -0,0 +1,316 @@
+"""
+LIVE / PAPER SIGNAL RUNNER
+The funding-extreme rules (engine.strategy, the testing_v3 backtest) evaluated
+one bar at a time from a feed, with the open book saved after every bar so a
+restart carries on where the last run stopped.
+
+- Feed: newline-delimited JSON messages from a replay file or a TCP socket
+      {"type": "bar", "bar_time": "2024-01-01 03:00:00+00:00", "perp_high": ..., "perp_low": ...,
+       "perp_close": ..., "funding_rate": ...}
+      {"type": "funding", "funding_rate": ...}      latest rate, used by bars that carry none
+  a combined-bars CSV replays as one bar message per row
+- Per bar: the 24-bar high / low of the previous closes (engine.indicators),
+  the entry rules, then every open position's stop / target / time limit, in
+  backtest_reference's order. Work is O(open positions); no history is kept
+- Bars at or before the last processed bar_time are skipped, so a replay
+  file can simply be fed again from the top after a restart
+- Events go out as JSON lines: signals, open / close orders and one 'bar'
+  record with latency_ms (bar message read -> its events written) and
+  feed_lag_ms when the message carries sent_ms; the state is saved only
+  after they are flushed, so a crash replays the bar instead of losing it
+
+Trades closed by the runner are the backtest's trades (backtest_funding_extreme
+on the same bars), minus the end_of_data closes of positions still open.
+
+Usage:
+    python -m engine.live --replay BTC_perp_funding_combined_OHLC.csv --state live_state.json --out orders.jsonl
+    python -m engine.live --socket 127.0.0.1:9000 --state live_state.json
+"""
+import csv
+import json
+import math
+import os
+import socket
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from engine.indicators import RollingMax, RollingMin, from_state
+from engine.strategy import resolve_params
+
+# ============ CONFIGURATION ============
+STATE_VERSION = 1
+BAR_FIELDS = ['perp_high', 'perp_low', 'perp_close', 'funding_rate']
+SIDES = ('SHORT', 'LONG')
+
+
+def bar_time_ms(t) -> int:
+    """bar_time as epoch ms (ints pass through; naive times are UTC)."""
+    if isinstance(t, (int, np.integer)):
+        return int(t)
+    ts = pd.Timestamp(t)
+    if ts.tzinfo is None:
+        ts = ts.tz_localize('UTC')
+    return int(ts.value // 1_000_000)
+
+
+def _iso(ms: int) -> str:
+    return pd.Timestamp(ms, unit='ms', tz='UTC').isoformat()
+
+
+# ============ RUNNER ============
+class LiveRunner:
+    """Incremental testing_v3 rules over one symbol's bars."""
+
+    def __init__(self, params=None):
+        self.params = resolve_params(params)
+        lookback = self.params['lookback']
+        self.roll_high = RollingMax(lookback)
+        self.roll_low = RollingMin(lookback)
+        self.bar = -1                            # bar number of the last processed bar
+        self.last_time = None                    # its bar_time (epoch ms)
+        self.prev_close = math.nan
+        self.prev_funding = math.nan
+        self.funding = math.nan                  # latest funding update
+        gap = self.params['min_bars_between_entries']
+        self.last_entry = {'SHORT': -gap, 'LONG': -gap}
+        self.open = {'SHORT': [], 'LONG': []}
+
+    # ---------- messages ----------
+    def on_message(self, msg: dict) -> list:
+        kind = msg.get('type', 'bar')
+        if kind == 'funding':
+            self.funding = float(msg['funding_rate'])
+            return []
+        if kind == 'bar':
+            return self.on_bar(msg)
+        raise ValueError(f"unknown feed message type {kind!r}")
+
+    def on_bar(self, bar: dict) -> list:
+        """Process one closed bar; the events it produces (empty if already seen)."""
+        t = bar_time_ms(bar['bar_time'])
+        if self.last_time is not None and t <= self.last_time:
+            return []
+        p = self.params
+        fr = bar.get('funding_rate')
+        fr = self.funding if fr is None or fr == '' else float(fr)
+        self.funding = fr
+        high, low, close = float(bar['perp_high']), float(bar['perp_low']), float(bar['perp_close'])
+        self.bar += 1
+        self.last_time = t
+        i = self.bar
+        when = _iso(t)
+
+        # previous `lookback` closes (close.shift(1).rolling(lookback)), fresh = rate changed
+        roll_high = self.roll_high.push(self.prev_close)
+        roll_low = self.roll_low.push(self.prev_close)
+        fresh = i == 0 or fr != self.prev_funding
+        self.prev_close, self.prev_funding = close, fr
+        signal = {
+            'SHORT': fresh and fr >= p['extreme_high_funding'] and close >= roll_high * (1 - p['price_buffer_pct']),
+            'LONG': fresh and fr <= p['extreme_low_funding'] and close <= roll_low * (1 + p['price_buffer_pct']),
+        }
+
+        events = []
+        for side in SIDES:
+            other = 'LONG' if side == 'SHORT' else 'SHORT'
+            if signal[side] and i >= p['lookback']:
+                if i - self.last_entry[side] < p['min_bars_between_entries']:
+                    blocked = 'throttle'
+                elif self.open[other]:
+                    blocked = 'opposite_open'
+                else:
+                    blocked = None
+                events.append({'event': 'signal', 'bar_time': when, 'side': side, 'funding_rate': fr,
+                               'close': close, 'blocked': blocked})
+                if blocked is None:
+                    pos = {'id': f"{side}-{i}", 'entry_bar': i, 'entry_time': when,
+                           'entry_price': close, 'entry_funding': fr}
+                    self.open[side].append(pos)
+                    self.last_entry[side] = i
+                    events.append({'event': 'order', 'action': 'open', 'bar_time': when, 'side': side,
+                                   'id': pos['id'], 'price': close})
+            events.extend(self._exits(side, i, when, high, low, close))
+        return events
+
+    def _exits(self, side, i, when, high, low, close) -> list:
+        """Stop / target / time checks of one side's positions, newest first (as the loop does)."""
+        p = self.params
+        key = side.lower()
+        stop, target = p[f'stop_loss_{key}'], p[f'profit_target_{key}']
+        fee = p['trading_fee_round_trip'] * 100
+        book, events = self.open[side], []
+        for k in range(len(book) - 1, -1, -1):
+            pos = book[k]
+            ep = pos['entry_price']
+            if side == 'SHORT':
+                hit_stop, stop_px, gain = (ep - high) / ep <= -stop, ep * (1 + stop), (ep - close) / ep
+            else:
+                hit_stop, stop_px, gain = (low - ep) / ep <= -stop, ep * (1 - stop), (close - ep) / ep
+            if hit_stop:
+                exit_price, reason = stop_px, 'stop_loss'
+            elif gain >= target:
+                exit_price, reason = close, 'profit_target'
+            elif i - pos['entry_bar'] >= p['time_limit_bars']:
+                exit_price, reason = close, 'time_limit'
+            else:
+                continue
+            del book[k]
+            move = (ep - exit_price) if side == 'SHORT' else (exit_price - ep)
+            events.append({'event': 'order', 'action': 'close', 'bar_time': when, 'side': side, 'id': pos['id'],
+                           'price': exit_price, 'entry_time': pos['entry_time'], 'exit_time': when,
+                           'entry_price': ep, 'exit_price': exit_price, 'entry_funding': pos['entry_funding'],
+                           'bars_held': i - pos['entry_bar'], 'pnl_pct': move / ep * 100 - fee,
+                           'exit_reason': reason})
+        return events
+
+    def open_positions(self) -> int:
+        return len(self.open['SHORT']) + len(self.open['LONG'])
+
+    # ---------- state ----------
+    def state(self) -> dict:
+        return {
+            'version': STATE_VERSION,
+            'params': self.params,
+            'bar': self.bar,
+            'last_time': self.last_time,
+            'prev_close': self.prev_close,
+            'prev_funding': self.prev_funding,
+            'funding': self.funding,
+            'last_entry': self.last_entry,
+            'open': self.open,
+            'roll_high': self.roll_high.state(),
+            'roll_low': self.roll_low.state(),
+        }
+
+    @classmethod
+    def from_state(cls, d: dict, params=None):
+        if d.get('version') != STATE_VERSION:
+            raise ValueError(f"live state version {d.get('version')} (expected {STATE_VERSION})")
+        if params is not None and resolve_params(params) != d['params']:
+            raise ValueError("live state was saved with different strategy params")
+        obj = cls(d['params'])
+        obj.bar, obj.last_time = d['bar'], d['last_time']
+        obj.prev_close, obj.prev_funding, obj.funding = d['prev_close'], d['prev_funding'], d['funding']
+        obj.last_entry = dict(d['last_entry'])
+        obj.open = {side: list(d['open'][side]) for side in SIDES}
+        obj.roll_high, obj.roll_low = from_state(d['roll_high']), from_state(d['roll_low'])
+        return obj
+
+    def save(self, path):
+        """Write state() to path atomically (temp file + rename)."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.tmp-{os.getpid()}")
+        with open(tmp, 'w') as f:
+            json.dump(self.state(), f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path, params=None):
+        """Runner from a saved state file, or a fresh one if it does not exist."""
+        path = Path(path)
+        if not path.exists():
+            return cls(params)
+        with open(path) as f:
+            return cls.from_state(json.load(f), params)
+
+
+# ============ FEEDS ============
+def replay_feed(path):
+    """(read_time, message) per line of a JSON-lines file or row of a combined-bars CSV."""
+    path = Path(path)
+    with open(path, newline='') as f:
+        if path.suffix == '.csv':
+            for row in csv.DictReader(f):
+                t = time.perf_counter()
+                yield t, {'type': 'bar', 'bar_time': row['bar_time'],
+                          **{k: row[k] for k in BAR_FIELDS if k in row}}
+            return
+        for line in f:
+            t = time.perf_counter()
+            if line.strip():
+                yield t, json.loads(line)
+
+
+def socket_feed(host, port):
+    """(read_time, message) per JSON line received on a TCP connection (until it closes)."""
+    with socket.create_connection((host, int(port))) as conn, conn.makefile('r') as f:
+        for line in f:
+            t = time.perf_counter()
+            if line.strip():
+                yield t, json.loads(line)
+
+
+# ============ LOOP ============
+def run(runner: LiveRunner, feed, out=sys.stdout, state_path=None) -> dict:
+    """
+    Drive the runner from a feed, writing events as JSON lines to `out` and
+    saving the state after every bar. A bar's events are flushed before the
+    state is saved, so a crash in between replays that bar on restart
+    (events at least once, never lost). Returns per-run counters and latencies.
+    """
+    stats = {'bars': 0, 'skipped': 0, 'signals': 0, 'opened': 0, 'closed': 0, 'latency_ms': []}
+    for t_read, msg in feed:
+        if msg.get('type', 'bar') != 'bar':
+            runner.on_message(msg)
+            continue
+        bar_before = runner.bar
+        events = runner.on_message(msg)
+        if runner.bar == bar_before:
+            stats['skipped'] += 1
+            continue
+        for ev in events:
+            out.write(json.dumps(ev) + '\n')
+        latency = (time.perf_counter() - t_read) * 1000
+        summary = {'event': 'bar', 'bar_time': _iso(runner.last_time), 'bar': runner.bar,
+                   'open_positions': runner.open_positions(), 'latency_ms': round(latency, 3)}
+        if 'sent_ms' in msg:
+            summary['feed_lag_ms'] = round(time.time() * 1000 - float(msg['sent_ms']), 3)
+        out.write(json.dumps(summary) + '\n')
+        out.flush()
+        if state_path is not None:
+            runner.save(state_path)
+        stats['bars'] += 1
+        stats['signals'] += sum(ev['event'] == 'signal' for ev in events)
+        stats['opened'] += sum(ev.get('action') == 'open' for ev in events)
+        stats['closed'] += sum(ev.get('action') == 'close' for ev in events)
+        stats['latency_ms'].append(latency)
+    return stats
+
+
+if __name__ == '__main__':
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Run the funding-extreme rules live / paper from a bar feed")
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument('--replay', help="JSON-lines feed file or combined-bars CSV")
+    src.add_argument('--socket', help="host:port sending JSON-lines feed messages")
+    ap.add_argument('--state', default='live_state.json', help="state file (created if missing)")
+    ap.add_argument('--out', default=None, help="events file (appended; default stdout)")
+    ap.add_argument('--params', default=None, help="JSON dict of strategy params (new state only)")
+    args = ap.parse_args()
+
+    runner = LiveRunner.load(args.state, json.loads(args.params) if args.params else None)
+    feed = replay_feed(args.replay) if args.replay else socket_feed(*args.socket.rsplit(':', 1))
+    out = open(args.out, 'a') if args.out else sys.stdout
+    log = sys.stderr if out is sys.stdout else sys.stdout
+
+    print("="*70, file=log)
+    print(f"LIVE RUNNER | resuming after bar {runner.bar} | open positions: {runner.open_positions()}", file=log)
+    print("="*70, file=log)
+    try:
+        stats = run(runner, feed, out, args.state)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    lat = np.array(stats['latency_ms'])
+    print(f"bars: {stats['bars']} (skipped {stats['skipped']} already seen) | signals: {stats['signals']} | "
+          f"opened: {stats['opened']} | closed: {stats['closed']} | open now: {runner.open_positions()}", file=log)
+    if len(lat):
+        print(f"latency per bar: p50 {np.percentile(lat, 50):.3f} ms | p99 {np.percentile(lat, 99):.3f} ms | "
+              f"max {lat.max():.3f} ms", file=log)
@@ -0,0 +1,226 @@
+"""
+TRADE METRICS
+One definition of the trade-log numbers the scripts print (win rate,
+average / median / total PnL, profit factor, Sharpe, max drawdown, exit-reason
+breakdown, holding time), computed on columnar trade arrays in one pass:
+for one run, or for thousands of sweep runs at once grouped by run id, side
+and / or exit reason.
+
+Definitions (what most scripts already used):
+- winners pnl > 0, losers pnl <= 0
+- profit factor = gross profit / |gross loss|; no losing trade -> inf
+  (no_loss_denom=0.001 keeps the sweep scripts' fallback denominator)
+- sharpe = mean / std (ddof 1) per trade, 0 when std is 0 or undefined
+- max drawdown = max(cummax(cum pnl) - cum pnl), cum pnl in trade order
+- rates in %; PnL in the units of the pnl column (pnl_pct -> %, USD -> USD)
+- <reason>_rate columns per exit reason (stop_rate, target_rate, time_rate,
+  eod_rate for the engine's reasons), when the trades carry one
+
+Grouping sorts once by group (stable, so each group keeps its trade order)
+and reduces segments, all O(trades) memory whatever the group sizes:
+- sums are one np.add.reduceat pass over the segments
+- medians come from a value sort regrouped by a stable group sort
+- drawdowns from one cumsum over all trades less each group's opening
+  offset, and one running peak over equity lifted group by group so a
+  peak never carries over into the next group
+
+Tolerance: reduceat adds a segment left to right, so a group's sums and
+std can differ from that run computed alone (pandas / numpy pairwise sums)
+in the last few ulps; the shared cumsum carries the earlier groups' total,
+so a drawdown is exact to a few ulps of that running total (~1e-11
+relative on 600k trades). A single group (summary, one log) is summed as
+numpy sums it, bit-identical to the scripts' pandas sums.
+
+Usage:
+    m = summary(trades_df)                                   # dict for one log
+    table = batch(records, by=['run', 'side'])               # one row per (run, side)
+    batch(trades_df, by=['exit_reason'])                     # exit breakdown with avg PnL
+"""
+import numpy as np
+import pandas as pd
+
+from engine.kernel import REASONS, SHORT
+
+# ============ CONFIGURATION ============
+NO_LOSS_PF = np.inf
+REASON_RATES = {'stop_loss': 'stop_rate', 'profit_target': 'target_rate',
+                'time_limit': 'time_rate', 'end_of_data': 'eod_rate'}
+PNL_METRICS = ['trades', 'wins', 'losses', 'win_rate', 'avg_pnl', 'median_pnl', 'total_pnl', 'best', 'worst',
+               'gross_profit', 'gross_loss', 'profit_factor', 'std_pnl', 'sharpe', 'max_drawdown']
+HOLD_METRICS = ['avg_bars_held', 'median_bars_held']
+
+
+# ============ COLUMNS ============
+def trade_columns(trades, pnl='pnl_pct') -> dict:
+    """
+    Column arrays of a trade log: a DataFrame (scripts), a TRADE_DTYPE record
+    array (engine; side codes become 'SHORT' / 'LONG', reason codes stay codes
+    in 'exit_reason' and are named in the results) or a dict of arrays. 'pnl'
+    holds the chosen pnl column.
+    """
+    if isinstance(trades, np.ndarray) and trades.dtype.names:
+        cols = {k: trades[k] for k in trades.dtype.names}
+        if 'side' in cols:
+            cols['side'] = np.where(cols['side'] == SHORT, 'SHORT', 'LONG')
+        if 'reason' in cols:
+            cols['exit_reason'] = cols.pop('reason')
+    elif isinstance(trades, pd.DataFrame):
+        cols = {k: trades[k].to_numpy() for k in trades.columns}
+    else:
+        cols = {k: np.asarray(v) for k, v in trades.items()}
+    cols['pnl'] = np.asarray(cols[pnl], dtype=np.float64)
+    return cols
+
+
+def _group_ids(cols, by):
+    """(group id per trade, DataFrame of the group keys) - groups sorted by key."""
+    n = len(cols['pnl'])
+    if not by:
+        return np.zeros(n, dtype=np.int64), pd.DataFrame(index=[0] if n else [])
+    codes, uniques = [], []
+    for k in by:
+        inv, u = pd.factorize(np.asarray(cols[k]), sort=True)
+        uniques.append(np.asarray(u))
+        codes.append(inv)
+    flat = np.ravel_multi_index(codes, [len(u) for u in uniques]) if n else np.empty(0, dtype=np.int64)
+    present, g = np.unique(flat, return_inverse=True)
+    key_codes = np.unravel_index(present, [len(u) for u in uniques])
+    keys = pd.DataFrame({k: u[c] for k, u, c in zip(by, uniques, key_codes)})
+    return g.ravel(), keys
+
+
+# ============ ENGINE ============
+def _seg_sums(x, count) -> np.ndarray:
+    """Sums of back-to-back segments of x (lengths count, 0 allowed) in one reduceat pass."""
+    if len(count) == 1:
+        return np.array([x.sum()], dtype=np.float64)
+    out = np.zeros(len(count))
+    full = count > 0
+    if full.any():
+        out[full] = np.add.reduceat(x[:int(count.sum())], (np.cumsum(count) - count)[full])
+    return out
+
+
+def _seg_max_drawdown(x, gs, starts, n_groups) -> np.ndarray:
+    """
+    max(cummax(cum x) - cum x) per group of the group-sorted x (gs its group
+    ids), all groups in one np.maximum.accumulate: each group's equity is
+    lifted above every earlier group's so the running peak restarts at its
+    first trade, and the peak is read back as the equity at the position
+    that set it (so the lift's rounding does not reach the result).
+    """
+    c = np.cumsum(x)
+    eq = c - np.concatenate([[0.0], c])[starts][gs]
+    if n_groups == 1:
+        lifted = eq
+    else:
+        lo, hi = np.minimum.reduceat(eq, starts), np.maximum.reduceat(eq, starts)
+        base = np.concatenate([[0.0], np.cumsum(hi - lo + 1.0)[:-1]])
+        lifted = eq + (base - lo)[gs]
+    at = np.maximum.accumulate(np.where(lifted == np.maximum.accumulate(lifted), np.arange(len(x)), 0))
+    return np.maximum.reduceat(eq[at] - eq, starts)
+
+
+def _reason_names(codes) -> np.ndarray:
+    """Exit reasons as names (engine codes are mapped through kernel.REASONS)."""
+    codes = np.asarray(codes)
+    return np.array(REASONS)[codes] if codes.dtype.kind in 'iu' else codes
+
+
+def _group_order(g, n_groups) -> np.ndarray:
+    """Stable sort by group id (a radix sort while the ids fit 16 bits)."""
+    return np.argsort(g.astype(np.uint16) if n_groups <= 1 << 16 else g, kind='stable')
+
+
+def _medians(x, g, starts, count) -> np.ndarray:
+    """Median of x per group: one value sort, then a stable sort by group."""
+    o = np.argsort(x)
+    xs = x[o[_group_order(g[o], len(count))]]
+    return (xs[starts + (count - 1) // 2] + xs[starts + count // 2]) / 2
+
+
+def _metrics(p, g, n_groups, bars=None, reason=None, no_loss_denom=None) -> dict:
+    """Metric arrays (one value per group) of pnl p grouped by ids g in [0, n_groups)."""
+    order = _group_order(g, n_groups)
+    gs, ps = g[order], p[order]
+    count = np.bincount(g, minlength=n_groups)
+    starts = np.concatenate([[0], np.cumsum(count)[:-1]])
+
+    win = ps > 0
+    wins = np.bincount(gs[win], minlength=n_groups)
+    total = _seg_sums(ps, count)
+    gross_profit = _seg_sums(ps[win], wins)
+    gross_loss = np.abs(_seg_sums(ps[~win], count - wins))
+    mean = total / count
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        no_loss = NO_LOSS_PF if no_loss_denom is None else gross_profit / no_loss_denom
+        pf = np.where(gross_loss > 0, gross_profit / np.where(gross_loss > 0, gross_loss, 1.0), no_loss)
+        dev = ps - mean[gs]
+        std = np.where(count > 1, np.sqrt(_seg_sums(dev * dev, count) / (count - 1)), np.nan)
+        sharpe = np.where(std > 0, mean / std, 0.0)
+
+    max_dd = _seg_max_drawdown(ps, gs, starts, n_groups)
+
+    out = {
+        'trades': count,
+        'wins': wins,
+        'losses': count - wins,
+        'win_rate': wins / count * 100,
+        'avg_pnl': mean,
+        'median_pnl': _medians(p, g, starts, count),
+        'total_pnl': total,
+        'best': np.maximum.reduceat(ps, starts),
+        'worst': np.minimum.reduceat(ps, starts),
+        'gross_profit': gross_profit,
+        'gross_loss': gross_loss,
+        'profit_factor': pf,
+        'std_pnl': std,
+        'sharpe': sharpe,
+        'max_drawdown': max_dd,
+    }
+    if bars is not None:
+        bars = np.asarray(bars)
+        out['avg_bars_held'] = _seg_sums(bars[order].astype(np.float64), count) / count
+        out['median_bars_held'] = _medians(bars, g, starts, count).astype(np.float64)
+    if reason is not None:
+        rc, names = pd.factorize(np.asarray(reason), sort=True)
+        names = _reason_names(names)
+        per = np.bincount(g * len(names) + rc, minlength=n_groups * len(names)).reshape(n_groups, len(names))
+        ordered = [r for r in REASON_RATES if r in names] + [r for r in names if r not in REASON_RATES]
+        for r in ordered:
+            out[REASON_RATES.get(r, f'{r}_rate')] = per[:, int(np.flatnonzero(names == r)[0])] / count * 100
+    return out
+
+
+# ============ API ============
+def batch(trades, by=('run',), pnl='pnl_pct', no_loss_denom=None) -> pd.DataFrame:
+    """
+    Full metric set per group of `by` columns (e.g. ['run'], ['run', 'side'],
+    ['exit_reason']); one row per group present, sorted by the keys.
+    """
+    cols = trade_columns(trades, pnl)
+    by = list(by or [])
+    g, keys = _group_ids(cols, by)
+    if len(g) == 0:
+        return pd.DataFrame(columns=by + PNL_METRICS)
+    reason = cols.get('exit_reason') if 'exit_reason' not in by else None
+    m = _metrics(cols['pnl'], g, len(keys), cols.get('bars_held'), reason, no_loss_denom)
+    if 'exit_reason' in keys:
+        keys['exit_reason'] = _reason_names(keys['exit_reason'].to_numpy())
+    return pd.concat([keys, pd.DataFrame(m)], axis=1)
+
+
+def summary(trades, pnl='pnl_pct', no_loss_denom=None) -> dict:
+    """Metric set of one trade log as plain numbers ({'trades': 0} plus NaNs when empty)."""
+    cols = trade_columns(trades, pnl)
+    if len(cols['pnl']) == 0:
+        return {'trades': 0, **{k: np.nan for k in PNL_METRICS[1:]}, 'total_pnl': 0.0}
+    m = _metrics(cols['pnl'], np.zeros(len(cols['pnl']), dtype=np.int64), 1, cols.get('bars_held'),
+                 cols.get('exit_reason'), no_loss_denom)
+    out = {k: v[0].item() for k, v in m.items()}
+    if 'side' in cols:
+        side = np.asarray(cols['side'])
+        out['short_trades'] = int((side == 'SHORT').sum())
+        out['long_trades'] = int((side == 'LONG').sum())
+    return out
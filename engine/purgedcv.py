@@ -0,0 +1,158 @@
+"""
+PURGED / EMBARGOED CROSS-VALIDATION
+k-fold scores of every parameter set of the long-only strategy without
+label leakage: a trade's outcome spans its bars held (up to
+time_limit_bars), so training trades that overlap a test window's trades
+are purged, and the bars right after it are embargoed.
+
+For test window [t0, t1) and one parameter set:
+    test trades    entry in [t0, t1)
+    purged         training trades whose [entry, exit] overlaps [t0, last test exit]
+    embargoed      training trades entering within `embargo` bars after that
+    train trades   the rest (exit < t0, or entry > last test exit + embargo)
+
+Trades come from one sweep over the whole history (engine.sweep,
+keep_trades); all runs' trades are flattened into columns (run, entry,
+exit, pnl) and each fold is a few masks plus bincounts grouped by run, so a
+fold costs O(trades) for the whole grid at once. Folds run concurrently.
+
+Returns per parameter set the mean / std of the test metric across folds
+(the robust pick) next to the mean training metric (the gap shows overfit),
+and per fold the best-on-train parameter set with its test score.
+
+Usage:
+    table, folds = purged_cv(df, grid, k=5, embargo=6)
+    table.sort_values('cv_profit_factor_mean', ascending=False).head()
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from engine.sweep import LOOKBACK, LONG_PARAMS, NO_LOSS_PF_DENOM, sweep_long
+
+# ============ CONFIGURATION ============
+K_FOLDS = 5
+EMBARGO_BARS = 6                     # one day of 4H bars
+CV_METRIC = 'profit_factor'
+MIN_FOLD_TRADES = 3                  # a fold score needs this many trades (else NaN)
+FOLD_METRICS = ['trades', 'win_rate', 'total_pnl', 'avg_pnl', 'profit_factor']
+
+
+# ============ FOLDS ============
+def cv_windows(n, k=K_FOLDS, start=LOOKBACK) -> pd.DataFrame:
+    """k contiguous test windows covering bars [start, n)."""
+    edges = np.linspace(start, n, k + 1).round().astype(np.int64)
+    return pd.DataFrame({'fold': np.arange(k), 'test_start': edges[:-1], 'test_end': edges[1:]})
+
+
+def flatten_trades(kept: dict, n_runs: int) -> dict:
+    """{run: trade records} -> columns over all runs (run, entry, exit, pnl)."""
+    runs = range(n_runs)
+    return {
+        'run': np.concatenate([np.full(len(kept[r]), r, dtype=np.int64) for r in runs]),
+        'entry': np.concatenate([kept[r]['entry_bar'] for r in runs]),
+        'exit': np.concatenate([kept[r]['exit_bar'] for r in runs]),
+        'pnl': np.concatenate([kept[r]['pnl_pct'] for r in runs]),
+        'n_runs': n_runs,
+    }
+
+
+def grouped_metrics(cols: dict, mask: np.ndarray, min_trades=MIN_FOLD_TRADES) -> dict:
+    """FOLD_METRICS per run over the trades in mask (scripts' PF fallback; NaN below min_trades)."""
+    run, pnl, n_runs = cols['run'][mask], cols['pnl'][mask], cols['n_runs']
+    count = np.bincount(run, minlength=n_runs)
+    win = pnl > 0
+    wins = np.bincount(run, weights=win, minlength=n_runs)
+    total = np.bincount(run, weights=pnl, minlength=n_runs)
+    gp = np.bincount(run, weights=np.where(win, pnl, 0.0), minlength=n_runs)
+    gl = np.bincount(run, weights=np.where(win, 0.0, -pnl), minlength=n_runs)
+    has_loss = np.bincount(run, weights=~win, minlength=n_runs) > 0
+    enough = count >= max(min_trades, 1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        out = {
+            'trades': count,
+            'win_rate': np.where(enough, wins / count * 100, np.nan),
+            'total_pnl': np.where(enough, total, np.nan),
+            'avg_pnl': np.where(enough, total / count, np.nan),
+            'profit_factor': np.where(enough, gp / np.where(has_loss, gl, NO_LOSS_PF_DENOM), np.nan),
+        }
+    return out
+
+
+def fold_masks(cols: dict, t0, t1, embargo=EMBARGO_BARS):
+    """(train mask, test mask) of one test window, purged and embargoed per run."""
+    run, entry, exit = cols['run'], cols['entry'], cols['exit']
+    test = (entry >= t0) & (entry < t1)
+    # last bar any test trade of each run is still open (at least the window's last bar)
+    label_end = np.full(cols['n_runs'], t1 - 1, dtype=np.int64)
+    np.maximum.at(label_end, run[test], exit[test])
+    train = (exit < t0) | (entry > label_end[run] + embargo)
+    return train, test
+
+
+# ============ EVALUATION ============
+def evaluate_fold(cols: dict, t0, t1, embargo=EMBARGO_BARS, min_trades=MIN_FOLD_TRADES) -> dict:
+    """{'train': metrics per run, 'test': metrics per run, 'dropped': trades purged or embargoed} for one window."""
+    train, test = fold_masks(cols, t0, t1, embargo)
+    return {'train': grouped_metrics(cols, train, min_trades),
+            'test': grouped_metrics(cols, test, min_trades),
+            'dropped': int((~train & ~test).sum())}
+
+
+def _mean_std(scores: np.ndarray):
+    """Column mean / std over the finite fold scores (NaN where a run has none)."""
+    ok = np.isfinite(scores)
+    count = ok.sum(axis=0)
+    x = np.where(ok, scores, 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(count > 0, x.sum(axis=0) / count, np.nan)
+        std = np.sqrt(np.where(ok, (x - mean) ** 2, 0.0).sum(axis=0) / count)
+    return mean, np.where(count > 0, std, np.nan)
+
+
+def _evaluate_fold_task(cols, window, embargo, min_trades):
+    return evaluate_fold(cols, window['test_start'], window['test_end'], embargo, min_trades)
+
+
+def purged_cv(df: pd.DataFrame, grid=None, k=K_FOLDS, embargo=EMBARGO_BARS, metric=CV_METRIC,
+              min_trades=MIN_FOLD_TRADES, workers=None, windows=None):
+    """
+    (table, folds). table: one row per grid point with the full-history
+    metrics, cv_<metric>_mean / _std over the test folds and
+    train_<metric>_mean. folds: per window, the best-on-train run and its
+    test metrics (nested selection).
+    """
+    table, kept = sweep_long(df, grid, keep_trades=True)
+    cols = flatten_trades(kept, len(table))
+    windows = cv_windows(len(df), k) if windows is None else windows
+    wins = windows.to_dict('records')
+    workers = max(1, min(workers or os.cpu_count() or 1, len(wins)))
+
+    if workers == 1:
+        results = [_evaluate_fold_task(cols, w, embargo, min_trades) for w in wins]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_evaluate_fold_task, [cols] * len(wins), wins,
+                                    [embargo] * len(wins), [min_trades] * len(wins)))
+
+    test = np.vstack([r['test'][metric] for r in results])
+    train = np.vstack([r['train'][metric] for r in results])
+    table[f'cv_{metric}_mean'], table[f'cv_{metric}_std'] = _mean_std(test)
+    table['cv_folds_scored'] = np.isfinite(test).sum(axis=0)
+    table[f'train_{metric}_mean'], _ = _mean_std(train)
+
+    rows = []
+    for w, r in zip(wins, results):
+        row = dict(w)
+        score = r['train'][metric]
+        if np.isfinite(score).any():
+            best = int(np.nanargmax(score))
+            row.update({key: table.at[best, key] for key in LONG_PARAMS})
+            row.update({'run': best, f'train_{metric}': score[best], 'train_trades': int(r['train']['trades'][best])})
+            row.update({f'test_{m}': r['test'][m][best] for m in FOLD_METRICS})
+        else:
+            row['run'] = None
+        rows.append(row)
+    return table, pd.DataFrame(rows)
@@ -0,0 +1,106 @@
+"""
+RANGE-EXTREMUM INDEX
+Sparse table over one column: max (or min) of any bar range in O(1).
+
+    level k, slot i  =  max(values[i : i + 2**k])
+    max(values[lo:hi]) = max(level k at lo, level k at hi - 2**k),  k = floor(log2(hi - lo))
+
+- Built once in O(n log n); every query after that is two array reads, and
+  queries are vectorized (arrays of lo / hi)
+- NaNs are skipped like pandas' max()/min(); an all-NaN or empty range is NaN
+- rolling(n, lag) reproduces pandas' shift(lag).rolling(n).max()/min() exactly,
+  for any n from the same table: a lookback sweep costs one build, not one
+  rolling window per value
+- The levels are exactly the power-of-two blocks engine.firstpass jumps over
+
+Usage:
+    hi = SparseTable(df['perp_high'].to_numpy(), 'max')
+    hi.query(entry_bars, exit_bars + 1)          # highest high while each trade was open
+    hi.rolling(24, lag=1)                        # == df['perp_high'].shift(1).rolling(24).max()
+
+    ranges = RangeIndex(df)                      # lazy tables per (column, op)
+    ranges.rolling('perp_close', 'max', 24, lag=1)
+"""
+import numpy as np
+
+OPS = {'max': np.fmax, 'min': np.fmin}
+
+
+def floor_log2(length) -> np.ndarray:
+    """floor(log2(length)) for positive ints, exact (no float log)."""
+    return np.frexp(np.asarray(length, dtype=np.float64))[1].astype(np.int64) - 1
+
+
+class SparseTable:
+    """Idempotent range max/min over a fixed array."""
+
+    def __init__(self, values, op='max'):
+        if op not in OPS:
+            raise ValueError(f"unknown op {op!r} (max / min)")
+        v = np.asarray(values, dtype=np.float64)
+        self.op = op
+        self.n = len(v)
+        n_levels = int(floor_log2(self.n)) + 1 if self.n else 1
+        # row k holds the 2**k-bar blocks; slots whose block runs past the end stay NaN
+        self.table = np.full((n_levels, self.n), np.nan)
+        self.table[0] = v
+        self.nan_count = np.concatenate([[0], np.cumsum(np.isnan(v))])
+        f = OPS[op]
+        for k in range(1, n_levels):
+            h = 1 << (k - 1)
+            f(self.table[k - 1, :self.n - h], self.table[k - 1, h:], out=self.table[k, :self.n - h])
+
+    @property
+    def n_levels(self) -> int:
+        return len(self.table)
+
+    def block(self, k, pos) -> np.ndarray:
+        """Extremum of values[pos : pos + 2**k] (NaN if the block runs past the end)."""
+        return self.table[k, pos]
+
+    def query(self, lo, hi) -> np.ndarray:
+        """Extremum of values[lo:hi] per (lo, hi) pair; NaN where the range is empty."""
+        lo, hi = np.broadcast_arrays(np.asarray(lo, dtype=np.int64), np.asarray(hi, dtype=np.int64))
+        lo = np.clip(lo, 0, self.n)
+        hi = np.clip(hi, 0, self.n)
+        ok = hi > lo
+        out = np.full(lo.shape, np.nan)
+        if ok.any():
+            a, b = lo[ok], hi[ok]
+            k = floor_log2(b - a)
+            out[ok] = OPS[self.op](self.table[k, a], self.table[k, b - (1 << k)])
+        return out
+
+    def rolling(self, n, lag=0) -> np.ndarray:
+        """
+        Extremum of the n values ending `lag` bars before each bar, i.e.
+        shift(lag).rolling(n, min_periods=n): NaN until the window is full
+        or while it holds a NaN.
+        """
+        hi = np.arange(self.n, dtype=np.int64) - lag + 1
+        lo = hi - n
+        out = self.query(lo, hi)
+        ok = lo >= 0
+        ok[ok] = self.nan_count[hi[ok]] == self.nan_count[lo[ok]]
+        out[~ok] = np.nan
+        return out
+
+
+# ============ PER-FRAME INDEX ============
+class RangeIndex:
+    """Sparse tables over the columns of one frame, built on first use and shared by every query."""
+
+    def __init__(self, data):
+        self.data = data                 # DataFrame or {name: array}
+        self._tables = {}
+
+    def table(self, col, op) -> SparseTable:
+        if (col, op) not in self._tables:
+            self._tables[(col, op)] = SparseTable(np.asarray(self.data[col]), op)
+        return self._tables[(col, op)]
+
+    def query(self, col, op, lo, hi) -> np.ndarray:
+        return self.table(col, op).query(lo, hi)
+
+    def rolling(self, col, op, n, lag=0) -> np.ndarray:
+        return self.table(col, op).rolling(n, lag)
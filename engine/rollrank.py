@@ -0,0 +1,122 @@
+"""
+ROLLING PERCENTILE RANK
+Where each bar sits inside its own trailing window, computed once per
+(series, window), so "is this bar above its rolling q-quantile?" becomes a
+comparison for any q instead of a fresh rolling quantile.
+
+Per bar i, over the non-NaN values of the window ending at i:
+    nobs            values counted
+    lt / le         values < x[i] / <= x[i]      (x[i] sits at sorted slots lt .. le-1)
+    below / above   nearest value under / over x[i]
+
+pandas' rolling quantile is the linear interpolation at pos = q * (nobs - 1), so
+    x >= quantile(q)  <=>  pos <= le - 1
+    x <= quantile(q)  <=>  pos >= lt
+except when pos falls between x and its neighbour, where the interpolated
+value itself is compared (same expression as pandas), so every comparison
+is exactly what `x >= s.rolling(w).quantile(q)` gives.
+
+Usage:
+    ranks = RollingRank(df['fund_premium'], 90)
+    at_hi = ranks.ge_quantile(0.90)      # == fund_premium >= rolling(90).quantile(0.90)
+    at_lo = ranks.le_quantile(0.10)
+    ranks.pct_rank()                     # highest q with x >= quantile(q)
+"""
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# ============ CONFIGURATION ============
+CHUNK_CELLS = 4_000_000              # window cells compared per chunk (bounds memory)
+
+
+class RollingRank:
+    """Rank of every bar within its trailing window (one vectorized pass, chunked)."""
+
+    def __init__(self, values, window, min_periods=None):
+        x = np.asarray(values, dtype=np.float64)
+        self.x = x
+        self.window = int(window)
+        self.min_periods = self.window if min_periods is None else max(int(min_periods), 1)
+        n, w = len(x), self.window
+        self.nobs = np.zeros(n, dtype=np.int64)
+        self.lt = np.zeros(n, dtype=np.int64)
+        self.le = np.zeros(n, dtype=np.int64)
+        self.below = np.full(n, np.nan)
+        self.above = np.full(n, np.nan)
+        if n == 0:
+            return
+
+        # windows end at each bar; the first w-1 are padded with NaN (not counted)
+        win = sliding_window_view(np.concatenate([np.full(w - 1, np.nan), x]), w)
+        step = max(1, CHUNK_CELLS // w)
+        for a in range(0, n, step):
+            b = min(a + step, n)
+            v, c = win[a:b], x[a:b, None]
+            lt, eq = v < c, v == c
+            self.nobs[a:b] = (~np.isnan(v)).sum(axis=1)
+            self.lt[a:b] = lt.sum(axis=1)
+            self.le[a:b] = self.lt[a:b] + eq.sum(axis=1)
+            lo = np.where(lt, v, -np.inf).max(axis=1)
+            hi = np.where(v > c, v, np.inf).min(axis=1)
+            self.below[a:b] = np.where(np.isfinite(lo), lo, np.nan)
+            self.above[a:b] = np.where(np.isfinite(hi), hi, np.nan)
+
+    def _valid(self):
+        return (self.nobs >= self.min_periods) & ~np.isnan(self.x)
+
+    def _pos(self, q):
+        if not 0 <= q <= 1:
+            raise ValueError("q must be in [0, 1]")
+        pos = q * (self.nobs - 1).astype(np.float64)
+        i = pos.astype(np.int64)
+        return pos, i, pos - i
+
+    # ============ THRESHOLDS ============
+    def ge_quantile(self, q) -> np.ndarray:
+        """x >= rolling quantile(q), bar by bar (False where the quantile is NaN)."""
+        pos, i, frac = self._pos(q)
+        out = pos <= self.le - 1
+        edge = (i == self.le - 1) & (frac > 0)
+        with np.errstate(invalid='ignore'):
+            xe = self.x[edge]
+            out[edge] = xe >= xe + (self.above[edge] - xe) * frac[edge]
+        return out & self._valid()
+
+    def le_quantile(self, q) -> np.ndarray:
+        """x <= rolling quantile(q), bar by bar (False where the quantile is NaN)."""
+        pos, i, frac = self._pos(q)
+        out = i >= self.lt
+        edge = (i == self.lt - 1) & (frac > 0)
+        with np.errstate(invalid='ignore'):
+            lo = self.below[edge]
+            out[edge] = self.x[edge] <= lo + (self.x[edge] - lo) * frac[edge]
+        return out & self._valid()
+
+    def pct_rank(self) -> np.ndarray:
+        """Highest q with x >= quantile(q) (up to the interpolation edge): (le - 1) / (nobs - 1)."""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            r = np.where(self.nobs > 1, (self.le - 1) / (self.nobs - 1), 1.0)
+        return np.where(self._valid(), r, np.nan)
+
+    # ============ VALUES ============
+    def quantile(self, q, rows=None) -> np.ndarray:
+        """The rolling quantile value itself, only at `rows` (all bars if None)."""
+        rows = np.arange(len(self.x)) if rows is None else np.asarray(rows, dtype=np.int64)
+        w = self.window
+        win = sliding_window_view(np.concatenate([np.full(w - 1, np.nan), self.x]), w)
+        out = np.full(len(rows), np.nan)
+        step = max(1, CHUNK_CELLS // w)
+        for a in range(0, len(rows), step):
+            r = rows[a:a + step]
+            s = np.sort(win[r], axis=1)              # NaNs sort last
+            n = self.nobs[r]
+            pos = q * (n - 1).astype(np.float64)
+            i = np.clip(pos.astype(np.int64), 0, w - 1)
+            j = np.clip(i + 1, 0, w - 1)
+            k = np.arange(len(r))
+            lo, hi = s[k, i], s[k, j]
+            frac = pos - i
+            with np.errstate(invalid='ignore'):
+                val = np.where(frac == 0, lo, lo + (hi - lo) * frac)
+            out[a:a + step] = np.where(self.nobs[r] >= self.min_periods, val, np.nan)
+        return out
@@ -0,0 +1,176 @@
+"""
+FUNDING-EXTREME STRATEGY
+The fundingOI/testing_v3.py backtest as a function of (bars, params), so the
+same rules can run per symbol, per timeframe or per parameter set.
+
+- Multiple same-side positions allowed
+- No opposing positions (SHORT blocks LONG, vice versa)
+- MIN_BARS_BETWEEN_ENTRIES between same-side entries
+- Trading fees included (round trip)
+
+Trades are identical to the script's; bars come in as a DataFrame indexed by
+bar_time with perp_high, perp_low, perp_close, funding_rate (funding_fresh
+is recomputed when missing). backtest_funding_extreme runs the array kernel
+(engine.kernel); backtest_reference is the bar loop it is checked against.
+"""
+import numpy as np
+import pandas as pd
+
+from engine.kernel import run_kernel, trades_frame
+from engine.metrics import summary
+
+# ============ CONFIGURATION ============
+DEFAULT_PARAMS = {
+    'extreme_high_funding': 0.00012,   # SHORT threshold
+    'extreme_low_funding': 0.00003,    # LONG threshold
+    'price_buffer_pct': 0.03,          # distance from the 24-bar high/low
+    'lookback': 24,                    # rolling high/low window (bars)
+    'stop_loss_short': 0.03,
+    'profit_target_short': 0.06,
+    'stop_loss_long': 0.03,
+    'profit_target_long': 0.04,
+    'time_limit_bars': 42,             # 7 days of 4H bars
+    'min_bars_between_entries': 6,
+    'trading_fee_round_trip': 0.0008,  # 0.04% per side
+}
+TRADE_COLS = ['entry_time', 'exit_time', 'side', 'entry_price', 'exit_price',
+              'entry_funding', 'bars_held', 'pnl_pct', 'exit_reason']
+BAR_COLS = ['perp_high', 'perp_low', 'perp_close', 'funding_rate']
+
+
+def resolve_params(params=None) -> dict:
+    p = dict(DEFAULT_PARAMS)
+    if params:
+        unknown = set(params) - set(p)
+        if unknown:
+            raise KeyError(f"unknown strategy params: {sorted(unknown)}")
+        p.update(params)
+    return p
+
+
+# ============ SIGNALS ============
+def signals(df: pd.DataFrame, params=None):
+    """(short_signal, long_signal) boolean arrays, as built in testing_v3."""
+    p = resolve_params(params)
+    close = df['perp_close']
+    fr = df['funding_rate']
+    if 'funding_fresh' in df.columns:
+        fresh = df['funding_fresh'].to_numpy(bool)
+    else:
+        fresh = np.ones(len(df), dtype=bool)
+        fresh[1:] = fr.to_numpy()[1:] != fr.to_numpy()[:-1]
+
+    # rolling high/low of the previous `lookback` closes (backward-looking only)
+    roll_high = close.shift(1).rolling(p['lookback'], min_periods=p['lookback']).max()
+    roll_low = close.shift(1).rolling(p['lookback'], min_periods=p['lookback']).min()
+
+    short_signal = ((fr >= p['extreme_high_funding']) &
+                    (close >= roll_high * (1 - p['price_buffer_pct']))).to_numpy() & fresh
+    long_signal = ((fr <= p['extreme_low_funding']) &
+                   (close <= roll_low * (1 + p['price_buffer_pct']))).to_numpy() & fresh
+    return short_signal, long_signal
+
+
+# ============ BACKTEST ============
+def backtest_records(df: pd.DataFrame, params=None) -> np.ndarray:
+    """Kernel trades as a TRADE_DTYPE record array (bar numbers, no times)."""
+    p = resolve_params(params)
+    short_signal, long_signal = signals(df, p)
+    return run_kernel(df['perp_high'].to_numpy(), df['perp_low'].to_numpy(), df['perp_close'].to_numpy(),
+                      df['funding_rate'].to_numpy(), short_signal, long_signal, p, start=p['lookback'])
+
+
+def backtest_funding_extreme(df: pd.DataFrame, params=None) -> pd.DataFrame:
+    """testing_v3 backtest via the array kernel; returns the trades DataFrame (TRADE_COLS)."""
+    return trades_frame(backtest_records(df, params), df.index)
+
+
+def backtest_reference(df: pd.DataFrame, params=None) -> pd.DataFrame:
+    """Bar-by-bar backtest of testing_v3 (reference for the kernel)."""
+    p = resolve_params(params)
+    short_signal, long_signal = signals(df, p)
+    times = df.index
+    high = df['perp_high'].to_numpy()
+    low = df['perp_low'].to_numpy()
+    close = df['perp_close'].to_numpy()
+    fr = df['funding_rate'].to_numpy()
+    fee = p['trading_fee_round_trip'] * 100
+    gap = p['min_bars_between_entries']
+    n = len(df)
+
+    trades = []
+    open_shorts, open_longs = [], []
+    last_short_entry_bar = last_long_entry_bar = -gap
+
+    def close_pos(pos, i, side, exit_price, reason):
+        ep = pos['entry_price']
+        move = (ep - exit_price) if side == 'SHORT' else (exit_price - ep)
+        trades.append({
+            'entry_time': pos['entry_time'],
+            'exit_time': times[i],
+            'side': side,
+            'entry_price': ep,
+            'exit_price': exit_price,
+            'entry_funding': pos['entry_funding'],
+            'bars_held': i - pos['entry_bar'],
+            'pnl_pct': move / ep * 100 - fee,
+            'exit_reason': reason,
+        })
+
+    def open_pos(i):
+        return {'entry_bar': i, 'entry_time': times[i], 'entry_price': close[i], 'entry_funding': fr[i]}
+
+    for i in range(p['lookback'], n):
+        # ========== SHORT ENTRY / EXITS ==========
+        if short_signal[i] and (i - last_short_entry_bar) >= gap and not open_longs:
+            open_shorts.append(open_pos(i))
+            last_short_entry_bar = i
+
+        for k in range(len(open_shorts) - 1, -1, -1):
+            pos = open_shorts[k]
+            ep = pos['entry_price']
+            if (ep - high[i]) / ep <= -p['stop_loss_short']:
+                close_pos(pos, i, 'SHORT', ep * (1 + p['stop_loss_short']), 'stop_loss')
+            elif (ep - close[i]) / ep >= p['profit_target_short']:
+                close_pos(pos, i, 'SHORT', close[i], 'profit_target')
+            elif i - pos['entry_bar'] >= p['time_limit_bars']:
+                close_pos(pos, i, 'SHORT', close[i], 'time_limit')
+            else:
+                continue
+            del open_shorts[k]
+
+        # ========== LONG ENTRY / EXITS ==========
+        if long_signal[i] and (i - last_long_entry_bar) >= gap and not open_shorts:
+            open_longs.append(open_pos(i))
+            last_long_entry_bar = i
+
+        for k in range(len(open_longs) - 1, -1, -1):
+            pos = open_longs[k]
+            ep = pos['entry_price']
+            if (low[i] - ep) / ep <= -p['stop_loss_long']:
+                close_pos(pos, i, 'LONG', ep * (1 - p['stop_loss_long']), 'stop_loss')
+            elif (close[i] - ep) / ep >= p['profit_target_long']:
+                close_pos(pos, i, 'LONG', close[i], 'profit_target')
+            elif i - pos['entry_bar'] >= p['time_limit_bars']:
+                close_pos(pos, i, 'LONG', close[i], 'time_limit')
+            else:
+                continue
+            del open_longs[k]
+
+    # close remaining positions at end
+    for pos in open_shorts:
+        close_pos(pos, n - 1, 'SHORT', close[-1], 'end_of_data')
+    for pos in open_longs:
+        close_pos(pos, n - 1, 'LONG', close[-1], 'end_of_data')
+
+    return pd.DataFrame(trades, columns=TRADE_COLS)
+
+
+def summarize(trades: pd.DataFrame) -> dict:
+    """Headline numbers from the testing_v3 report."""
+    if len(trades) == 0:
+        return {'trades': 0, 'short_trades': 0, 'long_trades': 0, 'win_rate': np.nan,
+                'avg_pnl': np.nan, 'total_pnl': 0.0, 'profit_factor': np.nan}
+    m = summary(trades)
+    return {k: m[k] for k in ['trades', 'short_trades', 'long_trades', 'win_rate', 'avg_pnl', 'total_pnl',
+                              'profit_factor']}
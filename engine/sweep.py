@@ -0,0 +1,243 @@
+"""
+LONG-ONLY PARAMETER SWEEP
+One call evaluates a whole grid of the long-only funding strategy
+(tp_increase.py, testing_v4.py, 13tp_check.py) instead of one bar loop per point.
+
+Why it is cheap:
+- long-only has no opposite-side blocking, so the entry bars depend only on
+  the signal (funding threshold, price buffer, volume filter) and the throttle:
+  each distinct signal vector is built once, each (signal, throttle) entry
+  set once
+- for an entry set, the first stop / first target hit of every entry is one
+  batched first-passage query per level set (engine.firstpass), and every
+  (stop, target, time limit) combination is then a few element-wise
+  minimums over those first-hit bars
+
+Exits keep the scripts' rules and expressions: stop on low (checked
+first), target on close, time limit on bars held, positions still open at
+the end closed at the last close. Trades are summed in the scripts' order
+so totals match them to the last bit.
+
+Usage:
+    from engine.sweep import sweep_long
+    table = sweep_long(df, {'target_pct': [0.04, 0.05, 0.06], 'stop_pct': [0.03, 0.04]})
+"""
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from engine.firstpass import FirstPassage
+from engine.kernel import TRADE_DTYPE, LONG, STOP, TARGET, TIME, EOD, REASONS
+from engine.metrics import batch
+
+# ============ CONFIGURATION ============
+LONG_PARAMS = {
+    'extreme_low_funding': 0.00003,
+    'price_buffer_pct': 0.03,
+    'volume_filter': False,          # perp_volume > its 20-bar mean (testing_v4)
+    'min_bars_between_entries': 6,
+    'stop_pct': 0.03,
+    'target_pct': 0.04,
+    'time_limit_bars': 42,
+}
+LOOKBACK = 24                        # rolling-low window and first tradable bar
+VOLUME_WINDOW = 20
+TRADING_FEE_ROUND_TRIP = 0.0008
+SIGNAL_KEYS = ['extreme_low_funding', 'price_buffer_pct', 'volume_filter']
+EXIT_KEYS = ['stop_pct', 'target_pct', 'time_limit_bars']
+NO_LOSS_PF_DENOM = 0.001             # the scripts' gross-loss fallback
+METRIC_COLS = ['trades', 'win_rate', 'avg_pnl', 'total_pnl', 'profit_factor',
+               'stop_rate', 'target_rate', 'time_rate', 'eod_rate', 'avg_bars_held']
+
+
+# ============ SIGNALS / ENTRIES ============
+class LongSignals:
+    """Arrays shared by every grid point: built once per DataFrame."""
+
+    def __init__(self, df: pd.DataFrame):
+        close = df['perp_close']
+        self.close = close.to_numpy(np.float64)
+        self.low = df['perp_low'].to_numpy(np.float64)
+        self.funding = df['funding_rate'].to_numpy(np.float64)
+        self.roll_low = close.shift(1).rolling(LOOKBACK, min_periods=LOOKBACK).min().to_numpy()
+        if 'funding_fresh' in df.columns:
+            self.fresh = df['funding_fresh'].to_numpy(bool)
+        else:
+            self.fresh = np.ones(len(df), dtype=bool)
+            self.fresh[1:] = self.funding[1:] != self.funding[:-1]
+        if 'perp_volume' in df.columns:
+            vol = df['perp_volume']
+            self.volume_ok = (vol > vol.rolling(VOLUME_WINDOW).mean()).to_numpy()
+        else:
+            self.volume_ok = None
+        self.passage = FirstPassage(low=self.low, close=self.close)
+        self._cache = {}
+
+    def signal(self, extreme_low_funding, price_buffer_pct, volume_filter) -> np.ndarray:
+        key = (extreme_low_funding, price_buffer_pct, bool(volume_filter))
+        if key not in self._cache:
+            sig = ((self.funding <= extreme_low_funding) &
+                   (self.close <= self.roll_low * (1 + price_buffer_pct)) & self.fresh)
+            if volume_filter:
+                if self.volume_ok is None:
+                    raise KeyError("volume_filter needs a perp_volume column")
+                sig &= self.volume_ok
+            self._cache[key] = sig
+        return self._cache[key]
+
+
+def throttle(signal: np.ndarray, gap: int, start=LOOKBACK, end=None) -> np.ndarray:
+    """Entry bars: signal bars in [start, end) at least `gap` bars after the previous entry."""
+    cand = np.flatnonzero(signal[:end])
+    cand = cand[cand >= start]
+    entries, last = [], -gap
+    for i in cand:
+        if i - last >= gap:
+            entries.append(i)
+            last = i
+    return np.asarray(entries, dtype=np.int64)
+
+
+# ============ BATCHED EXITS ============
+class ExitBook:
+    """First stop / target hits of one entry set, evaluated for any (stop, target, time limit)."""
+
+    def __init__(self, sig: LongSignals, entries: np.ndarray, max_limit: int, end: int):
+        self.sig, self.e, self.end = sig, entries, end
+        self.ep = sig.close[entries]
+        self.max_limit = max_limit
+        self.valid_to = np.minimum(end - 1 - entries, max_limit)      # last usable offset
+        self._stops, self._targets = {}, {}
+
+    def prepare(self, stops, targets):
+        """First-hit offsets (max_limit + 1 if never) per new level, one batched query per kind."""
+        for cache, levels, kind in ((self._stops, stops, 'stop'), (self._targets, targets, 'target')):
+            new = [lv for lv in levels if lv not in cache]
+            if not new:
+                continue
+            bars = self.sig.passage.hits(self.e, np.array(new)[:, None], self.max_limit, LONG, kind, self.end)
+            for lv, b in zip(new, bars):
+                cache[lv] = np.where(b >= 0, b - self.e, self.max_limit + 1)
+
+    def exits(self, stop, target, limit):
+        """(exit_bar, exit_price, reason) arrays for every entry."""
+        fs, ft = self._stops[stop], self._targets[target]
+        e, close = self.e, self.sig.close
+        lim = np.minimum(limit, self.valid_to)
+        is_stop = (fs <= ft) & (fs <= lim)
+        is_target = ~is_stop & (ft <= lim)
+        is_time = ~is_stop & ~is_target & (e + limit <= self.end - 1)
+        off = np.where(is_stop, fs, np.where(is_target, ft, lim))
+        x = e + off
+        reason = np.select([is_stop, is_target, is_time], [STOP, TARGET, TIME], EOD).astype(np.int8)
+        price = np.where(is_stop, self.ep * (1 - stop), close[x])
+        return x, price, reason
+
+
+def _loop_order(e, x, reason):
+    """Trade order of the scripts: by exit bar (newest entry first), then EOD by entry."""
+    eod = reason == EOD
+    return np.lexsort((np.where(eod, e, -e), x, eod))
+
+
+def _records(e, ep, funding, x, price, reason):
+    order = _loop_order(e, x, reason)
+    out = np.empty(len(e), dtype=TRADE_DTYPE)
+    out['entry_bar'] = e
+    out['exit_bar'] = x
+    out['side'] = LONG
+    out['entry_price'] = ep
+    out['exit_price'] = price
+    out['entry_funding'] = funding[e]
+    out['bars_held'] = x - e
+    out['pnl_pct'] = (price - ep) / ep * 100 - TRADING_FEE_ROUND_TRIP * 100
+    out['reason'] = reason
+    return out[order]
+
+
+def metrics_table(runs: list) -> pd.DataFrame:
+    """METRIC_COLS of every run's records in one engine.metrics batch (scripts' PF fallback)."""
+    n = len(runs)
+
+    def field(f):                        # per field: concatenating whole records is much slower
+        return np.concatenate([r[f] for r in runs]) if n else np.empty(0, dtype=TRADE_DTYPE[f])
+
+    cols = {'run': np.repeat(np.arange(n), [len(r) for r in runs]), 'pnl_pct': field('pnl_pct'),
+            'bars_held': field('bars_held'), 'exit_reason': field('reason')}
+    table = batch(cols, by=['run'], no_loss_denom=NO_LOSS_PF_DENOM).set_index('run').reindex(range(n))
+    table['trades'] = table['trades'].fillna(0).astype(np.int64)
+    for c in METRIC_COLS:                # a reason no run exits on: rate 0 where there are trades
+        if c not in table:
+            table[c] = np.where(table['trades'] > 0, 0.0, np.nan)
+    return table[METRIC_COLS].reset_index(drop=True)
+
+
+def long_metrics(trades: np.ndarray) -> dict:
+    """tp_increase / testing_v4 metrics on a record array (scripts' PF fallback)."""
+    if len(trades) == 0:
+        return {'trades': 0}
+    return metrics_table([trades]).to_dict('records')[0]
+
+
+# ============ API ============
+def _grid(grid):
+    grid = {k: list(v) if isinstance(v, (list, tuple, np.ndarray)) else [v] for k, v in (grid or {}).items()}
+    unknown = set(grid) - set(LONG_PARAMS)
+    if unknown:
+        raise KeyError(f"unknown sweep params: {sorted(unknown)}")
+    return {k: grid.get(k, [LONG_PARAMS[k]]) for k in LONG_PARAMS}
+
+
+def sweep_long(df: pd.DataFrame, grid=None, start=None, end=None, keep_trades=False, signals=None):
+    """
+    Evaluate every combination of `grid` (lists per LONG_PARAMS key; missing
+    keys use the defaults). Entries are limited to bars [start, end) and the
+    data is cut at `end` (positions open there close at end-1).
+    Returns a tidy DataFrame, one row per combination (and {row: trades} if keep_trades).
+    """
+    g = _grid(grid)
+    sig = signals or LongSignals(df)
+    n = len(sig.close)
+    end = n if end is None else min(end, n)
+    start = LOOKBACK if start is None else max(start, LOOKBACK)
+    max_limit = max(g['time_limit_bars'])
+
+    rows, kept = [], {}
+    for sk in itertools.product(*(g[k] for k in SIGNAL_KEYS)):
+        s = sig.signal(*sk)
+        for gap in g['min_bars_between_entries']:
+            entries = throttle(s, gap, start, end)
+            book = ExitBook(sig, entries, max_limit, end)
+            book.prepare(g['stop_pct'], g['target_pct'])
+            for stop, target, limit in itertools.product(*(g[k] for k in EXIT_KEYS)):
+                x, price, reason = book.exits(stop, target, limit)
+                trades = _records(entries, book.ep, sig.funding, x, price, reason)
+                params = dict(zip(SIGNAL_KEYS, sk), min_bars_between_entries=gap,
+                              stop_pct=stop, target_pct=target, time_limit_bars=limit)
+                kept[len(rows)] = trades
+                rows.append(params)
+
+    table = pd.DataFrame(rows, columns=list(LONG_PARAMS))
+    table[METRIC_COLS] = metrics_table(list(kept.values()))
+    return (table, kept) if keep_trades else table
+
+
+def long_trades(df: pd.DataFrame, params=None, start=None, end=None, signals=None) -> np.ndarray:
+    """Trades of one parameter set as a TRADE_DTYPE record array (scripts' order)."""
+    p = {k: [v] for k, v in {**LONG_PARAMS, **(params or {})}.items()}
+    _, kept = sweep_long(df, p, start, end, keep_trades=True, signals=signals)
+    return kept[0]
+
+
+def long_trades_frame(trades: np.ndarray, index) -> pd.DataFrame:
+    """Long trades -> DataFrame with times and reason names."""
+    return pd.DataFrame({
+        'entry_time': index[trades['entry_bar']],
+        'exit_time': index[trades['exit_bar']],
+        'entry_price': trades['entry_price'],
+        'exit_price': trades['exit_price'],
+        'bars_held': trades['bars_held'],
+        'pnl_pct': trades['pnl_pct'],
+        'exit_reason': np.array(REASONS)[trades['reason']],
+    })
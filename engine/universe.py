@@ -0,0 +1,208 @@
+"""
+SYMBOL UNIVERSE PIPELINE
+ingest -> combine -> backtest for many USDT perps in one command.
+
+Every stage is keyed by symbol (barstore/<market>/<symbol>/..., one ingest
+manifest per symbol), so symbols are independent and run side by side in a
+process pool. Inside a worker everything runs single-process; the pool is
+the only level of parallelism.
+
+The combine stage writes 'combined' from the raw perp + funding files and
+the backtest stage reads it. The scripts' combined CSV is imported under
+its own market (datastore.store.CSV_MARKET), so for BTCUSDT the two sources
+sit side by side and neither pipeline rewrites the other's bars.
+
+With --out, the backtest stage also leaves <symbol>_checkpoint.json next to
+the trades CSV; the next run reads only the bars after it and appends
+(engine.incremental), so a daily refresh costs the new bars only. --full
+ignores the checkpoint. The checkpoint also keeps a digest of the combined
+bars it consumed (whole months by their partition digest, the last month by
+its rows); if a later ingest / combine / CSV import rewrote any of them,
+the next run is a full one.
+
+Usage:
+    python -m engine.universe --symbols BTCUSDT ETHUSDT SOLUSDT --workers 8
+    python -m engine.universe --discover                  # every symbol with raw perp files
+    python -m engine.universe --universe-file universe.txt --stages backtest
+    python -m engine.universe --symbols BTCUSDT --stages backtest --out results   # resumes from results/
+"""
+import hashlib
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from itertools import islice
+from pathlib import Path
+
+import pandas as pd
+
+from datastore.store import STORE_ROOT, REPO_ROOT, list_partitions, read_meta, read_columns, read_frame, month_of
+from datastore.ingest import SOURCES, ingest
+from datastore.combine import combine
+from engine.incremental import backtest_incremental, merge_trades, save_checkpoint, load_checkpoint
+from engine.strategy import BAR_COLS, resolve_params, summarize
+
+# ============ CONFIGURATION ============
+STAGES = ('ingest', 'combine', 'backtest')
+UNIVERSE_FILE = REPO_ROOT / 'universe.txt'
+INGEST_MARKETS = ('perp', 'funding')   # what the strategy needs
+
+
+# ============ UNIVERSE ============
+def load_universe(path=UNIVERSE_FILE) -> list:
+    """One symbol per line; blank lines and '#' comments ignored."""
+    symbols = []
+    with open(path) as f:
+        for line in f:
+            s = line.split('#', 1)[0].strip().upper()
+            if s and s not in symbols:
+                symbols.append(s)
+    return symbols
+
+
+def discover_symbols(market='perp', src=None) -> list:
+    """Symbols that have raw files for market (the file name starts with the symbol)."""
+    folder, pattern = SOURCES[market]
+    return sorted({p.name.split('-', 1)[0] for p in Path(src or folder).glob(pattern.format(symbol='*'))})
+
+
+# ============ PER SYMBOL ============
+def consumed_digest(symbol, last_time, root=None) -> str:
+    """
+    sha1 of the combined bars up to last_time: the partition digest of every
+    earlier month, then the last month's bar_time + BAR_COLS rows up to
+    last_time (bars appended after it do not change the digest).
+    """
+    last = str(month_of([last_time])[0])
+    digest = hashlib.sha1()
+    for m in list_partitions('combined', symbol, root):
+        if m < last:
+            digest.update(read_meta('combined', symbol, m, root)['digest'].encode())
+    rows = read_columns('combined', symbol, BAR_COLS, start=f"{last}-01", end=last_time + 1, root=root)
+    for c, arr in rows.items():
+        digest.update(c.encode())
+        digest.update(arr.tobytes())
+    return digest.hexdigest()
+
+
+def _resume_point(out_dir, symbol, params, root=None):
+    """
+    (previous trades, checkpoint) saved by an earlier backtest stage, or
+    (None, None) when there is none or it no longer matches the params / bars.
+    """
+    ckpt_path = Path(out_dir) / f"{symbol}_checkpoint.json"
+    trades_path = Path(out_dir) / f"{symbol}_trades.csv"
+    if not (ckpt_path.exists() and trades_path.exists()):
+        return None, None
+    ckpt = load_checkpoint(ckpt_path)
+    if ckpt['params'] != resolve_params(params):
+        return None, None
+    if ckpt['last_time'] is None or ckpt.get('bars_digest') != consumed_digest(symbol, ckpt['last_time'], root):
+        return None, None
+    return pd.read_csv(trades_path, parse_dates=['entry_time', 'exit_time']), ckpt
+
+
+def run_symbol(symbol, stages=STAGES, root=None, params=None, out_dir=None, full=False) -> dict:
+    """All requested stages for one symbol. Never raises: errors land in the result row."""
+    row = {'symbol': symbol, 'status': 'ok', 'error': None}
+    t0 = time.perf_counter()
+    try:
+        if 'ingest' in stages:
+            touched = ingest(INGEST_MARKETS, symbol, root, workers=1, verbose=False)
+            row['months_ingested'] = sum(len(v) for v in touched.values())
+        if 'combine' in stages:
+            row['bars'] = combine('stream', symbol, root)
+        if 'backtest' in stages:
+            if not list_partitions('combined', symbol, root):
+                raise FileNotFoundError(f"no combined bars for {symbol} (run the combine stage)")
+            previous, ckpt = (None, None) if full or out_dir is None else _resume_point(out_dir, symbol, params, root)
+            start = None if ckpt is None else ckpt['last_time'] + 1
+            df = read_frame('combined', symbol, BAR_COLS, start=start, root=root)
+            trades, ckpt = backtest_incremental(df, ckpt, params)
+            if previous is not None:
+                trades = merge_trades(previous, trades)
+            row['bars'] = ckpt['n_bars']
+            row['new_bars'] = len(df)
+            row.update(summarize(trades))
+            if out_dir is not None:
+                Path(out_dir).mkdir(parents=True, exist_ok=True)
+                trades.to_csv(Path(out_dir) / f"{symbol}_trades.csv", index=False)
+                if ckpt['last_time'] is not None:
+                    ckpt['bars_digest'] = consumed_digest(symbol, ckpt['last_time'], root)
+                save_checkpoint(ckpt, Path(out_dir) / f"{symbol}_checkpoint.json")
+    except Exception as e:
+        row['status'] = 'error'
+        row['error'] = f"{type(e).__name__}: {e}"
+    row['seconds'] = time.perf_counter() - t0
+    return row
+
+
+# ============ POOL ============
+def run_universe(symbols, stages=STAGES, workers=None, root=None, params=None, out_dir=None, full=False,
+                 max_pending=None) -> pd.DataFrame:
+    """
+    run_symbol for every symbol across a process pool (bounded in-flight
+    window, as in datastore.clean). Returns one row per symbol, input order.
+    """
+    symbols = list(symbols)
+    workers = min(workers or os.cpu_count() or 1, max(len(symbols), 1))
+    max_pending = max_pending or 2 * workers
+    rows = [None] * len(symbols)
+
+    if workers == 1:
+        for k, sym in enumerate(symbols):
+            rows[k] = run_symbol(sym, stages, root, params, out_dir, full)
+    else:
+        todo = iter(enumerate(symbols))
+        pending = {}
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for k, sym in islice(todo, max_pending):
+                pending[pool.submit(run_symbol, sym, stages, root, params, out_dir, full)] = k
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    rows[pending.pop(fut)] = fut.result()
+                for k, sym in islice(todo, len(done)):
+                    pending[pool.submit(run_symbol, sym, stages, root, params, out_dir, full)] = k
+
+    return pd.DataFrame(rows)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Ingest, combine and backtest a universe of symbols in parallel")
+    src = ap.add_mutually_exclusive_group()
+    src.add_argument('--symbols', nargs='*', help="explicit symbol list")
+    src.add_argument('--universe-file', default=None, help=f"one symbol per line (default: {UNIVERSE_FILE.name})")
+    src.add_argument('--discover', action='store_true', help="every symbol with raw perp files")
+    ap.add_argument('--stages', nargs='*', default=list(STAGES), choices=list(STAGES))
+    ap.add_argument('--workers', type=int, default=None, help="process count (default: all cores)")
+    ap.add_argument('--root', default=str(STORE_ROOT))
+    ap.add_argument('--out', default=None, help="folder for per-symbol trade CSVs and the summary")
+    ap.add_argument('--full', action='store_true', help="rerun the whole history, ignoring --out checkpoints")
+    args = ap.parse_args()
+
+    if args.symbols:
+        symbols = [s.upper() for s in args.symbols]
+    elif args.discover:
+        symbols = discover_symbols()
+    else:
+        symbols = load_universe(args.universe_file or UNIVERSE_FILE)
+
+    print("="*70)
+    print(f"SYMBOL UNIVERSE: {len(symbols)} symbols | stages: {' -> '.join(args.stages)}")
+    print("="*70)
+    t0 = time.perf_counter()
+    summary = run_universe(symbols, args.stages, args.workers, args.root, out_dir=args.out, full=args.full)
+    wall = time.perf_counter() - t0
+
+    with pd.option_context('display.width', 160, 'display.max_columns', 20):
+        print(summary.drop(columns=['error']).to_string(index=False))
+    failed = summary[summary['status'] != 'ok']
+    for _, r in failed.iterrows():
+        print(f"\n❌ {r['symbol']}: {r['error']}")
+    if args.out:
+        Path(args.out).mkdir(parents=True, exist_ok=True)
+        summary.to_csv(Path(args.out) / 'universe_summary.csv', index=False)
+    print(f"\n✅ {len(summary) - len(failed)}/{len(summary)} symbols done in {wall:.2f}s "
+          f"(summed symbol time {summary['seconds'].sum():.2f}s)")
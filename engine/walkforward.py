@@ -0,0 +1,177 @@
+"""
+WALK-FORWARD OPTIMIZATION
+Optimize the long-only strategy (engine.sweep) on a training window, trade
+the best parameters on the window right after it, roll forward, and stitch
+the out-of-sample trades into one equity curve: the "split the data,
+don't test on what you optimized on" step of
+validation/long_trade_optimizer_testv3.py.
+
+- Folds: rolling (fixed-length train window) or anchored (train always
+  starts at the first tradable bar), test windows back to back; holdout()
+  is the single 70/30 split
+- Train: the whole grid via sweep_long on bars [train_start, train_end),
+  data cut at train_end (positions still open there close at its last bar,
+  nothing after it is seen); best = highest `metric` among rows with at
+  least min_trades trades, first in grid order on ties
+- Test: the chosen params with entries in [test_start, test_end) and the
+  data cut at test_end, so fold logs never overlap
+- Indicators only look back (rolling low of previous closes, funding
+  freshness), so one signal / first-passage cache per process serves
+  every fold; folds run in a process pool over the shared-memory bars of
+  engine.gridsearch and come back in fold order
+
+Usage:
+    folds, trades = walk_forward(df, grid, train=1080, test=180)          # 180 / 30 days of 4H bars
+    folds, trades = walk_forward(df, grid, train=1080, test=180, anchored=True, workers=4)
+    trades['equity']                                                     # stitched OOS pnl_pct.cumsum()
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from engine.gridsearch import SharedBars, attach, full_grid
+from engine.kernel import TRADE_DTYPE
+from engine.sweep import LOOKBACK, LONG_PARAMS, LongSignals, long_metrics, long_trades, long_trades_frame, sweep_long
+
+# ============ CONFIGURATION ============
+SELECT_METRIC = 'profit_factor'
+MIN_TRAIN_TRADES = 10                # fewer trades than this can't win a training window
+HOLDOUT_TRAIN_FRAC = 0.7
+
+
+# ============ FOLDS ============
+def make_folds(n, train, test, step=None, anchored=False, start=LOOKBACK) -> pd.DataFrame:
+    """
+    Fold bar ranges over n bars: train [train_start, train_end), test
+    [train_end, test_end). Windows advance by `step` (default: test);
+    anchored folds keep train_start at `start`. The last test window is
+    cut at n.
+    """
+    step = step or test
+    rows = []
+    train_end = start + train
+    while train_end < n:
+        rows.append({'fold': len(rows),
+                     'train_start': start if anchored else train_end - train,
+                     'train_end': train_end,
+                     'test_start': train_end,
+                     'test_end': min(train_end + test, n)})
+        train_end += step
+    return pd.DataFrame(rows, columns=['fold', 'train_start', 'train_end', 'test_start', 'test_end'])
+
+
+def holdout(n, train_frac=HOLDOUT_TRAIN_FRAC, start=LOOKBACK) -> pd.DataFrame:
+    """A single train / test split (the 70/30 of the optimizer notes)."""
+    train = int((n - start) * train_frac)
+    return make_folds(n, train, n - start - train, start=start)
+
+
+def select_best(table: pd.DataFrame, metric=SELECT_METRIC, min_trades=MIN_TRAIN_TRADES):
+    """Row of the best params (None if no row has min_trades trades)."""
+    ok = table[table['trades'] >= min_trades]
+    if ok.empty or ok[metric].isna().all():
+        return None
+    return ok.loc[ok[metric].idxmax()]
+
+
+# ============ ONE FOLD ============
+def run_fold(df, fold: dict, grid, metric=SELECT_METRIC, min_trades=MIN_TRAIN_TRADES, signals=None):
+    """(fold row, OOS trade records) for one fold."""
+    sig = signals or LongSignals(df)
+    table = sweep_long(df, grid, start=fold['train_start'], end=fold['train_end'], signals=sig)
+    best = select_best(table, metric, min_trades)
+    row = dict(fold)
+    if best is None:
+        row['status'] = 'no_params'
+        return row, None
+    params = {k: best[k] for k in LONG_PARAMS}
+    params = {k: type(LONG_PARAMS[k])(v) for k, v in params.items()}
+    trades = long_trades(df, params, start=fold['test_start'], end=fold['test_end'], signals=sig)
+    row.update(status='ok', **params, **{f'train_{metric}': best[metric], 'train_trades': best['trades']},
+               **{f'test_{k}': v for k, v in long_metrics(trades).items()})
+    return row, trades
+
+
+def _run_fold_shared(spec, fold, grid, metric, min_trades):
+    _, df, cache = attach(spec)
+    if 'long' not in cache:
+        cache['long'] = LongSignals(df)
+    return run_fold(df, fold, grid, metric, min_trades, signals=cache['long'])
+
+
+# ============ WALK FORWARD ============
+def walk_forward(df: pd.DataFrame, grid=None, train=None, test=None, step=None, anchored=False, folds=None,
+                 metric=SELECT_METRIC, min_trades=MIN_TRAIN_TRADES, workers=None):
+    """
+    (folds table, stitched OOS trades). Folds come from make_folds(train,
+    test, step, anchored) unless given (e.g. holdout(len(df))). Trades carry
+    their fold and the cumulative 'equity' (pnl_pct, in %) across folds.
+    """
+    g = full_grid(grid, 'long')
+    if folds is None:
+        if train is None or test is None:
+            raise ValueError("walk_forward needs train and test lengths (bars) or explicit folds")
+        folds = make_folds(len(df), train, test, step, anchored)
+    fold_list = folds.to_dict('records')
+    workers = max(1, min(workers or os.cpu_count() or 1, len(fold_list) or 1))
+
+    if workers == 1:
+        sig = LongSignals(df)
+        results = [run_fold(df, f, g, metric, min_trades, signals=sig) for f in fold_list]
+    else:
+        with SharedBars({'wf': df}) as bars, ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_run_fold_shared, bars.specs['wf'], f, g, metric, min_trades)
+                       for f in fold_list]
+            results = [fut.result() for fut in futures]
+
+    table = pd.DataFrame([row for row, _ in results])
+    pieces = [long_trades_frame(t, df.index).assign(fold=row['fold'])
+              for row, t in results if t is not None and len(t)]
+    if pieces:
+        trades = pd.concat(pieces, ignore_index=True)
+    else:
+        trades = long_trades_frame(np.empty(0, dtype=TRADE_DTYPE), df.index).assign(fold=np.empty(0, np.int64))
+    trades['equity'] = trades['pnl_pct'].cumsum()
+    return table, trades
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+    import time
+
+    from datastore.barcache import load_bars
+
+    ap = argparse.ArgumentParser(description="Walk-forward optimization of the long-only funding strategy")
+    ap.add_argument('--grid', required=True, help="JSON file or inline JSON dict of param lists")
+    ap.add_argument('--train', type=int, default=1080, help="training bars (default 180 days of 4H)")
+    ap.add_argument('--test', type=int, default=180, help="test bars (default 30 days of 4H)")
+    ap.add_argument('--anchored', action='store_true')
+    ap.add_argument('--holdout', action='store_true', help=f"one {HOLDOUT_TRAIN_FRAC:.0%} / rest split instead")
+    ap.add_argument('--metric', default=SELECT_METRIC)
+    ap.add_argument('--min-trades', type=int, default=MIN_TRAIN_TRADES)
+    ap.add_argument('--workers', type=int, default=None)
+    ap.add_argument('--out', default=None, help="CSV for the stitched OOS trades")
+    args = ap.parse_args()
+
+    grid = json.loads(open(args.grid).read() if os.path.exists(args.grid) else args.grid)
+    df = load_bars(columns=['perp_low', 'perp_close', 'perp_volume', 'funding_rate'])
+    folds = holdout(len(df)) if args.holdout else None
+
+    print("="*70)
+    print(f"WALK-FORWARD: {'holdout' if args.holdout else ('anchored' if args.anchored else 'rolling')} | "
+          f"train {args.train} / test {args.test} bars | select on {args.metric}")
+    print("="*70)
+    t0 = time.perf_counter()
+    table, trades = walk_forward(df, grid, args.train, args.test, anchored=args.anchored, folds=folds,
+                                 metric=args.metric, min_trades=args.min_trades, workers=args.workers)
+    with pd.option_context('display.width', 200, 'display.max_columns', 30):
+        print(table.to_string(index=False))
+    equity = np.r_[0.0, trades['equity'].to_numpy()]
+    print(f"\nOOS trades: {len(trades)} | OOS total PnL: {trades['pnl_pct'].sum():+.2f}% | "
+          f"max drawdown: {(np.maximum.accumulate(equity) - equity).max():.2f}%")
+    if args.out:
+        trades.to_csv(args.out, index=False)
+    print(f"\n✅ {len(table)} folds in {time.perf_counter() - t0:.2f}s")
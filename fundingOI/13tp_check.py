@@ -1,5 +1,15 @@
 import pandas as pd
 import numpy as np
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from datastore.barcache import load_bars
+from engine.equity import equity_stats, mark_to_market
+from engine.funding import FundingAccrual, settlement_count
+from engine.metrics import summary
+from engine.rangeidx import SparseTable
+from engine.sweep import sweep_long
 
 """
 HIGH TARGET REALITY CHECK
@@ -9,12 +19,7 @@ Answer: Let's see what's REALLY happening to those 71 trades
 
 CSV_PATH = 'BTC_perp_funding_combined_OHLC.csv'
 
-df = pd.read_csv(CSV_PATH)
-df['bar_time'] = pd.to_datetime(df['bar_time'], utc=True)
-df = df.set_index('bar_time').sort_index()
-
-df['funding_fresh'] = df['funding_rate'] != df['funding_rate'].shift(1)
-df['roll_low_24'] = df['perp_close'].shift(1).rolling(24, min_periods=24).min()
+df = load_bars(CSV_PATH, columns=['perp_high', 'perp_low', 'perp_close', 'funding_rate'])
 
 EXTREME_LOW_FUNDING = 0.00003
 PRICE_BUFFER_PCT = 0.03
@@ -22,95 +27,49 @@ MIN_BARS_BETWEEN_ENTRIES = 6
 STOP_LOSS = 0.03
 TAKER_FEE = 0.0004
 TRADING_FEE_ROUND_TRIP = TAKER_FEE * 2
-
-def detailed_backtest(target_pct, target_name):
-    """Run backtest and return DETAILED trade breakdown"""
-    trades = []
-    open_longs = []
-    last_entry = -MIN_BARS_BETWEEN_ENTRIES
-    
-    for i in range(24, len(df)):
-        # Entry
-        if (df['funding_rate'].iloc[i] <= EXTREME_LOW_FUNDING and
-            df['perp_close'].iloc[i] <= df['roll_low_24'].iloc[i] * (1 + PRICE_BUFFER_PCT) and
-            df['funding_fresh'].iloc[i] and
-            (i - last_entry) >= MIN_BARS_BETWEEN_ENTRIES):
-            
-            open_longs.append({
-                'entry_bar': i,
-                'entry_time': df.index[i],
-                'entry_price': df['perp_close'].iloc[i],
-                'highest_price': df['perp_close'].iloc[i]
-            })
-            last_entry = i
-        
-        # Track highest price reached for each position
-        for pos in open_longs:
-            pos['highest_price'] = max(pos['highest_price'], df['perp_high'].iloc[i])
-        
-        # Exits
-        for pos_idx in range(len(open_longs) - 1, -1, -1):
-            pos = open_longs[pos_idx]
-            bars_held = i - pos['entry_bar']
-            
-            pnl_stop = (df['perp_low'].iloc[i] - pos['entry_price']) / pos['entry_price']
-            pnl_close = (df['perp_close'].iloc[i] - pos['entry_price']) / pos['entry_price']
-            pnl_highest = (pos['highest_price'] - pos['entry_price']) / pos['entry_price']
-            
-            exit_reason = None
-            exit_price = None
-            
-            if pnl_stop <= -STOP_LOSS:
-                exit_reason = 'stop'
-                exit_price = pos['entry_price'] * (1 - STOP_LOSS)
-            elif pnl_close >= target_pct:
-                exit_reason = 'target'
-                exit_price = df['perp_close'].iloc[i]
-            elif bars_held >= 42:
-                exit_reason = 'time'
-                exit_price = df['perp_close'].iloc[i]
-            
-            if exit_reason:
-                pnl = ((exit_price - pos['entry_price']) / pos['entry_price'] * 100) - (TRADING_FEE_ROUND_TRIP * 100)
-                
-                trades.append({
-                    'entry_time': pos['entry_time'],
-                    'entry_price': pos['entry_price'],
-                    'exit_price': exit_price,
-                    'highest_reached': pos['highest_price'],
-                    'pnl_pct': pnl,
-                    'pnl_highest': pnl_highest * 100,  # Max gain seen
-                    'bars_held': bars_held,
-                    'exit_reason': exit_reason
-                })
-                del open_longs[pos_idx]
-    
-    # Close remaining
-    for pos in open_longs:
-        pnl = ((df['perp_close'].iloc[-1] - pos['entry_price']) / pos['entry_price'] * 100) - (TRADING_FEE_ROUND_TRIP * 100)
-        pnl_highest = (pos['highest_price'] - pos['entry_price']) / pos['entry_price'] * 100
-        
-        trades.append({
-            'entry_time': pos['entry_time'],
-            'entry_price': pos['entry_price'],
-            'exit_price': df['perp_close'].iloc[-1],
-            'highest_reached': pos['highest_price'],
-            'pnl_pct': pnl,
-            'pnl_highest': pnl_highest,
-            'bars_held': len(df) - 1 - pos['entry_bar'],
-            'exit_reason': 'eod'
+TARGETS = [(0.045, "4.5%"), (0.13, "13%")]
+EXIT_NAMES = np.array(['stop', 'target', 'time', 'eod'])   # engine.kernel reason order
+
+def detailed_backtests(targets):
+    """Run every target in one sweep: DETAILED trade breakdowns {name: trades_df} and bar-level equity {name: curve}"""
+    table, kept = sweep_long(df, {
+        'extreme_low_funding': EXTREME_LOW_FUNDING,
+        'price_buffer_pct': PRICE_BUFFER_PCT,
+        'min_bars_between_entries': MIN_BARS_BETWEEN_ENTRIES,
+        'stop_pct': STOP_LOSS,
+        'target_pct': [t for t, _ in targets],
+        'time_limit_bars': 42,
+    }, keep_trades=True)
+
+    high_max = SparseTable(df['perp_high'].to_numpy(), 'max')
+    accrual = FundingAccrual(df['funding_rate'], settlement_count(df.index))
+    out, curves = {}, {}
+    for target, name in targets:
+        row = table.index[table['target_pct'] == target][0]
+        trades = kept[row]
+        ep = trades['entry_price']
+        # highest price seen while open: entry close, then every bar's high up to the exit bar
+        highest = np.maximum(ep, high_max.query(trades['entry_bar'], trades['exit_bar'] + 1))
+        out[name] = pd.DataFrame({
+            'entry_time': df.index[trades['entry_bar']],
+            'entry_price': ep,
+            'exit_price': trades['exit_price'],
+            'highest_reached': highest,
+            'pnl_pct': trades['pnl_pct'],
+            'pnl_highest': (highest - ep) / ep * 100,  # Max gain seen
+            'bars_held': trades['bars_held'],
+            'exit_reason': EXIT_NAMES[trades['reason']]
         })
-    
-    return pd.DataFrame(trades)
+        # every open position marked at each bar's close, funding included
+        curves[name] = mark_to_market(df['perp_close'], trades, fee=TRADING_FEE_ROUND_TRIP, accrual=accrual)
+    return out, curves
 
 print("="*70)
 print("HIGH TARGET REALITY CHECK")
 print("="*70)
 
 # Compare 3 targets
-results = {}
-for target, name in [(0.045, "4.5%"), (0.13, "13%")]:
-    results[name] = detailed_backtest(target, name)
+results, curves = detailed_backtests(TARGETS)
 
 # ============ DETAILED COMPARISON ============
 print("\n" + "="*70)
@@ -193,43 +152,37 @@ print("📈 VARIANCE & RISK ANALYSIS")
 print("="*70)
 
 for name, trades_df in results.items():
-    std = trades_df['pnl_pct'].std()
-    sharpe = trades_df['pnl_pct'].mean() / std if std > 0 else 0
+    m = summary(trades_df)
     
     print(f"\n{name} Target:")
-    print(f"  Std Dev: {std:.2f}%")
-    print(f"  Sharpe: {sharpe:.2f}")
+    print(f"  Std Dev: {m['std_pnl']:.2f}%")
+    print(f"  Sharpe: {m['sharpe']:.2f}")
     
     # Drawdown
-    cumsum = trades_df['pnl_pct'].cumsum()
-    drawdown = (cumsum.cummax() - cumsum).max()
-    print(f"  Max drawdown: {drawdown:.2f}%")
+    print(f"  Max drawdown: {m['max_drawdown']:.2f}%")
+    eq = equity_stats(curves[name])
+    print(f"  Max drawdown (marked to market, incl. funding): {eq['max_drawdown']:.2f}%")
+    print(f"  Time in market: {eq['time_in_market']:.1f}% of bars | up to {eq['max_positions']} positions open")
 
 # ============ FINAL VERDICT ============
 print("\n" + "="*70)
 print("⚖️  FINAL VERDICT")
 print("="*70)
 
-trades_45_pf = results["4.5%"]
-winners_45 = trades_45_pf[trades_45_pf['pnl_pct'] > 0]
-losers_45 = trades_45_pf[trades_45_pf['pnl_pct'] <= 0]
-pf_45 = winners_45['pnl_pct'].sum() / abs(losers_45['pnl_pct'].sum())
-
 trades_13_pf = results["13%"]
-winners_13 = trades_13_pf[trades_13_pf['pnl_pct'] > 0]
-losers_13 = trades_13_pf[trades_13_pf['pnl_pct'] <= 0]
-pf_13 = winners_13['pnl_pct'].sum() / abs(losers_13['pnl_pct'].sum())
+m_45 = summary(results["4.5%"])
+m_13 = summary(trades_13_pf)
 
 print(f"\n4.5% Target:")
-print(f"  PF: {pf_45:.2f}")
-print(f"  Total: {trades_45_pf['pnl_pct'].sum():+.2f}%")
-print(f"  Win Rate: {len(winners_45)/len(trades_45_pf)*100:.1f}%")
-print(f"  Consistency: {len(winners_45)} winners spread profit")
+print(f"  PF: {m_45['profit_factor']:.2f}")
+print(f"  Total: {m_45['total_pnl']:+.2f}%")
+print(f"  Win Rate: {m_45['win_rate']:.1f}%")
+print(f"  Consistency: {m_45['wins']} winners spread profit")
 
 print(f"\n13% Target:")
-print(f"  PF: {pf_13:.2f}")
-print(f"  Total: {trades_13_pf['pnl_pct'].sum():+.2f}%")
-print(f"  Win Rate: {len(winners_13)/len(trades_13_pf)*100:.1f}%")
+print(f"  PF: {m_13['profit_factor']:.2f}")
+print(f"  Total: {m_13['total_pnl']:+.2f}%")
+print(f"  Win Rate: {m_13['win_rate']:.1f}%")
 print(f"  Consistency: ~4 MASSIVE winners carry strategy")
 
 print("\n" + "="*70)
@@ -249,7 +202,7 @@ if target_hits_13 < 10:
     
     print(f"\n✅ USE 4.5% TARGET INSTEAD")
     print(f"\nReasons:")
-    print(f"  1. More consistent wins ({len(winners_45)} hits vs {target_hits_13})")
+    print(f"  1. More consistent wins ({m_45['wins']} hits vs {target_hits_13})")
     print(f"  2. Higher win rate (48% vs 39%)")
     print(f"  3. Similar total profit (+64% vs +83% but less variance)")
     print(f"  4. Easier to trade psychologically")
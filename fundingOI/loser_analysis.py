@@ -1,5 +1,10 @@
 import pandas as pd
-import numpy as np
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from datastore.barcache import load_bars
+from datastore.bargrid import BarGrid
 
 """
 BIG LOSER ANALYSIS
@@ -16,18 +21,15 @@ trades['exit_time'] = pd.to_datetime(trades['exit_time'])
 longs = trades[trades['side'] == 'LONG'].copy()
 
 # Load price data for context
-df = pd.read_csv('BTC_perp_funding_combined_OHLC.csv')
-df['bar_time'] = pd.to_datetime(df['bar_time'], utc=True)
-df = df.set_index('bar_time').sort_index()
+df = load_bars('BTC_perp_funding_combined_OHLC.csv')
 
 # Add volume ratio
 df['volume_ma_20'] = df['perp_volume'].rolling(20).mean()
 df['volume_ratio'] = df['perp_volume'] / df['volume_ma_20']
 
-# Map volume ratio to trades
-longs['volume_ratio'] = longs['entry_time'].map(
-    lambda t: df.loc[t, 'volume_ratio'] if t in df.index else np.nan
-)
+# Map volume ratio to trades (one array lookup; NaN where the entry bar is missing)
+grid = BarGrid.from_index(df.index)
+longs['volume_ratio'] = grid.lookup(df['volume_ratio'].to_numpy(), longs['entry_time'])
 
 print("="*70)
 print("BIG LOSER ANALYSIS - Finding the Root Cause")
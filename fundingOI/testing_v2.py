@@ -1,6 +1,14 @@
 import numpy as np
 import pandas as pd
+import sys
+from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from engine.counters import PrefixCount, NextOccurrence
+from engine.funding import FundingAccrual, settlement_count, interval_hours_of
+from engine.metrics import summary
+from engine.rangeidx import RangeIndex
+from engine.rollrank import RollingRank
 
 
 
@@ -33,7 +41,12 @@ def backtest_funding_multi(
     # execution & costs
     notional_usd = 10_000.0,   # fixed notional per trade
     taker_fee = 0.0004,        # 0.04% per side
-    settlement_hours=(0,8,16), # 8h funding schedule (UTC)
+    settlement_hours=None,     # UTC settlement hours, e.g. (0,8,16); None = from funding_interval_hours (8h if absent)
+    # precomputed range max/min (engine.rangeidx) over the same sorted bars; pass one
+    # RangeIndex to every call of a pivot_k / roll_high_n / fund_low_n sweep
+    ranges = None,
+    # engine.rollrank.RollingRank of fund_premium over pct_win; share it across a p_hi / p_lo sweep
+    ranks = None,
 ):
     """
     Multi-position backtester: every valid signal opens a NEW independent trade.
@@ -54,22 +67,30 @@ def backtest_funding_multi(
 
     PX, HI, LO, FR = price_col, high_col, low_col, fund_col
 
-    # settlement mask
-    df["is_settle"] = df.index.hour.isin(settlement_hours) & (df.index.minute == 0)
+    # settlements per bar (a 1d bar holds three 8h ones) and the mask of bars holding any
+    n_settle = settlement_count(df.index, interval_hours_of(df), settlement_hours)
+    df["is_settle"] = n_settle > 0
+    funding = FundingAccrual(df[FR], n_settle)
 
-    # funding premium & rolling percentile bands
+    # funding premium & rolling percentile bands: one rank pass per pct_win (engine.rollrank),
+    # so every p_hi / p_lo is a comparison, same result as fund_premium >= rolling quantile
     df["fund_premium"] = df[FR] - base_per_8h
-    roll = df["fund_premium"].rolling(pct_win, min_periods=pct_win)
-    df["p_hi"] = roll.quantile(p_hi)
-    df["p_lo"] = roll.quantile(p_lo)
-
-    # past-only context (NO look-ahead)
-    df["roll_high_prev_24"] = df[PX].shift(1).rolling(roll_high_n, min_periods=roll_high_n).max()
-    df["fund_low_prev_18"]  = df["fund_premium"].shift(1).rolling(fund_low_n, min_periods=fund_low_n).min()
+    if ranks is None:
+        ranks = RollingRank(df["fund_premium"], pct_win)
+    elif ranks.window != pct_win or not np.array_equal(ranks.x, df["fund_premium"].to_numpy(np.float64), equal_nan=True):
+        raise ValueError(f"ranks were built over a different series or window ({ranks.window}) than fund_premium / pct_win ({pct_win})")
+    at_p_hi = pd.Series(ranks.ge_quantile(p_hi), index=df.index)
+    at_p_lo = pd.Series(ranks.le_quantile(p_lo), index=df.index)
+
+    # past-only context (NO look-ahead); any window length is a lookup in the same tables
+    if ranges is None:
+        ranges = RangeIndex(df)
+    df["roll_high_prev_24"] = ranges.rolling(PX, "max", roll_high_n, lag=1)
+    df["fund_low_prev_18"]  = ranges.rolling(FR, "min", fund_low_n, lag=1) - base_per_8h  # min(fr) - base == min(fr - base)
 
     # setups (arm ideas at close of THIS bar; fill on next bar)
-    setup_short = (df["fund_premium"] >= df["p_hi"]) & (df[PX] >= df["roll_high_prev_24"])
-    setup_long  = (df["fund_premium"] <= df["p_lo"])  | (df["fund_premium"] <= df["fund_low_prev_18"])
+    setup_short = at_p_hi & (df[PX] >= df["roll_high_prev_24"])
+    setup_long  = at_p_lo | (df["fund_premium"] <= df["fund_low_prev_18"])
 
     # stop-entry levels from prior bar
     prior_low  = df[LO].shift(1)
@@ -93,31 +114,31 @@ def backtest_funding_multi(
 
 
     # precompute invalidation helpers
-    pinned_hi = df["is_settle"] & (df["fund_premium"] >= df["p_hi"] - 1e-12)
+    # pinned: at/above the p_hi band (1e-12 slack); the band value is only needed where the rank says below
+    pinned_hi = df["is_settle"] & at_p_hi
+    near = np.flatnonzero(df["is_settle"].to_numpy() & ~at_p_hi.to_numpy())
+    pinned_hi.iloc[near] = df["fund_premium"].to_numpy()[near] >= ranks.quantile(p_hi, near) - 1e-12
     fresh_low = df["fund_premium"] < df["fund_low_prev_18"] - 1e-12
+    # O(1) window questions for the exit loop (engine.counters)
+    settle_count = PrefixCount(df["is_settle"])
+    pinned_count_hi = PrefixCount(pinned_hi)
+    next_fresh_low = NextOccurrence(fresh_low)
 
-    # small helpers
-    def _pivot_high(i):
-        j0 = max(0, i - pivot_k)
-        return float(df[HI].iloc[j0:i+1].max())
-    def _pivot_low(i):
-        j0 = max(0, i - pivot_k)
-        return float(df[LO].iloc[j0:i+1].min())
+    # swing pivots: high / low of bars i-pivot_k..i for every bar, one range query each
+    bar = np.arange(len(df))
+    pivot_high = ranges.query(HI, "max", np.maximum(0, bar - pivot_k), bar + 1)
+    pivot_low  = ranges.query(LO, "min", np.maximum(0, bar - pivot_k), bar + 1)
 
     # ---------- multi-position engine ----------
     trades = []              # closed trades
+    trade_bars = []          # (entry bar, exit bar) per closed trade, for the funding pass
     open_trades = []         # active trades (list of dicts)
     last_entry_i_side = {"LONG": -10_000, "SHORT": -10_000}  # per-side de-dup
 
     idx, N = df.index, len(df)
 
     for i in range(1, N):
-        # 1) funding accrual for every open trade at PREVIOUS settlement
-        if df["is_settle"].iloc[i-1]:
-            fr_prev = float(df[FR].iloc[i-1])
-            for t in open_trades:
-                side_mult = +1.0 if t["side"] == "LONG" else -1.0
-                t["fund_usd"] += fr_prev * notional_usd * side_mult
+        # 1) funding is accrued after the loop (engine.funding), entry bar through exit bar
 
         # 2) entries — create NEW trades even if others already exist
         if pd.notna(entry_px_short.iloc[i]) and (i - last_entry_i_side["SHORT"] >= dedup_bars):
@@ -129,10 +150,9 @@ def backtest_funding_multi(
                 "entry_time": idx[i],
                 "entry_high": float(df[HI].iloc[i]),
                 "entry_low":  float(df[LO].iloc[i]),
-                "fund_usd": 0.0,
                 "entry_fee": taker_fee * notional_usd,
                 "closes_beyond": 0,
-                "struct_stop": max(_pivot_high(i-1)*(1+struct_buffer), px_e*(1+struct_buffer/2)),
+                "struct_stop": max(pivot_high[i-1]*(1+struct_buffer), px_e*(1+struct_buffer/2)),
             })
             last_entry_i_side["SHORT"] = i
 
@@ -145,10 +165,9 @@ def backtest_funding_multi(
                 "entry_time": idx[i],
                 "entry_high": float(df[HI].iloc[i]),
                 "entry_low":  float(df[LO].iloc[i]),
-                "fund_usd": 0.0,
                 "entry_fee": taker_fee * notional_usd,
                 "closes_beyond": 0,
-                "struct_stop": min(_pivot_low(i-1)*(1-struct_buffer), px_e*(1-struct_buffer/2)),
+                "struct_stop": min(pivot_low[i-1]*(1-struct_buffer), px_e*(1-struct_buffer/2)),
             })
             last_entry_i_side["LONG"] = i
 
@@ -156,7 +175,6 @@ def backtest_funding_multi(
         price_close = float(df[PX].iloc[i])
         price_high  = float(df[HI].iloc[i])
         price_low   = float(df[LO].iloc[i])
-        is_settle   = bool(df["is_settle"].iloc[i])
 
         # iterate backwards so removals are safe
         for k in range(len(open_trades)-1, -1, -1):
@@ -188,14 +206,14 @@ def backtest_funding_multi(
 
             # funding-behaviour invalidation
             if exit_reason is None:
-                settles_since = int(df["is_settle"].iloc[t["entry_i"]:i+1].sum())
+                settles_since = int(settle_count.between(t["entry_i"], i))
                 if t["side"] == "SHORT":
-                    pinned_count = int(pinned_hi.iloc[t["entry_i"]:i+1].sum())
+                    pinned_count = int(pinned_count_hi.between(t["entry_i"], i))
                     made_higher_high = price_high > t["entry_high"]
                     if pinned_count >= 2 and made_higher_high:
                         exit_reason = "cap_persist"
                 else:
-                    fresh_low_now = bool(fresh_low.iloc[max(t["entry_i"], i - fresh_low_lookahead + 1):i+1].any())
+                    fresh_low_now = bool(next_fresh_low.any_between(max(t["entry_i"], i - fresh_low_lookahead + 1), i))
                     made_lower_low = price_low < t["entry_low"]
                     if fresh_low_now and made_lower_low:
                         exit_reason = "fresh_low_cont"
@@ -210,15 +228,9 @@ def backtest_funding_multi(
 
             # execute exit
             if exit_reason is not None:
-                fund_usd = t["fund_usd"]
-                if is_settle:
-                    side_mult = +1.0 if t["side"] == "LONG" else -1.0
-                    fund_usd += float(df[FR].iloc[i]) * notional_usd * side_mult
-
                 side_mult = +1.0 if t["side"] == "LONG" else -1.0
                 pnl_price_usd = notional_usd * side_mult * ((price_close / t["entry_px"]) - 1.0)
                 exit_fee_usd  = taker_fee * notional_usd
-                pnl_total_usd = pnl_price_usd + fund_usd - (t["entry_fee"] + exit_fee_usd)
 
                 trades.append({
                     "entry_time": t["entry_time"],
@@ -228,27 +240,19 @@ def backtest_funding_multi(
                     "exit_price": price_close,
                     "bars_held": int(i - t["entry_i"]),
                     "pnl_price_usd": float(pnl_price_usd),
-                    "funding_usd": float(fund_usd),
                     "fees_usd": float(-(t["entry_fee"] + exit_fee_usd)),
-                    "pnl_total_usd": float(pnl_total_usd),
                     "exit_reason": exit_reason
                 })
+                trade_bars.append((t["entry_i"], i))
                 del open_trades[k]
 
     # 4) close anything left at the end
     if len(open_trades):
         price_close = float(df[PX].iloc[-1])
-        is_settle   = bool(df["is_settle"].iloc[-1])
         for t in open_trades:
-            fund_usd = t["fund_usd"]
-            if is_settle:
-                side_mult = +1.0 if t["side"] == "LONG" else -1.0
-                fund_usd += float(df[FR].iloc[-1]) * notional_usd * side_mult
-
             side_mult = +1.0 if t["side"] == "LONG" else -1.0
             pnl_price_usd = notional_usd * side_mult * ((price_close / t["entry_px"]) - 1.0)
             exit_fee_usd  = taker_fee * notional_usd
-            pnl_total_usd = pnl_price_usd + fund_usd - (t["entry_fee"] + exit_fee_usd)
 
             trades.append({
                 "entry_time": t["entry_time"],
@@ -258,29 +262,32 @@ def backtest_funding_multi(
                 "exit_price": price_close,
                 "bars_held": int(len(df)-1 - t["entry_i"]),
                 "pnl_price_usd": float(pnl_price_usd),
-                "funding_usd": float(fund_usd),
                 "fees_usd": float(-(t["entry_fee"] + exit_fee_usd)),
-                "pnl_total_usd": float(pnl_total_usd),
                 "exit_reason": "eod_close"
             })
+            trade_bars.append((t["entry_i"], N - 1))
 
-    log = pd.DataFrame(trades).sort_values("entry_time").reset_index(drop=True)
+    # 5) funding for every trade in one pass: settlements from entry bar through exit bar
+    log = pd.DataFrame(trades)
+    if len(log):
+        bars = np.array(trade_bars)
+        log.insert(log.columns.get_loc("fees_usd"), "funding_usd",
+                   -funding.pnl(bars[:, 0], bars[:, 1], log["side"].to_numpy(), notional_usd))  # loop's legacy sign
+        log.insert(log.columns.get_loc("exit_reason"), "pnl_total_usd",
+                   log["pnl_price_usd"] + log["funding_usd"] + log["fees_usd"])
+    log = log.sort_values("entry_time").reset_index(drop=True)
 
     # ---------- stats ----------
     if len(log):
-        pnl = log["pnl_total_usd"].values
-        gp = log.loc[log["pnl_total_usd"]>0,"pnl_total_usd"].sum()
-        gl = -log.loc[log["pnl_total_usd"]<0,"pnl_total_usd"].sum()
-        eq = log["pnl_total_usd"].cumsum()
-        max_dd = float((eq.cummax() - eq).max())
+        m = summary(log, pnl="pnl_total_usd")
         stats = {
-            "trades": int(len(log)),
-            "win_rate": float((pnl>0).mean()),
-            "expectancy_usd": float(np.mean(pnl)),
-            "median_usd": float(np.median(pnl)),
-            "profit_factor": float(gp/gl) if gl>0 else np.inf,
-            "total_pnl_usd": float(np.sum(pnl)),
-            "max_dd_usd": max_dd,
+            "trades": m["trades"],
+            "win_rate": m["wins"] / m["trades"],
+            "expectancy_usd": m["avg_pnl"],
+            "median_usd": m["median_pnl"],
+            "profit_factor": m["profit_factor"],
+            "total_pnl_usd": m["total_pnl"],
+            "max_dd_usd": m["max_drawdown"],
         }
     else:
         stats = {"trades":0, "win_rate":np.nan, "expectancy_usd":np.nan,
@@ -1,5 +1,10 @@
-import pandas as pd
-import numpy as np
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from datastore.barcache import load_bars
+from engine.kernel import run_kernel, trades_frame
+from engine.metrics import batch, summary
 
 """
 SIMPLE FUNDING STRATEGY BACKTEST - UPDATED
@@ -37,18 +42,13 @@ TRADING_FEE_ROUND_TRIP = TAKER_FEE * 2  # 0.08% total
 
 # ============ LOAD DATA ============
 print("Loading data...")
-df = pd.read_csv(CSV_PATH)
-df['bar_time'] = pd.to_datetime(df['bar_time'], utc=True)
-df = df.set_index('bar_time').sort_index()
+df = load_bars(CSV_PATH, columns=['perp_high', 'perp_low', 'perp_close', 'funding_rate'])
 
 print(f"✓ Loaded {len(df)} bars")
 print(f"✓ Date range: {df.index[0]} to {df.index[-1]}")
 print(f"✓ Duration: {(df.index[-1] - df.index[0]).days} days\n")
 
 # ============ PREP INDICATORS ============
-# Detect when funding actually updates
-df['funding_fresh'] = df['funding_rate'] != df['funding_rate'].shift(1)
-
 # Rolling 24-bar high/low (backward-looking only)
 df['roll_high_24'] = df['perp_close'].shift(1).rolling(24, min_periods=24).max()
 df['roll_low_24'] = df['perp_close'].shift(1).rolling(24, min_periods=24).min()
@@ -86,159 +86,25 @@ print(f"Potential SHORT signals: {short_signal.sum()}")
 print(f"Potential LONG signals: {long_signal.sum()}")
 
 # ============ BACKTEST ENGINE ============
-trades = []
-open_shorts = []  # List of open SHORT positions
-open_longs = []   # List of open LONG positions
-last_short_entry_bar = -MIN_BARS_BETWEEN_ENTRIES  # Track last entry for throttling
-last_long_entry_bar = -MIN_BARS_BETWEEN_ENTRIES
-
-for i in range(24, len(df)):  # Start after 24 bars for rolling context
-    
-    # ========== SHORT ENTRY ==========
-    # Only enter SHORT if: signal triggers, throttle period passed, and NO LONG positions
-    if (short_signal.iloc[i] and 
-        (i - last_short_entry_bar) >= MIN_BARS_BETWEEN_ENTRIES and
-        len(open_longs) == 0):
-        
-        open_shorts.append({
-            'entry_bar': i,
-            'entry_time': df.index[i],
-            'entry_price': df['perp_close'].iloc[i],
-            'entry_funding': df['funding_rate'].iloc[i]
-        })
-        last_short_entry_bar = i
-    
-    # ========== SHORT EXITS ==========
-    for pos_idx in range(len(open_shorts) - 1, -1, -1):  # Iterate backwards for safe removal
-        pos = open_shorts[pos_idx]
-        bars_held = i - pos['entry_bar']
-        current_high = df['perp_high'].iloc[i]
-        current_close = df['perp_close'].iloc[i]
-        
-        # Calculate PnL (price movement only, fees added later)
-        pnl_pct_stop = (pos['entry_price'] - current_high) / pos['entry_price']
-        pnl_pct_close = (pos['entry_price'] - current_close) / pos['entry_price']
-        
-        exit_reason = None
-        exit_price = None
-        
-        # Check exits (priority order)
-        if pnl_pct_stop <= -STOP_LOSS_SHORT:
-            exit_reason = 'stop_loss'
-            exit_price = pos['entry_price'] * (1 + STOP_LOSS_SHORT)
-        elif pnl_pct_close >= PROFIT_TARGET_SHORT:
-            exit_reason = 'profit_target'
-            exit_price = current_close
-        elif bars_held >= TIME_LIMIT_BARS:
-            exit_reason = 'time_limit'
-            exit_price = current_close
-        
-        if exit_reason:
-            pnl_before_fees = (pos['entry_price'] - exit_price) / pos['entry_price'] * 100
-            pnl_after_fees = pnl_before_fees - (TRADING_FEE_ROUND_TRIP * 100)
-            
-            trades.append({
-                'entry_time': pos['entry_time'],
-                'exit_time': df.index[i],
-                'side': 'SHORT',
-                'entry_price': pos['entry_price'],
-                'exit_price': exit_price,
-                'entry_funding': pos['entry_funding'],
-                'bars_held': bars_held,
-                'pnl_pct': pnl_after_fees,
-                'exit_reason': exit_reason
-            })
-            del open_shorts[pos_idx]
-    
-    # ========== LONG ENTRY ==========
-    # Only enter LONG if: signal triggers, throttle period passed, and NO SHORT positions
-    if (long_signal.iloc[i] and 
-        (i - last_long_entry_bar) >= MIN_BARS_BETWEEN_ENTRIES and
-        len(open_shorts) == 0):
-        
-        open_longs.append({
-            'entry_bar': i,
-            'entry_time': df.index[i],
-            'entry_price': df['perp_close'].iloc[i],
-            'entry_funding': df['funding_rate'].iloc[i]
-        })
-        last_long_entry_bar = i
-    
-    # ========== LONG EXITS ==========
-    for pos_idx in range(len(open_longs) - 1, -1, -1):
-        pos = open_longs[pos_idx]
-        bars_held = i - pos['entry_bar']
-        current_low = df['perp_low'].iloc[i]
-        current_close = df['perp_close'].iloc[i]
-        
-        # Calculate PnL
-        pnl_pct_stop = (current_low - pos['entry_price']) / pos['entry_price']
-        pnl_pct_close = (current_close - pos['entry_price']) / pos['entry_price']
-        
-        exit_reason = None
-        exit_price = None
-        
-        # Check exits (priority order)
-        if pnl_pct_stop <= -STOP_LOSS_LONG:
-            exit_reason = 'stop_loss'
-            exit_price = pos['entry_price'] * (1 - STOP_LOSS_LONG)
-        elif pnl_pct_close >= PROFIT_TARGET_LONG:
-            exit_reason = 'profit_target'
-            exit_price = current_close
-        elif bars_held >= TIME_LIMIT_BARS:
-            exit_reason = 'time_limit'
-            exit_price = current_close
-        
-        if exit_reason:
-            pnl_before_fees = (exit_price - pos['entry_price']) / pos['entry_price'] * 100
-            pnl_after_fees = pnl_before_fees - (TRADING_FEE_ROUND_TRIP * 100)
-            
-            trades.append({
-                'entry_time': pos['entry_time'],
-                'exit_time': df.index[i],
-                'side': 'LONG',
-                'entry_price': pos['entry_price'],
-                'exit_price': exit_price,
-                'entry_funding': pos['entry_funding'],
-                'bars_held': bars_held,
-                'pnl_pct': pnl_after_fees,
-                'exit_reason': exit_reason
-            })
-            del open_longs[pos_idx]
-
-# Close remaining positions at end
-for pos in open_shorts:
-    pnl_before_fees = (pos['entry_price'] - df['perp_close'].iloc[-1]) / pos['entry_price'] * 100
-    pnl_after_fees = pnl_before_fees - (TRADING_FEE_ROUND_TRIP * 100)
-    trades.append({
-        'entry_time': pos['entry_time'],
-        'exit_time': df.index[-1],
-        'side': 'SHORT',
-        'entry_price': pos['entry_price'],
-        'exit_price': df['perp_close'].iloc[-1],
-        'entry_funding': pos['entry_funding'],
-        'bars_held': len(df) - 1 - pos['entry_bar'],
-        'pnl_pct': pnl_after_fees,
-        'exit_reason': 'end_of_data'
-    })
-
-for pos in open_longs:
-    pnl_before_fees = (df['perp_close'].iloc[-1] - pos['entry_price']) / pos['entry_price'] * 100
-    pnl_after_fees = pnl_before_fees - (TRADING_FEE_ROUND_TRIP * 100)
-    trades.append({
-        'entry_time': pos['entry_time'],
-        'exit_time': df.index[-1],
-        'side': 'LONG',
-        'entry_price': pos['entry_price'],
-        'exit_price': df['perp_close'].iloc[-1],
-        'entry_funding': pos['entry_funding'],
-        'bars_held': len(df) - 1 - pos['entry_bar'],
-        'pnl_pct': pnl_after_fees,
-        'exit_reason': 'end_of_data'
-    })
+# Array kernel (engine.kernel): same SHORT/LONG rules, throttling and opposite-side
+# blocking as the old per-bar loop, trade for trade
+params = {
+    'stop_loss_short': STOP_LOSS_SHORT,
+    'profit_target_short': PROFIT_TARGET_SHORT,
+    'stop_loss_long': STOP_LOSS_LONG,
+    'profit_target_long': PROFIT_TARGET_LONG,
+    'time_limit_bars': TIME_LIMIT_BARS,
+    'min_bars_between_entries': MIN_BARS_BETWEEN_ENTRIES,
+    'trading_fee_round_trip': TRADING_FEE_ROUND_TRIP,
+}
+records = run_kernel(
+    df['perp_high'].to_numpy(), df['perp_low'].to_numpy(), df['perp_close'].to_numpy(),
+    df['funding_rate'].to_numpy(), short_signal.to_numpy(), long_signal.to_numpy(),
+    params, start=24,  # Start after 24 bars for rolling context
+)
 
 # ============ RESULTS ============
-if not trades:
+if len(records) == 0:
     print("\n" + "="*70)
     print("❌ NO TRADES GENERATED")
     print("="*70)
@@ -251,39 +117,36 @@ if not trades:
     print("  - Increase PRICE_BUFFER_PCT to 0.05 (5%)")
     
 else:
-    trades_df = pd.DataFrame(trades)
+    trades_df = trades_frame(records, df.index)
     
     print("\n" + "="*70)
     print("BACKTEST RESULTS")
     print("="*70)
     
+    m = summary(trades_df)
+
     # Overall stats
     print(f"\n📊 TRADE SUMMARY:")
-    print(f"Total trades: {len(trades_df)}")
-    print(f"  SHORT trades: {len(trades_df[trades_df['side']=='SHORT'])}")
-    print(f"  LONG trades: {len(trades_df[trades_df['side']=='LONG'])}")
+    print(f"Total trades: {m['trades']}")
+    print(f"  SHORT trades: {m['short_trades']}")
+    print(f"  LONG trades: {m['long_trades']}")
     
     # Win/Loss
-    winners = trades_df[trades_df['pnl_pct'] > 0]
-    losers = trades_df[trades_df['pnl_pct'] <= 0]
-    
     print(f"\n📈 WIN/LOSS:")
-    print(f"Win rate: {len(winners)/len(trades_df)*100:.1f}%")
-    print(f"  Winners: {len(winners)}")
-    print(f"  Losers: {len(losers)}")
+    print(f"Win rate: {m['win_rate']:.1f}%")
+    print(f"  Winners: {m['wins']}")
+    print(f"  Losers: {m['losses']}")
     
     # PnL stats
     print(f"\n💰 PnL STATISTICS (After Fees):")
-    print(f"Average PnL: {trades_df['pnl_pct'].mean():+.2f}%")
-    print(f"Median PnL: {trades_df['pnl_pct'].median():+.2f}%")
-    print(f"Total PnL: {trades_df['pnl_pct'].sum():+.2f}%")
-    print(f"Best trade: {trades_df['pnl_pct'].max():+.2f}%")
-    print(f"Worst trade: {trades_df['pnl_pct'].min():+.2f}%")
+    print(f"Average PnL: {m['avg_pnl']:+.2f}%")
+    print(f"Median PnL: {m['median_pnl']:+.2f}%")
+    print(f"Total PnL: {m['total_pnl']:+.2f}%")
+    print(f"Best trade: {m['best']:+.2f}%")
+    print(f"Worst trade: {m['worst']:+.2f}%")
     
     # Profit factor
-    gross_profit = winners['pnl_pct'].sum() if len(winners) > 0 else 0
-    gross_loss = abs(losers['pnl_pct'].sum()) if len(losers) > 0 else 0
-    profit_factor = gross_profit / gross_loss if gross_loss > 0 else np.inf
+    profit_factor = m['profit_factor']
     
     print(f"\n🎯 KEY METRIC:")
     print(f"Profit Factor: {profit_factor:.2f}")
@@ -298,18 +161,18 @@ else:
     
     # Exit breakdown
     print(f"\n🚪 EXIT BREAKDOWN:")
+    exits = batch(trades_df, by=['exit_reason']).set_index('exit_reason')
     for reason in ['stop_loss', 'profit_target', 'time_limit', 'end_of_data']:
-        subset = trades_df[trades_df['exit_reason']==reason]
-        if len(subset) > 0:
-            count = len(subset)
-            pct = count/len(trades_df)*100
-            avg_pnl = subset['pnl_pct'].mean()
+        if reason in exits.index:
+            count = exits.at[reason, 'trades']
+            pct = count/m['trades']*100
+            avg_pnl = exits.at[reason, 'avg_pnl']
             print(f"  {reason:15s}: {count:3d} trades ({pct:5.1f}%) | Avg PnL: {avg_pnl:+6.2f}%")
     
     # Holding time
     print(f"\n⏱️  HOLDING TIME:")
-    print(f"Average: {trades_df['bars_held'].mean():.1f} bars ({trades_df['bars_held'].mean()*4:.0f} hours)")
-    print(f"Median: {trades_df['bars_held'].median():.0f} bars ({trades_df['bars_held'].median()*4:.0f} hours)")
+    print(f"Average: {m['avg_bars_held']:.1f} bars ({m['avg_bars_held']*4:.0f} hours)")
+    print(f"Median: {m['median_bars_held']:.0f} bars ({m['median_bars_held']*4:.0f} hours)")
     
     # Save results
     output_file = 'simple_strategy_trades.csv'
@@ -2,6 +2,12 @@
 
 import pandas as pd
 import numpy as np
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from datastore.barcache import load_bars
+from engine.sweep import sweep_long
 
 """
 QUICK IMPROVEMENT TEST
@@ -20,166 +26,53 @@ TAKER_FEE = 0.0004
 TRADING_FEE_ROUND_TRIP = TAKER_FEE * 2
 
 # ============ LOAD DATA ============
-df = pd.read_csv(CSV_PATH)
-df['bar_time'] = pd.to_datetime(df['bar_time'], utc=True)
-df = df.set_index('bar_time').sort_index()
-
-# Prep indicators
-df['funding_fresh'] = df['funding_rate'] != df['funding_rate'].shift(1)
-df['roll_low_24'] = df['perp_close'].shift(1).rolling(24, min_periods=24).min()
-df['volume_ma_20'] = df['perp_volume'].rolling(20).mean()
+df = load_bars(CSV_PATH, columns=['perp_low', 'perp_close', 'perp_volume', 'funding_rate'])
 
 print("="*70)
 print("QUICK IMPROVEMENT TEST - 3 Variations")
 print("="*70)
 
 # ============ DEFINE 4 STRATEGIES ============
-
-def backtest_long_strategy(df, stop_pct, target_pct, use_volume_filter, strategy_name):
-    """Run backtest with specific parameters"""
-    
-    trades = []
-    open_longs = []
-    last_long_entry_bar = -MIN_BARS_BETWEEN_ENTRIES
-    
-    for i in range(24, len(df)):
-        # Entry signal
-        funding_ok = df['funding_rate'].iloc[i] <= EXTREME_LOW_FUNDING
-        price_ok = df['perp_close'].iloc[i] <= df['roll_low_24'].iloc[i] * (1 + PRICE_BUFFER_PCT)
-        fresh_ok = df['funding_fresh'].iloc[i]
-        throttle_ok = (i - last_long_entry_bar) >= MIN_BARS_BETWEEN_ENTRIES
-        
-        # Volume filter (optional)
-        if use_volume_filter:
-            volume_ok = df['perp_volume'].iloc[i] > df['volume_ma_20'].iloc[i]
-        else:
-            volume_ok = True
-        
-        # Enter LONG
-        if funding_ok and price_ok and fresh_ok and throttle_ok and volume_ok:
-            open_longs.append({
-                'entry_bar': i,
-                'entry_time': df.index[i],
-                'entry_price': df['perp_close'].iloc[i]
-            })
-            last_long_entry_bar = i
-        
-        # Check exits for all open positions
-        for pos_idx in range(len(open_longs) - 1, -1, -1):
-            pos = open_longs[pos_idx]
-            bars_held = i - pos['entry_bar']
-            current_low = df['perp_low'].iloc[i]
-            current_close = df['perp_close'].iloc[i]
-            
-            pnl_pct_stop = (current_low - pos['entry_price']) / pos['entry_price']
-            pnl_pct_close = (current_close - pos['entry_price']) / pos['entry_price']
-            
-            exit_reason = None
-            exit_price = None
-            
-            if pnl_pct_stop <= -stop_pct:
-                exit_reason = 'stop_loss'
-                exit_price = pos['entry_price'] * (1 - stop_pct)
-            elif pnl_pct_close >= target_pct:
-                exit_reason = 'profit_target'
-                exit_price = current_close
-            elif bars_held >= 42:
-                exit_reason = 'time_limit'
-                exit_price = current_close
-            
-            if exit_reason:
-                pnl_before_fees = (exit_price - pos['entry_price']) / pos['entry_price'] * 100
-                pnl_after_fees = pnl_before_fees - (TRADING_FEE_ROUND_TRIP * 100)
-                
-                trades.append({
-                    'entry_time': pos['entry_time'],
-                    'exit_time': df.index[i],
-                    'entry_price': pos['entry_price'],
-                    'exit_price': exit_price,
-                    'bars_held': bars_held,
-                    'pnl_pct': pnl_after_fees,
-                    'exit_reason': exit_reason
-                })
-                del open_longs[pos_idx]
-    
-    # Close remaining positions
-    for pos in open_longs:
-        pnl_before_fees = (df['perp_close'].iloc[-1] - pos['entry_price']) / pos['entry_price'] * 100
-        pnl_after_fees = pnl_before_fees - (TRADING_FEE_ROUND_TRIP * 100)
-        trades.append({
-            'entry_time': pos['entry_time'],
-            'exit_time': df.index[-1],
-            'entry_price': pos['entry_price'],
-            'exit_price': df['perp_close'].iloc[-1],
-            'bars_held': len(df) - 1 - pos['entry_bar'],
-            'pnl_pct': pnl_after_fees,
-            'exit_reason': 'end_of_data'
-        })
-    
-    # Calculate metrics
-    if len(trades) == 0:
-        return None
-    
-    trades_df = pd.DataFrame(trades)
-    winners = trades_df[trades_df['pnl_pct'] > 0]
-    losers = trades_df[trades_df['pnl_pct'] <= 0]
-    
-    gp = winners['pnl_pct'].sum() if len(winners) > 0 else 0
-    gl = abs(losers['pnl_pct'].sum()) if len(losers) > 0 else 0.001
-    pf = gp / gl
-    
-    return {
-        'name': strategy_name,
-        'total_trades': len(trades_df),
-        'win_rate': len(winners) / len(trades_df) * 100,
-        'avg_pnl': trades_df['pnl_pct'].mean(),
-        'total_pnl': trades_df['pnl_pct'].sum(),
-        'profit_factor': pf,
-        'stop_rate': (trades_df['exit_reason']=='stop_loss').sum() / len(trades_df) * 100,
-        'avg_bars_held': trades_df['bars_held'].mean()
-    }
+# (name, stop_pct, use_volume_filter), all with a 4% profit target
+STRATEGIES = [
+    ("BASELINE (Current)", 0.03, False),      # your current LONG-only
+    ("+ Volume Filter", 0.03, True),          # Test 1: Volume filter
+    ("+ Wider Stop (4%)", 0.04, False),       # Test 2: Wider stop
+    ("+ Both (Vol + 4% Stop)", 0.04, True),   # Test 3: Both improvements
+]
 
 # ============ RUN ALL 4 TESTS ============
 
 print("\nRunning 4 strategy variations...\n")
 
-results = []
+# One sweep: each entry signal (with / without volume filter) is built once and
+# both stop levels are evaluated on it in the same batched exit pass
+table = sweep_long(df, {
+    'extreme_low_funding': EXTREME_LOW_FUNDING,
+    'price_buffer_pct': PRICE_BUFFER_PCT,
+    'min_bars_between_entries': MIN_BARS_BETWEEN_ENTRIES,
+    'volume_filter': [False, True],
+    'stop_pct': [0.03, 0.04],
+    'target_pct': 0.04,
+    'time_limit_bars': 42,
+})
 
-# Baseline (your current LONG-only)
-results.append(backtest_long_strategy(
-    df, 
-    stop_pct=0.03, 
-    target_pct=0.04, 
-    use_volume_filter=False,
-    strategy_name="BASELINE (Current)"
-))
-
-# Test 1: Volume filter
-results.append(backtest_long_strategy(
-    df,
-    stop_pct=0.03,
-    target_pct=0.04,
-    use_volume_filter=True,
-    strategy_name="+ Volume Filter"
-))
-
-# Test 2: Wider stop
-results.append(backtest_long_strategy(
-    df,
-    stop_pct=0.04,
-    target_pct=0.04,
-    use_volume_filter=False,
-    strategy_name="+ Wider Stop (4%)"
-))
-
-# Test 3: Both improvements
-results.append(backtest_long_strategy(
-    df,
-    stop_pct=0.04,
-    target_pct=0.04,
-    use_volume_filter=True,
-    strategy_name="+ Both (Vol + 4% Stop)"
-))
+results = []
+for strategy_name, stop_pct, use_volume_filter in STRATEGIES:
+    row = table[(table['stop_pct'] == stop_pct) & (table['volume_filter'] == use_volume_filter)].iloc[0]
+    if row['trades'] == 0:
+        results.append(None)
+        continue
+    results.append({
+        'name': strategy_name,
+        'total_trades': row['trades'],
+        'win_rate': row['win_rate'],
+        'avg_pnl': row['avg_pnl'],
+        'total_pnl': row['total_pnl'],
+        'profit_factor': row['profit_factor'],
+        'stop_rate': row['stop_rate'],
+        'avg_bars_held': row['avg_bars_held']
+    })
 
 # ============ DISPLAY RESULTS ============
 
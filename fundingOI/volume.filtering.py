@@ -1,5 +1,11 @@
 import pandas as pd
 import numpy as np
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from datastore.barcache import load_bars
+from datastore.bargrid import BarGrid
 
 """
 VOLUME FILTER DEEP DIVE
@@ -10,12 +16,9 @@ Answer: Let's see which trades it filtered out
 # ============ LOAD DATA ============
 CSV_PATH = 'BTC_perp_funding_combined_OHLC.csv'
 
-df = pd.read_csv(CSV_PATH)
-df['bar_time'] = pd.to_datetime(df['bar_time'], utc=True)
-df = df.set_index('bar_time').sort_index()
+df = load_bars(CSV_PATH)
 
 # Prep indicators
-df['funding_fresh'] = df['funding_rate'] != df['funding_rate'].shift(1)
 df['roll_low_24'] = df['perp_close'].shift(1).rolling(24, min_periods=24).min()
 df['volume_ma_20'] = df['perp_volume'].rolling(20).mean()
 df['volume_ratio'] = df['perp_volume'] / df['volume_ma_20']
@@ -48,15 +51,16 @@ print("\n" + "="*70)
 print("PERFORMANCE: High Volume vs Low Volume Entries")
 print("="*70)
 
+grid = BarGrid.from_index(df.index)
+
 def quick_outcome_check(entry_times, df, name):
     """Quick check: what happened 10 bars after entry?"""
     outcomes = []
     
-    for entry_time in entry_times:
-        if entry_time not in df.index:
+    for entry_time, entry_idx in zip(entry_times, grid.rows(entry_times)):
+        if entry_idx < 0:
             continue
         
-        entry_idx = df.index.get_loc(entry_time)
         entry_price = df['perp_close'].iloc[entry_idx]
         
         # Look 10 bars ahead
@@ -1,5 +1,10 @@
 import pandas as pd
 import numpy as np
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from datastore.bargrid import BarGrid
 
 """
 MA DISTANCE ANALYSIS
@@ -50,15 +55,10 @@ print(f"  Bars below 200MA: {(~feb_data['above_200ma']).sum()} ({(~feb_data['abo
 print("\n^ This confirms: February was CHOPPY around 200MA, not a clean downtrend!")
 
 # ============ MAP TRADES TO MA DISTANCE ============
-trades['dist_from_200ma'] = trades['entry_time'].map(
-    lambda t: df.loc[t, 'dist_from_200ma'] if t in df.index else np.nan
-)
-trades['in_chop_zone'] = trades['entry_time'].map(
-    lambda t: df.loc[t, 'in_chop_zone'] if t in df.index else np.nan
-)
-trades['regime'] = trades['entry_time'].map(
-    lambda t: df.loc[t, 'regime'] if t in df.index else np.nan
-)
+# Bar-grid lookup: entry time -> row by arithmetic, NaN where the bar is missing
+grid = BarGrid.from_index(df.index)
+for col in ['dist_from_200ma', 'in_chop_zone', 'regime']:
+    trades[col] = grid.lookup(df[col].to_numpy(), trades['entry_time'])
 
 # ============ TRADES IN CHOP ZONE VS CLEAN ZONE ============
 print("\n" + "="*70)
@@ -1,5 +1,10 @@
 import pandas as pd
 import numpy as np
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from datastore.bargrid import BarGrid
 
 """
 LONG TRADE OPTIMIZATION ANALYSIS
@@ -59,10 +64,12 @@ df = pd.read_csv('BTC_perp_funding_combined_OHLC.csv')
 df['bar_time'] = pd.to_datetime(df['bar_time'], utc=True)
 df = df.set_index('bar_time').sort_index()
 
-# Check if price continued higher after we exited
-targets['price_5bars_later'] = targets['exit_time'].map(
-    lambda t: df.loc[df.index > t].head(5)['perp_close'].max() if t in df.index and len(df.loc[df.index > t]) >= 5 else np.nan
-)
+# Check if price continued higher after we exited (max close of the next 5 bars)
+grid = BarGrid.from_index(df.index)
+close = df['perp_close'].to_numpy()
+exit_rows = grid.rows(targets['exit_time'])
+targets['price_5bars_later'] = [close[r + 1:r + 6].max() if r >= 0 and r + 5 < len(close) else np.nan
+                                for r in exit_rows]
 targets['could_have_made'] = ((targets['price_5bars_later'] - targets['entry_price']) / targets['entry_price'] * 100) - 0.08
 
 profitable_continuation = targets[targets['could_have_made'] > targets['pnl_pct']]
@@ -1,5 +1,10 @@
 import pandas as pd
 import numpy as np
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from engine.metrics import batch, summary
 
 """
 SIMPLE FUNDING SIGNAL VALIDATION
@@ -180,40 +185,38 @@ else:
     print("BACKTEST RESULTS")
     print("="*60)
     
+    m = summary(trades_df)
+
     # Overall stats
-    print(f"\nTotal trades: {len(trades_df)}")
-    print(f"  SHORT: {len(trades_df[trades_df['side']=='SHORT'])}")
-    print(f"  LONG: {len(trades_df[trades_df['side']=='LONG'])}")
-    
-    winners = trades_df[trades_df['pnl_pct'] > 0]
-    losers = trades_df[trades_df['pnl_pct'] < 0]
+    print(f"\nTotal trades: {m['trades']}")
+    print(f"  SHORT: {m['short_trades']}")
+    print(f"  LONG: {m['long_trades']}")
     
-    print(f"\nWin rate: {len(winners)/len(trades_df)*100:.1f}%")
-    print(f"  Winners: {len(winners)}")
-    print(f"  Losers: {len(losers)}")
+    print(f"\nWin rate: {m['win_rate']:.1f}%")
+    print(f"  Winners: {m['wins']}")
+    print(f"  Losers: {m['losses']}")
     
-    print(f"\nAverage PnL: {trades_df['pnl_pct'].mean():.2f}%")
-    print(f"Median PnL: {trades_df['pnl_pct'].median():.2f}%")
-    print(f"Total PnL: {trades_df['pnl_pct'].sum():.2f}%")
+    print(f"\nAverage PnL: {m['avg_pnl']:.2f}%")
+    print(f"Median PnL: {m['median_pnl']:.2f}%")
+    print(f"Total PnL: {m['total_pnl']:.2f}%")
     
     # Profit factor
-    gross_profit = winners['pnl_pct'].sum()
-    gross_loss = abs(losers['pnl_pct'].sum())
-    profit_factor = gross_profit / gross_loss if gross_loss > 0 else np.inf
+    profit_factor = m['profit_factor']
     print(f"\nProfit factor: {profit_factor:.2f}")
     
     # Exit breakdown
     print(f"\nExit reason breakdown:")
+    exits = batch(trades_df, by=['exit_reason']).set_index('exit_reason')
     for reason in ['target', 'stop', 'time']:
-        count = len(trades_df[trades_df['exit_reason']==reason])
-        pct = count/len(trades_df)*100
-        avg_pnl = trades_df[trades_df['exit_reason']==reason]['pnl_pct'].mean()
+        count = int(exits.at[reason, 'trades']) if reason in exits.index else 0
+        pct = count/m['trades']*100
+        avg_pnl = exits.at[reason, 'avg_pnl'] if count else np.nan
         print(f"  {reason:8s}: {count:3d} trades ({pct:5.1f}%) | Avg PnL: {avg_pnl:+6.2f}%")
     
     # Time analysis
     print(f"\nHolding time:")
-    print(f"  Average: {trades_df['bars_held'].mean():.1f} bars ({trades_df['bars_held'].mean()*4:.0f} hours)")
-    print(f"  Median: {trades_df['bars_held'].median():.1f} bars ({trades_df['bars_held'].median()*4:.0f} hours)")
+    print(f"  Average: {m['avg_bars_held']:.1f} bars ({m['avg_bars_held']*4:.0f} hours)")
+    print(f"  Median: {m['median_bars_held']:.1f} bars ({m['median_bars_held']*4:.0f} hours)")
     
     # Save trades
     output_file = 'simple_validation_trades.csv'
@@ -225,8 +228,8 @@ else:
     print("INTERPRETATION")
     print("="*60)
     
-    win_rate = len(winners)/len(trades_df)*100
-    avg_pnl = trades_df['pnl_pct'].mean()
+    win_rate = m['win_rate']
+    avg_pnl = m['avg_pnl']
     
     if len(trades_df) < 5:
         print("\n⚠️  INSUFFICIENT DATA")
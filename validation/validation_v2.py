@@ -1,6 +1,10 @@
 import pandas as pd
-import numpy as np
 import matplotlib.pyplot as plt
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from engine.metrics import batch
 
 """
 TRADE DIAGNOSTICS - Deep Dive Analysis
@@ -22,33 +26,29 @@ print("\n" + "="*70)
 print("1. SHORT vs LONG PERFORMANCE")
 print("="*70)
 
+by_side = batch(trades_df, by=['side']).set_index('side')
+by_exit = batch(trades_df, by=['side', 'exit_reason']).set_index(['side', 'exit_reason'])
 for side in ['SHORT', 'LONG']:
-    subset = trades_df[trades_df['side'] == side]
-    if len(subset) == 0:
+    if side not in by_side.index:
         continue
-    
-    winners = subset[subset['pnl_pct'] > 0]
-    losers = subset[subset['pnl_pct'] <= 0]
+    m = by_side.loc[side]
     
     print(f"\n{side}:")
-    print(f"  Total trades: {len(subset)}")
-    print(f"  Win rate: {len(winners)/len(subset)*100:.1f}%")
-    print(f"  Average PnL: {subset['pnl_pct'].mean():+.2f}%")
-    print(f"  Total PnL: {subset['pnl_pct'].sum():+.2f}%")
+    print(f"  Total trades: {m['trades']:.0f}")
+    print(f"  Win rate: {m['win_rate']:.1f}%")
+    print(f"  Average PnL: {m['avg_pnl']:+.2f}%")
+    print(f"  Total PnL: {m['total_pnl']:+.2f}%")
     
     # Profit factor
-    gp = winners['pnl_pct'].sum() if len(winners) > 0 else 0
-    gl = abs(losers['pnl_pct'].sum()) if len(losers) > 0 else 0
-    pf = gp / gl if gl > 0 else np.inf
-    print(f"  Profit Factor: {pf:.2f}")
+    print(f"  Profit Factor: {m['profit_factor']:.2f}")
     
     # Exit breakdown
     print(f"  Exit breakdown:")
     for reason in ['stop_loss', 'profit_target', 'time_limit']:
-        count = len(subset[subset['exit_reason'] == reason])
-        if count > 0:
-            pct = count / len(subset) * 100
-            avg = subset[subset['exit_reason'] == reason]['pnl_pct'].mean()
+        if (side, reason) in by_exit.index:
+            count = by_exit.at[(side, reason), 'trades']
+            pct = count / m['trades'] * 100
+            avg = by_exit.at[(side, reason), 'avg_pnl']
             print(f"    {reason:15s}: {count:3d} ({pct:4.1f}%) | Avg: {avg:+.2f}%")
 
 # ============ 2. MONTHLY BREAKDOWN ============